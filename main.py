@@ -7,18 +7,27 @@ Contains all classes dealing with front-end program interaction
 @author: Dylan Munro
 """
 
+import src.assets.analytics as analytics
+import src.assets.cache as cache
+import src.assets.ingest as ingest
 import src.assets.manager as manager
-import tests.tests as tests
+import src.assets.partitions as partitions
+import src.assets.script as script
+import src.assets.stats as stats
 
 from typing import Final
 
-import pandas as pd
+import argparse
+import os
+import sys
 
 """
 Handles all IO requests from the user
 
 class variables:
     file - The file which stores asset data if not using coingecko API
+    cache - Stores parsed spreadsheets so they are not parsed again on later runs
+    recorder - Measures the time and memory used by each request
 """
 class IO:
     
@@ -26,9 +35,21 @@ class IO:
     _SUPPORTED_FILES:Final = {".csv", ".xlsx"}
     _DEFAULT_FILE:Final = "resources/spreadsheets/MaticVsLrcPrices.xlsx"
     _TEST_MODE:Final = False #Set to True when testing Program, set to False for actual deploy
+    _USE_CACHE:Final = True #Set to False to always parse spreadsheets from scratch
+    _COLLECT_STATS:Final = True #Set to False to stop measuring requests
+    _TRACE_MEMORY:Final = False #Set to True to measure memory, which slows down every request
+    _COMPACT:Final = False #Set to True to store entries in smaller types where no information is lost
+    _PAGE_SIZE:Final = 50 #Number of visible entries printed before prompting for the next page
     
-    def __init__(self):
+    def __init__(self, compact = False):
+        """
+        Attributes:
+            compact (bool) - True if entries are stored in smaller types where no information is lost
+        """
         self._driver = None
+        self._compact = self._COMPACT or compact
+        self._cache = cache.FrameCache()
+        self._recorder = stats.Recorder(self._COLLECT_STATS, self._TRACE_MEMORY)
         
     def get_file_extension(self, file_path):
         """
@@ -79,9 +100,8 @@ class IO:
         if response.lower() == "yes":
             while not file_loaded:
                 try:
-                    file_path = input("Enter the path to the file you wish to load:\n")
-                    df = self.load_file(file_path)
-                    self._driver = manager.Driver(df)
+                    file_path = input("Enter the path to the file, directory or glob pattern you wish to load:\n")
+                    self._driver = self.create_driver(file_path)
                     file_loaded = True
                 except (ValueError, FileNotFoundError) as e:
                     print("{}".format(e))
@@ -94,8 +114,67 @@ class IO:
     
     def load_default_file(self):
         print("Loading default file at {}".format(IO._DEFAULT_FILE))
-        df = self.load_file(IO._DEFAULT_FILE)
-        self._driver = manager.Driver(df)
+        self._driver = self.create_driver(IO._DEFAULT_FILE)
+    
+    def create_driver(self, file_path):
+        """
+        Creates a driver for the file at the given filepath, using the cached frame
+        of the file if it has not changed since it was last loaded. If the path is a
+        directory or glob pattern, all spreadsheets it contains are loaded. If the path
+        is a directory of partitions written by --write-partitions, entries are read from
+        disk as they are requested
+        
+        Attributes:
+            file_path - The path to the file
+        
+        raises:
+            ValueError: If the file being loaded is not supported
+            FileNotFoundError: If the file at the file_path does not exist
+        """
+        if partitions.is_partition_store(file_path):
+            return manager.Driver(partitions.PartitionStore(file_path), recorder = self._recorder)
+        if os.path.isdir(file_path) or any(character in file_path for character in "*?["):
+            return self.create_driver_from_files(ingest.find_files(file_path))
+        self.get_file_extension(file_path)
+        if self._USE_CACHE:
+            with self._recorder.measure_stage("cache_load"):
+                df = self._cache.load(file_path)
+            if df is not None:
+                return manager.Driver(df, prepared = True, recorder = self._recorder, compact = self._compact)
+        driver = manager.Driver(self.load_file(file_path), recorder = self._recorder, compact = self._compact)
+        if self._USE_CACHE:
+            self._cache.store(file_path, driver.get_all_entries())
+        return driver
+    
+    def create_driver_from_files(self, file_paths):
+        """
+        Creates a driver for several files. Files without a cached frame are parsed in
+        parallel, and the entries of all files are merged without sorting them again
+        
+        Attributes:
+            file_paths - The paths to the files
+        
+        raises:
+            ValueError: If a file being loaded is not supported
+            FileNotFoundError: If a file does not exist
+        """
+        frames_by_file = {}
+        if self._USE_CACHE:
+            with self._recorder.measure_stage("cache_load"):
+                for file_path in file_paths:
+                    df = self._cache.load(file_path)
+                    if df is not None:
+                        frames_by_file[file_path] = df
+        missing = [file_path for file_path in file_paths if file_path not in frames_by_file]
+        with self._recorder.measure_stage("ingest") as measurement:
+            frames_by_file.update(zip(missing, ingest.read_partitions(missing)))
+            measurement.add_rows(sum(len(frames_by_file[file_path]) for file_path in missing))
+        if self._USE_CACHE:
+            for file_path in missing:
+                self._cache.store(file_path, frames_by_file[file_path])
+        with self._recorder.measure_stage("merge", sum(len(df) for df in frames_by_file.values())):
+            df = manager.DataManager.merge_partitions([frames_by_file[file_path] for file_path in file_paths])
+        return manager.Driver(df, prepared = True, recorder = self._recorder, compact = self._compact)
     
     def load_file(self, file_path):
         """
@@ -110,31 +189,147 @@ class IO:
         """
         file_extension = self.get_file_extension(file_path)
         try:
-            if file_extension == ".xlsx" or file_extension == ".xls":
-                df = pd.read_excel(file_path)
-            elif file_extension == ".csv":
-                df = pd.read_csv(file_path)
+            #Files are parsed in chunks which are converted to compact types as they are read
+            with self._recorder.measure_stage("ingest") as measurement:
+                df = ingest.read_file(file_path, file_extension)
+                measurement.add_rows(len(df))
         except FileNotFoundError:
             raise FileNotFoundError("The file {} does not exist".format(file_path))
         return df
             
-    def main(self):       
+    def main(self, arguments = None):       
         """
         The main method which handles the program control flow
+        
+        Attributes:
+            arguments (list[string]) - Command line arguments. If a script is given, its
+                requests are executed without prompting the user
+        
+        Returns:
+            The exit status of the program
         """
-        self.load()
+        options = self.parse_arguments(arguments if arguments is not None else [])
+        self._compact = self._compact or options.compact
+        try:
+            if options.write_partitions is not None:
+                if options.file is None:
+                    raise ValueError("--write-partitions requires the spreadsheets to be given with --file")
+                self._driver = self.write_partitions(options.file, options.write_partitions, options.overwrite)
+            elif options.file is not None:
+                self._driver = self.create_driver(options.file)
+            elif options.script is not None:
+                self._driver = self.create_driver(IO._DEFAULT_FILE)
+            else:
+                self.load()
+        except (ValueError, FileNotFoundError) as e:
+            print(e, file = sys.stderr)
+            return 2
         #self._driver = manager.Driver(self.load_file(IO._DEFAULT_FILE))
-        self.run()
+        num_failed = 0
+        if options.script is not None:
+            num_failed = self.run_script(options.script, options.output, options.format)
+        elif options.export is None:
+            self.run()
+        if options.export is not None:
+            try:
+                num_entries = self._driver.export_visible_entries(options.export, options.export_format)
+                print("{} entries have been exported to {}".format(num_entries, options.export), file = sys.stderr)
+            except (ValueError, UserWarning) as e:
+                print(e, file = sys.stderr)
+                return 2
+        if options.stats is not None:
+            self._recorder.dump(options.stats)
+        return 1 if num_failed > 0 else 0
+    
+    def parse_arguments(self, arguments):
+        parser = argparse.ArgumentParser(description = "Tracks the prices of assets")
+        parser.add_argument("--file", help = "Path of the spreadsheet, directory or glob pattern to load "
+                            "instead of prompting")
+        parser.add_argument("--script", help = "Path of a file with one request per line, or - to "
+                            "read requests from standard input. Requests are executed without prompting")
+        parser.add_argument("--output", default = "-",
+                            help = "Path the results of a script are written to. Defaults to standard output")
+        parser.add_argument("--format", choices = ["jsonl", "csv"], default = "jsonl",
+                            help = "Format the results of a script are written in")
+        parser.add_argument("--compact", action = "store_true",
+                            help = "Store entries in smaller types where no information is lost")
+        parser.add_argument("--stats", help = "Path the time and memory used by requests is written to as json")
+        parser.add_argument("--write-partitions", metavar = "DIRECTORY",
+                            help = "Write the entries of --file to a directory of per-ticker partitions, "
+                            "which later runs can load with --file without reading them into memory")
+        parser.add_argument("--overwrite", action = "store_true",
+                            help = "Replace partitions already written to the --write-partitions directory")
+        parser.add_argument("--export", help = "Path the visible entries are written to, after the script "
+                            "if one is given. Entries are written in chunks, so any number can be exported")
+        parser.add_argument("--export-format", choices = ["csv", "jsonl", "parquet"],
+                            help = "Format of the exported entries. Defaults to the extension of --export")
+        return parser.parse_args(arguments)
+    
+    def write_partitions(self, file_path, directory, overwrite = False):
+        """
+        Writes the spreadsheets at a path to a directory of per-ticker partitions, one
+        spreadsheet at a time, and creates a driver reading entries from the partitions
+        
+        Attributes:
+            file_path - The path of a spreadsheet, directory or glob pattern
+            directory - The directory the partitions are written to
+            overwrite - True if partitions already in the directory should be replaced
+        
+        raises:
+            ValueError: If a file being written is not supported, or the directory already
+                contains partitions and overwrite is False
+            FileNotFoundError: If a file does not exist
+        """
+        if os.path.isdir(file_path) or any(character in file_path for character in "*?["):
+            file_paths = ingest.find_files(file_path)
+        else:
+            self.get_file_extension(file_path)
+            file_paths = [file_path]
+        with self._recorder.measure_stage("write_partitions"):
+            store = partitions.write_partitions(file_paths, directory, overwrite)
+        return manager.Driver(store, recorder = self._recorder)
+    
+    def run_script(self, script_path, output_path = "-", output_format = "jsonl"):
+        """
+        Executes the requests of a script against the loaded file without prompting
+        
+        Attributes:
+            script_path - The path to the script, or - for standard input
+            output_path - The path results are written to, or - for standard output
+            output_format - Either jsonl or csv
+        
+        Returns:
+            The number of lines of the script which could not be executed
+        """
+        lines = sys.stdin if script_path == "-" else open(script_path, "r", encoding = "utf-8")
+        output = sys.stdout if output_path == "-" else open(output_path, "w", encoding = "utf-8", newline = "")
+        try:
+            if output_format == "csv":
+                columns = self._driver.get_columns() + list(analytics.METRICS.values())
+                writer = script.CsvWriter(output, columns)
+            else:
+                writer = script.JsonlWriter(output)
+            return script.run_script(self._driver, lines, writer)
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+            if output is not sys.stdout:
+                output.close()
         
     def run(self):
         user_num = 0
         prompt = self.get_prompt()
         standalone_requests = manager.Request.get_STANDALONE_REQUESTS()
+        ranged_requests = manager.Request.get_RANGED_REQUESTS()
+        windowed_requests = manager.Request.get_WINDOWED_REQUESTS()
         while not user_num == manager.Request.QUIT:
             try:
                 #Name of the asset that the request is acting on
                 assets = None
                 assets_list = None
+                starting_date = None
+                ending_date = None
+                window = None
                 
                 #Check if user enters a valid number
                 response = input(prompt)
@@ -150,11 +345,45 @@ class IO:
                 if not user_num in standalone_requests:
                     assets = input("Enter the name of the asset(s) (case-sensitive), separating them by spaces:\n")
                     assets_list = assets.split(" ")
-                request = manager.Request(user_num, assets=assets_list)
-                print(self._driver.execute_request(request))
+                
+                #Obtain the range of dates the request is acting on if necessary
+                if user_num in ranged_requests:
+                    starting_date = input("Enter the starting date (yyyy-mm-dd), or leave blank to start from the first entry:\n")
+                    ending_date = input("Enter the ending date (yyyy-mm-dd), or leave blank to end at the last entry:\n")
+                
+                #Obtain the window metrics are computed over if necessary
+                if user_num in windowed_requests:
+                    window = input("Enter the window as a number of entries or a length of time such as 7D, or leave blank for 20 entries:\n")
+                request = manager.Request(user_num, assets=assets_list, 
+                                          starting_date=starting_date, ending_date=ending_date,
+                                          window=window)
+                if user_num == manager.Request.DISPLAY_ALL_VISIBLE_ENTRIES:
+                    self.print_pages(self._driver.execute_paged_request(request, self._PAGE_SIZE))
+                else:
+                    print(self._driver.execute_request(request))
             except (ValueError, UserWarning) as e:
                 print(e)
     
+    def print_pages(self, pages):
+        """
+        Prints pages of entries one at a time, waiting for the user before each following page
+        
+        Attributes:
+            pages - Iterator yielding dataframes of entries
+        """
+        num_printed = 0
+        page = next(pages, None)
+        while page is not None:
+            print(page.to_string())
+            num_printed += len(page)
+            page = next(pages, None)
+            if page is None:
+                break
+            response = input("Showing {} entries. Press enter to show the next {}, or q to stop:\n"
+                             .format(num_printed, len(page)))
+            if response.strip().lower() == "q":
+                break
+    
     def get_prompt(self):
         """
         Returns all valid requests and their descriptions
@@ -171,5 +400,4 @@ class IO:
         return "".join(temp)
 
 if __name__ == "__main__":
-    IO().main()
-    #tests.graph_tests()
+    sys.exit(IO().main(sys.argv[1:]))
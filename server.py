@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Jun  4 10:21:37 2022
+
+Contains all classes responsible for serving requests over HTTP, so that dashboards and
+scripts can query one loaded dataset
+
+@author: Dylan Munro
+"""
+
+import main
+import src.assets.manager as manager
+import src.assets.script as script
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Final
+
+import argparse
+import asyncio
+import json
+import sys
+
+import pandas as pd
+
+class AssetServer:
+    """
+    Serves requests to a Driver as json over HTTP
+
+    Display requests are executed by a pool of threads on a snapshot of the entries and
+    visible tickers, so concurrent readers never see a request half applied. Requests
+    changing the visible tickers, composite requests and appended entries are executed one
+    at a time, after which the next display request takes a new snapshot
+
+    Endpoints:
+        POST /request - Executes {"line": "display_visible_entries BTC from=2022-01-01"}, written
+            as a line of a script, or {"request": name or number, "assets": [...], "from": date,
+            "to": date, "window": window}. {"requests": [...]} executes a composite request
+        POST /append - Appends {"entries": [{"Ticker": ..., "Date": ..., "Time": ..., "Price": ...}]}
+        GET /stats - Returns the time used by each type of request and the query cache counts
+        GET /health - Returns {"ok": true} once the server is running
+
+    Attributes:
+        driver (Driver) - The driver requests are executed by
+        threads (int) - The number of threads executing display requests. Defaults to the
+            number chosen by ThreadPoolExecutor
+    """
+
+    _MAX_BODY_SIZE:Final = 64 * 2 ** 20 #Largest request body in bytes
+    #Requests which cannot be served, such as plots which need a display
+    _UNSUPPORTED_REQUESTS:Final = {manager.Request.PLOT_ASSETS, manager.Request.QUIT}
+    _REASONS:Final = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large"}
+
+    def __init__(self, driver, threads = None):
+        self._driver = driver
+        self._snapshot = None #Taken on the first display request after each change
+        self._readers = ThreadPoolExecutor(threads, thread_name_prefix = "reader")
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix = "writer")
+        self._write_lock = None #Created within the event loop
+        self._server = None
+
+    async def start(self, host = "127.0.0.1", port = 8765):
+        """
+        Starts accepting connections and returns the port the server is listening on,
+        which is chosen by the operating system if port is 0
+        """
+        self._write_lock = asyncio.Lock()
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        """
+        Stops accepting connections and shuts down the thread pools
+        """
+        if self._server is not None:
+            self._server.close()
+        self._readers.shutdown(wait = False)
+        self._writer.shutdown(wait = False)
+
+    async def _handle_connection(self, reader, writer):
+        """
+        Answers the HTTP requests of a connection until the client closes it
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > self._MAX_BODY_SIZE:
+                    status, body = 413, self._error("The request body is too large")
+                    await self._respond(writer, status, body, False)
+                    break
+                content = await reader.readexactly(length) if length > 0 else b""
+                status, body = await self._route(method, path.split("?", 1)[0], content)
+                keep_alive = headers.get("connection", "").lower() != "close" and \
+                    not version.strip().upper().endswith("1.0")
+                await self._respond(writer, status, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, body, keep_alive):
+        content = body.encode("utf-8")
+        writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n"
+                     .format(status, self._REASONS[status], len(content), "keep-alive" if keep_alive else "close")
+                     .encode("latin-1") + content)
+        await writer.drain()
+
+    @staticmethod
+    def _error(message):
+        return json.dumps({"ok": False, "error": message})
+
+    async def _route(self, method, path, content):
+        """
+        Returns the status and json body answering a request
+        """
+        try:
+            if method == "GET" and path == "/health":
+                return (200, '{"ok": true}')
+            if method == "GET" and path == "/stats":
+                return (200, await self._run_read(self._get_stats))
+            if method == "POST" and path in ("/request", "/append"):
+                body = json.loads(content or b"{}")
+                if not isinstance(body, dict):
+                    raise ValueError("The request body must be a json object")
+                if path == "/append":
+                    return (200, await self._append(body))
+                return (200, await self._execute(self.parse_request(body)))
+        except KeyError as e:
+            return (400, self._error("The request body is missing {}".format(e)))
+        except (ValueError, UserWarning, TypeError) as e:
+            return (400, self._error(str(e)))
+        return (404, self._error("{} {} is not a supported endpoint".format(method, path)))
+
+    @staticmethod
+    def parse_request(body):
+        """
+        Returns the request described by the json body of a request
+
+        Raises:
+            ValueError - If the body does not describe a valid request
+        """
+        if "requests" in body:
+            return manager.CompositeRequest([AssetServer.parse_request(part) for part in body["requests"]])
+        if "line" in body:
+            request = script.parse_request(body["line"])
+            if request is None:
+                raise ValueError("The line does not contain a request")
+            return request
+        code = body["request"]
+        if isinstance(code, str) and not code.isnumeric():
+            codes = {name: code for code, name in manager.Request.get_REQUEST_NAMES().items()}
+            if code.lower() not in codes:
+                raise ValueError("{} is not a valid request".format(code))
+            code = codes[code.lower()]
+        assets = body.get("assets")
+        if isinstance(assets, str):
+            assets = assets.split()
+        return manager.Request(int(code), assets = assets, starting_date = body.get("from"),
+                               ending_date = body.get("to"), window = body.get("window"))
+
+    async def _execute(self, request):
+        """
+        Executes a request on a snapshot if it only displays information, otherwise on the driver
+        """
+        if isinstance(request, manager.Request):
+            if request.get_request() in self._UNSUPPORTED_REQUESTS:
+                raise ValueError("The {} request is not supported by the server".format(request.get_name()))
+            if request.get_request() in manager.Request.get_DISPLAY_REQUESTS():
+                snapshot = await self._get_snapshot()
+                return await self._run_read(lambda: self._format_result(snapshot.execute_request(request)))
+        else:
+            for single_request in request.get_requests():
+                if single_request.get_request() in self._UNSUPPORTED_REQUESTS:
+                    raise ValueError("The {} request is not supported by the server".format(single_request.get_name()))
+        return await self._run_write(lambda: self._format_result(self._driver.execute_request(request)))
+
+    async def _append(self, body):
+        entries = pd.DataFrame.from_records(body["entries"])
+        await self._run_write(lambda: self._driver.append_entries(entries))
+        return json.dumps({"ok": True, "result": "{} entries have been appended".format(len(entries))})
+
+    @staticmethod
+    def _format_result(output):
+        if isinstance(output, list) and any(isinstance(result, pd.DataFrame) for result in output):
+            result = "[" + ", ".join(script.to_json(result) for result in output) + "]"
+        else:
+            result = script.to_json(output)
+        return '{{"ok": true, "result": {}}}'.format(result)
+
+    def _get_stats(self):
+        return json.dumps({"ok": True, "result": {
+            "requests": self._driver.get_recorder().to_dict(),
+            "query_cache": self._driver.get_query_cache().to_dict()}})
+
+    async def _get_snapshot(self):
+        """
+        Returns a snapshot of the driver, taking one if the driver changed since the last
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            async with self._write_lock:
+                if self._snapshot is None:
+                    self._snapshot = await asyncio.get_running_loop().run_in_executor(
+                        self._writer, self._driver.snapshot)
+                snapshot = self._snapshot
+        return snapshot
+
+    async def _run_read(self, function):
+        return await asyncio.get_running_loop().run_in_executor(self._readers, function)
+
+    async def _run_write(self, function):
+        """
+        Runs a function changing the driver once every earlier change has finished
+        """
+        async with self._write_lock:
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._writer, function)
+            finally:
+                self._snapshot = None
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description = "Serves requests for the prices of assets as json over HTTP")
+    parser.add_argument("--file", required = True,
+                        help = "Path of the spreadsheet, directory or glob pattern to load")
+    parser.add_argument("--host", default = "127.0.0.1", help = "Address the server listens on")
+    parser.add_argument("--port", type = int, default = 8765, help = "Port the server listens on")
+    parser.add_argument("--threads", type = int, help = "Number of threads executing display requests")
+    parser.add_argument("--compact", action = "store_true",
+                        help = "Store entries in smaller types where no information is lost")
+    return parser.parse_args(arguments)
+
+async def serve(driver, host, port, threads = None):
+    server = AssetServer(driver, threads)
+    port = await server.start(host, port)
+    print("Serving requests at http://{}:{}".format(host, port), flush = True)
+    try:
+        await server.serve_forever()
+    finally:
+        server.close()
+
+def run(arguments):
+    options = parse_arguments(arguments)
+    io = main.IO(compact = options.compact)
+    try:
+        driver = io.create_driver(options.file)
+    except (ValueError, FileNotFoundError) as e:
+        print(e, file = sys.stderr)
+        return 2
+    try:
+        asyncio.run(serve(driver, options.host, options.port, options.threads))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run(sys.argv[1:]))
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat May 28 09:52:16 2022
+
+Contains all functions and classes responsible for computing rolling metrics of assets
+
+@author: Dylan Munro
+"""
+
+import src.assets.dates as dates
+
+from collections import OrderedDict
+from typing import Final
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+#Metrics mapped to the names of the columns holding them
+MOVING_AVERAGE:Final = "moving_average" #Mean price over the window
+VOLATILITY:Final = "volatility" #Standard deviation of the percent change between entries over the window
+MAX_DRAWDOWN:Final = "max_drawdown" #Largest percent fall from the highest earlier price within the window
+METRICS:Final = {
+    MOVING_AVERAGE: "Moving Average",
+    VOLATILITY: "Volatility",
+    MAX_DRAWDOWN: "Max Drawdown"
+}
+
+_MAX_GRID_POINTS:Final = 10 ** 6 #Largest number of times in the grid tickers are aligned on
+#Largest number of prices in the aligned grid, times multiplied by tickers. Comparing tickers holds
+#several copies of the grid at once, so this keeps the peak near a gigabyte
+_MAX_ALIGNED_VALUES:Final = 2 * 10 ** 7
+_DEFAULT_FREQUENCY:Final = pd.Timedelta(days = 1) #Grid spacing used if no ticker has two entries
+#Spacings the grid is rounded down to when chosen from the entries, from smallest to largest
+_GRID_FREQUENCIES:Final = tuple(pd.Timedelta(frequency) for frequency in
+                                ("1s", "1min", "5min", "15min", "1h", "4h", "1D", "7D"))
+
+def check_window(window):
+    """
+    Returns a window as a number of entries or a length of time such as 7D, or None if no
+    window was given
+
+    Attributes:
+        window (int or string) - The number of entries, or a pandas offset string
+
+    Raises:
+        ValueError - If the window is not a positive number of entries or a length of time
+    """
+    if window is None or window == "":
+        return None
+    if isinstance(window, str) and window.isnumeric():
+        window = int(window)
+    if isinstance(window, (int, np.integer)):
+        if window < 1:
+            raise ValueError("The window must contain at least one entry")
+        return int(window)
+    try:
+        pd.tseries.frequencies.to_offset(window)
+    except (TypeError, ValueError):
+        raise ValueError("{} is not a number of entries or a length of time such as 7D".format(window))
+    return window
+
+def compute_metric(metric, timestamps, prices, window):
+    """
+    Returns the value of a metric at each entry of a single ticker. Values are NaN until
+    the window contains enough entries
+
+    Attributes:
+        metric (string) - One of METRICS
+        timestamps (numpy.ndarray) - The sorted timestamps of the entries
+        prices (numpy.ndarray) - The prices of the entries
+        window (int or string) - The number of entries, or a length of time such as 7D, that
+            each value is computed over. Only max drawdown accepts None, which uses every
+            earlier entry
+
+    Raises:
+        ValueError - If the metric or window is invalid
+    """
+    if metric not in METRICS:
+        raise ValueError("{} is not a supported metric".format(metric))
+    window = check_window(window)
+    if window is None and metric != MAX_DRAWDOWN:
+        raise ValueError("A window is required to compute the {}".format(METRICS[metric].lower()))
+    prices = np.asarray(prices, dtype = "float64")
+    #Windows given as lengths of time are measured from the timestamps in the index
+    index = pd.DatetimeIndex(timestamps) if isinstance(window, str) else None
+    series = pd.Series(prices, index = index)
+
+    if metric == MOVING_AVERAGE:
+        values = series.rolling(window).mean()
+    elif metric == VOLATILITY:
+        values = (series.pct_change() * 100).rolling(window).std()
+    else:
+        drawdown = (series / series.cummax() - 1) * 100
+        values = drawdown.cummin() if window is None else drawdown.rolling(window).min()
+    return values.to_numpy()
+
+class Analytics:
+    """
+    Computes metrics of the visible tickers of a DataManager. Results are memoized for each
+    ticker, metric and window, and recomputed only once the entries of their ticker change.
+    Methods can be called from several threads at once
+
+    Attributes:
+        manager (DataManager) - The source of the entries of each ticker
+        max_entries (int) - The largest number of results kept
+    """
+
+    def __init__(self, manager, max_entries = 1024):
+        self._manager = manager
+        self._max_entries = max_entries
+        self._results = OrderedDict() #(ticker, metric, window) mapped to (ticker version, values)
+        self._matrices = OrderedDict() #(tickers, frequency, dates) mapped to (ticker versions, matrices)
+        self._max_matrices = max(1, max_entries // 64) #Matrices grow with the square of the tickers
+        self._lock = threading.Lock() #Guards the memoized results
+
+    def snapshot(self, manager):
+        """
+        Returns analytics of another manager, such as a snapshot of this analytics' manager,
+        starting with the results memoized so far. Results are only reused while the versions
+        of their tickers match
+        """
+        copy = Analytics(manager, self._max_entries)
+        with self._lock:
+            copy._results = OrderedDict(self._results)
+            copy._matrices = OrderedDict(self._matrices)
+        return copy
+
+    def get_metric(self, ticker, metric, window, entries = None):
+        """
+        Returns the value of a metric at each visible entry of a ticker
+
+        Attributes:
+            ticker (string) - The ticker to compute the metric for
+            metric (string) - One of METRICS
+            window (int or string) - The number of entries or the length of time of the window
+            entries (pandas.DataFrame) - Every visible entry of the ticker, if already retrieved
+
+        Raises:
+            UserWarning - If the ticker is not visible
+            ValueError - If the metric or window is invalid
+        """
+        key = (ticker, metric, check_window(window))
+        version = self._manager.get_ticker_version(ticker)
+        with self._lock:
+            if key in self._results and self._results[key][0] == version:
+                self._results.move_to_end(key)
+                return self._results[key][1]
+        if entries is None:
+            entries = self._manager.get_visible_entries([ticker])
+        values = compute_metric(metric, entries["Timestamp"].to_numpy(), entries["Price"].to_numpy(), key[2])
+        with self._lock:
+            self._results[key] = (version, values)
+            while len(self._results) > self._max_entries:
+                self._results.popitem(last = False)
+        return values
+
+    def get_entries(self, tickers, window, metrics = tuple(METRICS), starting_date = None, ending_date = None):
+        """
+        Returns the visible entries of tickers between two dates, with a column for each metric.
+        Metrics are computed over every entry, so the first entries in the range include
+        earlier entries in their window
+
+        Attributes:
+            tickers (list[string]) - The tickers to return entries for
+            window (int or string) - The number of entries or the length of time of the window
+            metrics (iterable[string]) - The metrics to add, from METRICS
+            starting_date (string) - The first date that entries should be returned from in format (yyyy-mm-dd)
+            ending_date (string) - The last date that entries should be returned from in format (yyyy-mm-dd)
+
+        Raises:
+            UserWarning - If none of the tickers have entries between the dates
+            ValueError - If a metric or the window is invalid
+        """
+        frames = []
+        for ticker in dict.fromkeys(tickers):
+            try:
+                entries = self._manager.get_visible_entries([ticker])
+            except UserWarning:
+                continue
+            columns = {METRICS[metric]: self.get_metric(ticker, metric, window, entries) for metric in metrics}
+            entries = entries.assign(**columns)
+            start, stop = dates.get_date_range(entries["Timestamp"].to_numpy(), starting_date, ending_date)
+            frames.append(entries.iloc[start:stop])
+        entries = pd.concat(frames) if len(frames) > 0 else pd.DataFrame()
+        if len(entries) == 0:
+            raise UserWarning("Warning: No entries for the entered assets could be found")
+        return entries
+
+    def get_aligned_prices(self, tickers, frequency = None, starting_date = None, ending_date = None):
+        """
+        Returns the price of each visible ticker at every time of a common grid, as a dataframe
+        with a row for each time and a column for each ticker. The price at each time is the
+        latest price at or before it, or NaN before the first entry of the ticker
+
+        Attributes:
+            tickers (list[string]) - The tickers to align. Hidden tickers are left out
+            frequency (string) - The spacing of the grid, such as 1h or 1D. If None, the largest
+                median spacing between the entries of any ticker, rounded down to a whole
+                number of seconds, minutes, hours, days or weeks, is used
+            starting_date (string) - The first date of the grid in format (yyyy-mm-dd)
+            ending_date (string) - The last date of the grid in format (yyyy-mm-dd)
+
+        Raises:
+            UserWarning - If none of the tickers are visible
+            ValueError - If the frequency is invalid or the grid would be too large
+        """
+        tickers = list(dict.fromkeys(tickers))
+        entries = self._manager.get_visible_entries(tickers)
+        names = entries["Ticker"].to_numpy()
+        timestamps = entries["Timestamp"].to_numpy()
+        prices = entries["Price"].to_numpy(dtype = "float64")
+        #Entries are grouped by ticker and sorted by time, so each ticker is a contiguous run
+        starts = np.flatnonzero(np.concatenate(([True], names[1:] != names[:-1])))
+        stops = np.append(starts[1:], len(names))
+
+        step = _get_grid_step(timestamps, starts, stops, frequency)
+        first = timestamps[starts].min() if starting_date is None else np.datetime64(pd.Timestamp(starting_date))
+        last = timestamps[stops - 1].max() if ending_date is None else \
+            dates.get_end_of_date(ending_date) - np.timedelta64(1, "ns")
+        first = pd.Timestamp(first).floor(pd.Timedelta(step)).to_datetime64()
+        num_times = (last - first) // step + 1
+        if num_times > _MAX_GRID_POINTS:
+            raise ValueError("The time grid would contain more than {} times, please choose a larger frequency"
+                             .format(_MAX_GRID_POINTS))
+        if num_times * len(starts) > _MAX_ALIGNED_VALUES:
+            raise ValueError("Aligning {} tickers on {} times would hold more than {} prices, please choose a larger "
+                             "frequency, a shorter date range or fewer tickers"
+                             .format(len(starts), num_times, _MAX_ALIGNED_VALUES))
+        grid = np.arange(first, last + np.timedelta64(1, "ns"), step)
+
+        aligned = np.full((len(grid), len(starts)), np.nan)
+        for column, (start, stop) in enumerate(zip(starts, stops)):
+            #Position of the latest entry at or before each time of the grid
+            positions = start + timestamps[start:stop].searchsorted(grid, "right") - 1
+            found = positions >= start
+            aligned[found, column] = prices[positions[found]]
+        return pd.DataFrame(aligned, index = pd.DatetimeIndex(grid, name = "Timestamp"),
+                            columns = pd.Index(names[starts], name = "Ticker"))
+
+    def get_correlation(self, tickers, frequency = None, starting_date = None, ending_date = None):
+        """
+        Returns the correlation between the percent changes of every pair of visible tickers
+        over a common time grid. Each pair uses the times at which both tickers have a change
+
+        Attributes are the same as get_aligned_prices
+        """
+        return self._get_matrices(tickers, frequency, starting_date, ending_date)[0]
+
+    def get_covariance(self, tickers, frequency = None, starting_date = None, ending_date = None):
+        """
+        Returns the covariance between the percent changes of every pair of visible tickers
+        over a common time grid. Each pair uses the times at which both tickers have a change
+
+        Attributes are the same as get_aligned_prices
+        """
+        return self._get_matrices(tickers, frequency, starting_date, ending_date)[1]
+
+    def _get_matrices(self, tickers, frequency, starting_date, ending_date):
+        """
+        Returns the memoized correlation and covariance matrices of tickers, computing both
+        if any of the tickers changed since they were computed. Hidden tickers are left out
+        before the matrices are looked up, so hiding a ticker never returns it
+        """
+        tickers = tuple(ticker for ticker in dict.fromkeys(tickers) if self._manager.is_visible(ticker))
+        key = (tickers, frequency, starting_date, ending_date)
+        versions = tuple(self._manager.get_ticker_version(ticker) for ticker in tickers)
+        with self._lock:
+            if key in self._matrices and self._matrices[key][0] == versions:
+                self._matrices.move_to_end(key)
+                return self._matrices[key][1]
+        aligned = self.get_aligned_prices(tickers, frequency, starting_date, ending_date)
+        changes = aligned.to_numpy()
+        changes = (changes[1:] / changes[:-1] - 1) * 100
+        correlation, covariance = pairwise_moments(changes)
+        matrices = (pd.DataFrame(correlation, index = aligned.columns, columns = aligned.columns),
+                    pd.DataFrame(covariance, index = aligned.columns, columns = aligned.columns))
+        with self._lock:
+            self._matrices[key] = (versions, matrices)
+            while len(self._matrices) > self._max_matrices:
+                self._matrices.popitem(last = False)
+        return matrices
+
+def pairwise_moments(values):
+    """
+    Returns the correlation and covariance matrices between every pair of columns, using
+    the rows where both columns are not NaN. Every pair is computed at once with matrix
+    products, so the cost is dominated by a few products of the columns with themselves
+
+    Attributes:
+        values (numpy.ndarray) - Two dimensional array with a column for each series
+
+    Returns:
+        Tuple of the correlation and covariance matrices. Pairs with fewer than two shared
+        rows are NaN
+    """
+    values = np.asarray(values, dtype = "float64")
+    valid = ~np.isnan(values)
+    mask = valid.astype("float64")
+    #Centering each column first keeps the sums of products small and precise
+    num_valid = valid.sum(axis = 0)
+    means = np.where(valid, values, 0.0).sum(axis = 0) / np.maximum(num_valid, 1)
+    centered = np.where(valid, values - means, 0.0)
+
+    counts = mask.T @ mask #Number of rows where both columns are valid
+    sums = centered.T @ mask #Sum of the first column over the rows where both are valid
+    products = centered.T @ centered
+    squares = (centered * centered).T @ mask
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        deviations = products - sums * sums.T / counts
+        variances = squares - sums * sums / counts
+        covariance = deviations / (counts - 1)
+        correlation = np.clip(deviations / np.sqrt(variances * variances.T), -1, 1)
+    covariance[counts < 2] = np.nan
+    correlation[counts < 2] = np.nan
+    return (correlation, covariance)
+
+def _get_grid_step(timestamps, starts, stops, frequency):
+    """
+    Returns the spacing of the time grid as a numpy timedelta64
+
+    Raises:
+        ValueError - If the frequency is not a length of time
+    """
+    if frequency is not None:
+        try:
+            step = pd.Timedelta(pd.tseries.frequencies.to_offset(frequency))
+        except (TypeError, ValueError):
+            raise ValueError("{} is not a length of time such as 1h or 1D".format(frequency))
+        if step <= pd.Timedelta(0):
+            raise ValueError("The frequency must be a positive length of time")
+        return step.to_timedelta64()
+    gaps = np.diff(timestamps).astype("timedelta64[ns]")
+    #The gaps of a ticker whose entries are in [start, stop) are in [start, stop - 1)
+    medians = [np.median(gaps[start:stop - 1]) for start, stop in zip(starts, stops) if stop - start > 1]
+    if len(medians) == 0 or max(medians) <= np.timedelta64(0, "ns"):
+        return _DEFAULT_FREQUENCY.to_timedelta64()
+    fitting = [step for step in _GRID_FREQUENCIES if step <= pd.Timedelta(max(medians))]
+    return (fitting[-1] if len(fitting) > 0 else _GRID_FREQUENCIES[0]).to_timedelta64()
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Mar 26 11:05:52 2022
+
+Contains all classes responsible for caching loaded spreadsheets on disk and the
+results of queries in memory
+
+@author: Dylan Munro
+"""
+
+from collections import OrderedDict
+from typing import Final
+
+import hashlib
+import os
+import sys
+import threading
+
+_feather = None #pyarrow.feather, which is imported on first use as it is slow to import
+
+def _import_feather():
+    """
+    Returns the pyarrow.feather module, or None if pyarrow is not installed
+    """
+    global _feather
+    if _feather is None:
+        try:
+            import pyarrow.feather as feather
+            _feather = feather
+        except ImportError: #Caching is disabled when pyarrow is not installed
+            _feather = False
+    return _feather or None
+
+class FrameCache:
+    """
+    Stores the prepared dataframe of a spreadsheet in the Feather (Arrow IPC) format so that
+    later runs can skip parsing, sorting and generating derived columns
+
+    A cached frame is only used if the path, size and modification time of the
+    spreadsheet are unchanged since the frame was stored
+
+    Attributes:
+        cache_directory (string) - The directory which holds cached frames. If None, cached
+            frames are stored in a .cache directory next to each spreadsheet
+    """
+
+    _DEFAULT_DIRECTORY:Final = ".cache"
+    _EXTENSION:Final = ".feather"
+    _FORMAT_VERSION:Final = 2 #Increment whenever the layout of prepared frames changes
+
+    def __init__(self, cache_directory = None):
+        self._cache_directory = cache_directory
+
+    @staticmethod
+    def is_available():
+        """
+        Returns True if the libraries required for caching are installed
+        """
+        return _import_feather() is not None
+
+    def _get_directory(self, file_path):
+        if self._cache_directory is not None:
+            return self._cache_directory
+        return os.path.join(os.path.dirname(os.path.abspath(file_path)), self._DEFAULT_DIRECTORY)
+
+    def _get_key(self, file_path):
+        """
+        Returns a hash identifying the current contents of the file at file_path
+
+        Raises:
+            FileNotFoundError: If the file at the file_path does not exist
+        """
+        stats = os.stat(file_path)
+        key = "|".join([os.path.abspath(file_path), str(stats.st_size),
+                        str(stats.st_mtime_ns), str(self._FORMAT_VERSION)])
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    def get_cache_path(self, file_path):
+        """
+        Returns the path of the cached frame for the current version of the file at file_path
+        """
+        file_name = ".".join([os.path.basename(file_path), self._get_key(file_path)])
+        return os.path.join(self._get_directory(file_path), file_name + self._EXTENSION)
+
+    def load(self, file_path):
+        """
+        Returns the cached frame of the file at file_path, or None if no valid cache exists
+
+        Attributes:
+            file_path - The path to the spreadsheet
+        """
+        if not self.is_available():
+            return None
+        try:
+            cache_path = self.get_cache_path(file_path)
+            if not os.path.exists(cache_path):
+                return None
+            #Uncompressed files are memory mapped so numeric columns are not copied when read
+            table = _import_feather().read_table(cache_path, memory_map = True)
+            return table.to_pandas(split_blocks = True)
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def store(self, file_path, df):
+        """
+        Writes a prepared frame to the cache, replacing older caches of the same file
+
+        Attributes:
+            file_path - The path to the spreadsheet
+            df - The prepared frame of the spreadsheet
+
+        Returns:
+            True if the frame was cached, False otherwise
+        """
+        if not self.is_available():
+            return False
+        try:
+            cache_path = self.get_cache_path(file_path)
+            directory = os.path.dirname(cache_path)
+            os.makedirs(directory, exist_ok = True)
+            self._remove_stale_entries(directory, os.path.basename(file_path))
+            temp_path = cache_path + ".tmp"
+            _import_feather().write_feather(df, temp_path, compression = "uncompressed")
+            os.replace(temp_path, cache_path)
+            return True
+        except (OSError, ValueError, TypeError, NotImplementedError):
+            return False
+
+    def _remove_stale_entries(self, directory, file_name):
+        """
+        Deletes all cached frames of the given file name
+        """
+        prefix = file_name + "."
+        for entry in os.listdir(directory):
+            if entry.startswith(prefix) and entry.endswith(self._EXTENSION):
+                os.remove(os.path.join(directory, entry))
+
+class QueryCache:
+    """
+    Stores the results of recent queries in memory, discarding the least recently used
+    result once full
+
+    Results are stored with the version of the state they were computed from. Once a query
+    is made with a newer version every stored result is discarded, so stale results are
+    never returned or kept in memory. Queries can be made from several threads at once
+
+    The cache is bounded by the memory used by its results as well as their number. Results
+    larger than max_bytes are returned without being stored, so large views of the entries
+    are never held twice
+
+    Attributes:
+        max_entries (int) - The largest number of results kept
+        max_bytes (int) - The largest number of bytes used by the kept results
+    """
+
+    def __init__(self, max_entries = 32, max_bytes = 64 * 2 ** 20):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._results = OrderedDict() #Each key mapped to its result and size in bytes
+        self._num_bytes = 0
+        self._version = None
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock() #Guards the stored results and counts
+
+    def get(self, query, arguments, version, compute):
+        """
+        Returns the stored result of a query, or computes and stores it if there is none
+
+        Attributes:
+            query (string) - The name of the query
+            arguments (tuple) - The hashable arguments of the query
+            version - Identifies the state the result is computed from
+            compute (function) - Computes the result when called without arguments
+        """
+        key = (query, arguments)
+        with self._lock:
+            if version != self._version:
+                self._clear()
+                self._version = version
+            if key in self._results:
+                self._hits += 1
+                self._results.move_to_end(key)
+                return self._results[key][0]
+            self._misses += 1
+        result = compute()
+        size = self._get_size(result)
+        with self._lock:
+            if version == self._version and key not in self._results and size <= self._max_bytes:
+                self._results[key] = (result, size)
+                self._num_bytes += size
+                while len(self._results) > self._max_entries or self._num_bytes > self._max_bytes:
+                    self._num_bytes -= self._results.popitem(last = False)[1][1]
+        return result
+
+    @staticmethod
+    def _get_size(result):
+        """
+        Returns the number of bytes used by a result, counting the values of dataframes and lists
+        """
+        if hasattr(result, "memory_usage"):
+            return int(result.memory_usage(index = True, deep = True).sum())
+        if isinstance(result, (list, tuple)):
+            return sys.getsizeof(result) + sum(sys.getsizeof(value) for value in result)
+        return sys.getsizeof(result)
+
+    def _clear(self):
+        self._results.clear()
+        self._num_bytes = 0
+
+    def clear(self):
+        """
+        Discards all stored results. The hit and miss counts are kept
+        """
+        with self._lock:
+            self._clear()
+
+    def get_hits(self):
+        return self._hits
+
+    def get_misses(self):
+        return self._misses
+
+    def to_dict(self):
+        """
+        Returns the hit and miss counts and the number and size of stored results
+        """
+        return {"hits": self._hits, "misses": self._misses, "entries": len(self._results),
+                "max_entries": self._max_entries, "bytes": self._num_bytes, "max_bytes": self._max_bytes}
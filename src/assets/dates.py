@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Jul 10 14:21:36 2022
+
+Contains all functions responsible for finding the entries of sorted timestamps that
+fall between two dates
+
+@author: Dylan Munro
+"""
+
+import numpy as np
+import pandas as pd
+
+def get_date_range(timestamps, starting_date, ending_date):
+    """
+    Returns the [start, stop) positions of the sorted timestamps between two dates
+
+    Attributes:
+        timestamps (numpy.ndarray) - Sorted timestamps
+        starting_date (string) - The first date that positions should be returned from in format (yyyy-mm-dd)
+        ending_date (string) - The last date that positions should be returned from in format (yyyy-mm-dd)
+    """
+    start, stop = 0, len(timestamps)
+    if starting_date is not None:
+        start = timestamps.searchsorted(np.datetime64(pd.Timestamp(starting_date)), "left")
+    if ending_date is not None:
+        stop = max(start, timestamps.searchsorted(get_end_of_date(ending_date), "left"))
+    return (start, stop)
+
+def get_end_of_date(ending_date):
+    """
+    Returns the start of the day after the ending date. The ending date is inclusive,
+    so only times before this are within it
+    """
+    return np.datetime64(pd.Timestamp(ending_date) + pd.Timedelta(days = 1))
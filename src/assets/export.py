@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Jun 18 10:12:45 2022
+
+Contains all functions responsible for writing pages of entries to files, so that views
+larger than memory can be exported one page at a time
+
+@author: Dylan Munro
+"""
+
+from typing import Final
+
+import os
+
+CHUNK_SIZE:Final = 100000 #Number of entries written at one time
+FORMATS:Final = {".csv": "csv", ".jsonl": "jsonl", ".parquet": "parquet"}
+
+def get_format(path, file_format = None):
+    """
+    Returns the format entries are exported in, found from the extension of the path
+    unless one is given
+
+    Attributes:
+        path (string) - The path entries are exported to
+        file_format (string) - Either csv, jsonl or parquet
+
+    Raises:
+        ValueError - If the format is not supported
+    """
+    if file_format is None:
+        file_format = FORMATS.get(os.path.splitext(path)[1].lower())
+        if file_format is None:
+            raise ValueError("The format of {} could not be found from its extension. Supported "
+                             "extensions are {}".format(path, ", ".join(FORMATS)))
+    if file_format not in FORMATS.values():
+        raise ValueError("{} is not a supported export format".format(file_format))
+    return file_format
+
+def write_pages(pages, path, file_format = None):
+    """
+    Writes pages of entries to a single file, holding only one page in memory at a time.
+    The file is written next to its destination and moved into place once every page is
+    written, so an interrupted export never leaves a partial file at the path
+
+    Attributes:
+        pages (iterable[pandas.DataFrame]) - Pages of entries with the same columns
+        path (string) - The path of the written file
+        file_format (string) - Either csv, jsonl or parquet. Found from the path if not given
+
+    Returns:
+        The number of entries written
+
+    Raises:
+        ValueError - If the format is not supported, or is parquet and pyarrow is not installed
+    """
+    file_format = get_format(path, file_format)
+    writers = {"csv": _write_csv, "jsonl": _write_jsonl, "parquet": _write_parquet}
+    temporary_path = path + ".tmp"
+    try:
+        num_entries = writers[file_format](pages, temporary_path)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+    return num_entries
+
+def _write_csv(pages, path):
+    num_entries = 0
+    with open(path, "w", encoding = "utf-8", newline = "") as file:
+        for page in pages:
+            page.to_csv(file, header = num_entries == 0, index = False, lineterminator = "\n")
+            num_entries += len(page)
+    return num_entries
+
+def _write_jsonl(pages, path):
+    num_entries = 0
+    with open(path, "w", encoding = "utf-8") as file:
+        for page in pages:
+            if len(page) > 0:
+                file.write(page.to_json(orient = "records", lines = True, date_format = "iso").rstrip("\n") + "\n")
+            num_entries += len(page)
+    return num_entries
+
+def _write_parquet(pages, path):
+    try:
+        #Imported here as pyarrow is slow to import and only needed for parquet
+        import pyarrow as pa
+        import pyarrow.parquet as parquet
+    except ImportError:
+        raise ValueError("Exporting to parquet requires pyarrow to be installed")
+
+    num_entries = 0
+    writer = None
+    try:
+        for page in pages:
+            table = pa.Table.from_pandas(page, preserve_index = False)
+            if writer is None:
+                writer = parquet.ParquetWriter(path, table.schema)
+            else:
+                #Columns without values in a page are given the types of the first page
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+            num_entries += len(page)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError("There are no entries to export")
+    return num_entries
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Apr 16 10:42:17 2022
+
+Contains all classes responsible for retrieving asset prices from the CoinGecko API
+
+Powered by CoinGecko API
+
+@author: Dylan Munro
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Final
+from pycoingecko import CoinGeckoAPI
+
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+class TokenBucket:
+    """
+    Limits the rate of API calls shared between threads
+
+    Attributes:
+        rate (float) - The number of tokens added to the bucket per second
+        capacity (int) - The largest number of tokens the bucket can hold, which is the
+            largest number of calls which can be made at once
+    """
+
+    def __init__(self, rate, capacity):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("The rate and capacity of a token bucket must be positive")
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Removes a token from the bucket, waiting until one is available
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._last_refill) * self._rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+class ResponseCache:
+    """
+    Stores API responses on disk as json files which expire after a time to live
+
+    Attributes:
+        directory (string) - The directory which holds cached responses
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    def _get_path(self, key):
+        file_name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+        return os.path.join(self._directory, file_name)
+
+    def get(self, key, ttl):
+        """
+        Returns the cached response for key, or None if it is missing or older than ttl seconds
+        """
+        try:
+            with open(self._get_path(key), "r", encoding = "utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["fetched_at"] > ttl:
+            return None
+        return entry["content"]
+
+    def put(self, key, content):
+        """
+        Stores a response for key
+        """
+        os.makedirs(self._directory, exist_ok = True)
+        path = self._get_path(key)
+        temp_path = "{}.{}.tmp".format(path, threading.get_ident())
+        with open(temp_path, "w", encoding = "utf-8") as file:
+            json.dump({"fetched_at": time.time(), "content": content}, file)
+        os.replace(temp_path, path)
+
+class PriceFetcher:
+    """
+    Retrieves prices from the CoinGecko API in the format expected by DataManager
+
+    Current prices of many assets are requested in batches within a single call,
+    while price histories are requested concurrently. All calls share a token bucket
+    so the API rate limit is respected, and responses are cached on disk
+
+    Attributes:
+        tickers_to_ids (dict[string:string]) - Dictionary mapping tickers to CoinGecko coin ids.
+            Tickers without an entry are used as coin ids directly
+        vs_currency (string) - The currency prices are quoted in
+        api_base_url (string) - The url of the API. Defaults to the public CoinGecko API
+        cache_directory (string) - The directory which holds cached responses, or None to disable caching
+        calls_per_minute (float) - The largest sustained number of API calls made per minute
+        max_workers (int) - The largest number of API calls made at once
+    """
+
+    _BATCH_SIZE:Final = 250 #Largest number of coin ids requested in one call
+    _CURRENT_PRICE_TTL:Final = 60 #Seconds before a cached current price expires
+    _HISTORY_TTL:Final = 3600 #Seconds before a cached price history expires
+    _DEFAULT_CACHE_DIRECTORY:Final = os.path.join(".cache", "coingecko")
+
+    def __init__(self, tickers_to_ids = None, vs_currency = "usd", api_base_url = None,
+                 cache_directory = _DEFAULT_CACHE_DIRECTORY, calls_per_minute = 30, max_workers = 4):
+        self._tickers_to_ids = dict(tickers_to_ids) if tickers_to_ids is not None else {}
+        self._vs_currency = vs_currency
+        self._api = CoinGeckoAPI()
+        if api_base_url is not None:
+            self._api.api_base_url = api_base_url.rstrip("/") + "/"
+        self._cache = ResponseCache(cache_directory) if cache_directory is not None else None
+        self._bucket = TokenBucket(calls_per_minute / 60, max_workers)
+        self._max_workers = max_workers
+
+    def _get_id(self, ticker):
+        return self._tickers_to_ids.get(ticker, ticker.lower())
+
+    def _call(self, ttl, endpoint, *args, **kwargs):
+        """
+        Calls an endpoint of the API, returning a cached response if one has not expired
+
+        Attributes:
+            ttl (int) - The number of seconds a cached response remains valid
+            endpoint (string) - The name of the CoinGeckoAPI method to call
+            args, kwargs - The arguments passed to the method
+        """
+        key = json.dumps([self._api.api_base_url, endpoint, args, kwargs], sort_keys = True)
+        if self._cache is not None:
+            content = self._cache.get(key, ttl)
+            if content is not None:
+                return content
+        self._bucket.acquire()
+        content = getattr(self._api, endpoint)(*args, **kwargs)
+        if self._cache is not None:
+            self._cache.put(key, content)
+        return content
+
+    def _map(self, function, items):
+        """
+        Calls function on each item concurrently, returning the results in order
+        """
+        if len(items) <= 1:
+            return [function(item) for item in items]
+        with ThreadPoolExecutor(max_workers = self._max_workers) as executor:
+            return list(executor.map(function, items))
+
+    @staticmethod
+    def _to_entries(tickers, timestamps, prices):
+        """
+        Builds a dataframe with the Ticker, Date, Time and Price columns used by DataManager.
+            The exact time of each entry is kept in the Timestamp column
+
+        Attributes:
+            tickers (list[string]) - The ticker of each entry
+            timestamps (list[int]) - The UTC time of each entry in milliseconds since the epoch
+            prices (list[float]) - The price of each entry
+        """
+        times = pd.to_datetime(pd.Series(timestamps, dtype = "int64"), unit = "ms")
+        return pd.DataFrame({
+            "Ticker": pd.Series(tickers, dtype = "category"),
+            "Date": times.dt.normalize(),
+            "Time": times.dt.strftime("%H:%M:%S").astype("category"),
+            "Price": pd.Series(prices, dtype = "float64"),
+            "Timestamp": times
+        })
+
+    def fetch_current_prices(self, tickers):
+        """
+        Returns the latest price of each ticker
+
+        Attributes:
+            tickers (list[string]) - The tickers to retrieve prices for
+
+        Raises:
+            ValueError - If the API returns an error
+        """
+        ids = list(dict.fromkeys(self._get_id(ticker) for ticker in tickers))
+        batches = [ids[i:i + self._BATCH_SIZE] for i in range(0, len(ids), self._BATCH_SIZE)]
+        responses = self._map(
+            lambda batch: self._call(self._CURRENT_PRICE_TTL, "get_price", ",".join(batch),
+                                     self._vs_currency, include_last_updated_at = "true"), batches)
+        prices = {}
+        for response in responses:
+            prices.update(response)
+
+        entry_tickers, timestamps, entry_prices = [], [], []
+        for ticker in tickers:
+            quote = prices.get(self._get_id(ticker), {})
+            if self._vs_currency not in quote:
+                continue
+            entry_tickers.append(ticker)
+            timestamps.append(int(quote.get("last_updated_at", time.time())) * 1000)
+            entry_prices.append(quote[self._vs_currency])
+        return self._to_entries(entry_tickers, timestamps, entry_prices)
+
+    def fetch_price_history(self, tickers, starting_date, ending_date):
+        """
+        Returns all prices of each ticker between two dates. CoinGecko chooses the interval
+        between prices based on the length of the range
+
+        Attributes:
+            tickers (list[string]) - The tickers to retrieve prices for
+            starting_date (string) - The first date to retrieve prices from in format (yyyy-mm-dd)
+            ending_date (string) - The last date to retrieve prices from in format (yyyy-mm-dd)
+
+        Raises:
+            ValueError - If the dates are invalid or the API returns an error
+        """
+        utc = datetime.timezone.utc
+        start = datetime.datetime.strptime(starting_date, "%Y-%m-%d").replace(tzinfo = utc)
+        end = datetime.datetime.strptime(ending_date, "%Y-%m-%d").replace(tzinfo = utc)
+        end += datetime.timedelta(days = 1)
+        histories = self._map(
+            lambda ticker: self._call(self._HISTORY_TTL, "get_coin_market_chart_range_by_id",
+                                      self._get_id(ticker), self._vs_currency,
+                                      int(start.timestamp()), int(end.timestamp())), tickers)
+
+        entry_tickers, timestamps, prices = [], [], []
+        for ticker, history in zip(tickers, histories):
+            for timestamp, price in history.get("prices", []):
+                entry_tickers.append(ticker)
+                timestamps.append(int(timestamp))
+                prices.append(price)
+        return self._to_entries(entry_tickers, timestamps, prices)
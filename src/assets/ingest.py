@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Apr  3 15:21:08 2022
+
+Contains all functions responsible for reading asset spreadsheets into compact dataframes
+
+@author: Dylan Munro
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Final
+
+import glob
+import itertools
+import os
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+CHUNK_SIZE:Final = 250000 #Number of rows parsed at one time
+SUPPORTED_EXTENSIONS:Final = (".csv", ".xlsx")
+
+#Columns stored as categories, as they contain few distinct values relative to their length
+_CATEGORICAL_COLUMNS:Final = ("Ticker", "Time")
+
+def read_file(file_path, file_extension, chunk_size = CHUNK_SIZE):
+    """
+    Reads a spreadsheet in chunks, converting each chunk to compact types before the
+    next chunk is parsed
+
+    Attributes:
+        file_path - The path to the file
+        file_extension - The extension of the file, either .csv or .xlsx
+        chunk_size (int) - The number of rows parsed at one time
+
+    Raises:
+        ValueError: If the file being loaded is not supported
+        FileNotFoundError: If the file at the file_path does not exist
+    """
+    if file_extension == ".csv":
+        chunks = _read_csv_chunks(file_path, chunk_size)
+    elif file_extension == ".xlsx":
+        chunks = _read_xlsx_chunks(file_path, chunk_size)
+    else:
+        raise ValueError("{} files are not supported".format(file_extension))
+    return concat_chunks([compact_chunk(chunk) for chunk in chunks])
+
+def find_files(pattern):
+    """
+    Returns the sorted paths of all supported spreadsheets in a directory or matching
+    a glob pattern, such as resources/spreadsheets/*.csv
+    
+    Attributes:
+        pattern (string) - The path to a directory, or a glob pattern
+    
+    Raises:
+        FileNotFoundError: If no supported spreadsheets are found
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*")
+    file_paths = sorted(file_path for file_path in glob.glob(pattern)
+                        if os.path.splitext(file_path)[1] in SUPPORTED_EXTENSIONS and os.path.isfile(file_path))
+    if len(file_paths) == 0:
+        raise FileNotFoundError("No spreadsheets were found at {}".format(pattern))
+    return file_paths
+
+def read_partitions(file_paths, processes = None, chunk_size = CHUNK_SIZE):
+    """
+    Reads spreadsheets in parallel with a process pool. Each file is returned as a separate
+    partition, sorted and with the derived columns generated by DataManager, so that the
+    partitions can be combined with DataManager.merge_partitions
+    
+    Attributes:
+        file_paths (list[string]) - The paths to the files
+        processes (int) - The number of worker processes. Defaults to the number of cores
+        chunk_size (int) - The number of rows parsed at one time
+    
+    Raises:
+        ValueError: If a file is not supported or is missing required columns
+        FileNotFoundError: If a file does not exist
+    """
+    processes = min(processes or os.cpu_count() or 1, len(file_paths))
+    if processes <= 1:
+        return [_read_partition(file_path, chunk_size) for file_path in file_paths]
+    with ProcessPoolExecutor(max_workers = processes) as executor:
+        return list(executor.map(_read_partition, file_paths, [chunk_size] * len(file_paths)))
+
+def _read_partition(file_path, chunk_size):
+    """
+    Reads a spreadsheet and returns its prepared entries. Runs in a worker process
+    """
+    #Imported here as manager is not needed to read single files
+    import src.assets.manager as manager
+    
+    try:
+        entries = read_file(file_path, os.path.splitext(file_path)[1], chunk_size)
+        return manager.DataManager(entries).get_all_entries()
+    except ValueError as e:
+        raise ValueError("{}: {}".format(file_path, e))
+
+def _read_csv_chunks(file_path, chunk_size):
+    """
+    Yields chunks of a csv file, parsing the categorical columns directly as categories
+    """
+    header = pd.read_csv(file_path, nrows = 0).columns
+    dtypes = {column: "category" for column in header
+              if column.lower().capitalize() in _CATEGORICAL_COLUMNS}
+    yield from pd.read_csv(file_path, chunksize = chunk_size, dtype = dtypes)
+
+def _read_xlsx_chunks(file_path, chunk_size):
+    """
+    Yields chunks of the first worksheet of an xlsx file, streaming rows from disk
+    instead of loading the whole workbook
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(file_path, read_only = True, data_only = True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only = True)
+        header = next(rows, None)
+        if header is None:
+            return
+        #Cells outside of the table may still be reported by the worksheet as empty values
+        columns = [i for i, column in enumerate(header) if column is not None]
+        header = [header[i] for i in columns]
+        while True:
+            records = list(itertools.islice(rows, chunk_size))
+            if len(records) == 0:
+                break
+            records = [[row[i] for i in columns] for row in records]
+            records = [row for row in records if any(value is not None for value in row)]
+            yield pd.DataFrame.from_records(records, columns = header)
+    finally:
+        workbook.close()
+
+def compact_chunk(chunk):
+    """
+    Converts the columns of a parsed chunk to compact types
+
+    Ticker and Time become categories, Date becomes datetime64 and Price becomes float64
+
+    Attributes:
+        chunk (pandas.DataFrame) - Rows of a spreadsheet with unconverted columns
+    """
+    chunk.columns = [str(column).lower().capitalize() for column in chunk.columns]
+    for column in _CATEGORICAL_COLUMNS:
+        if column in chunk and chunk[column].dtype != "category":
+            values = chunk[column]
+            chunk[column] = values.where(values.isna(), values.astype(str)).astype("category")
+    if "Date" in chunk:
+        chunk["Date"] = pd.to_datetime(chunk["Date"])
+    if "Price" in chunk:
+        chunk["Price"] = pd.to_numeric(chunk["Price"]).astype("float64")
+    return chunk
+
+def concat_chunks(chunks):
+    """
+    Concatenates compacted chunks, merging the categories of categorical columns so that
+    they are not converted back to objects
+
+    Attributes:
+        chunks (list[pandas.DataFrame]) - Chunks returned by compact_chunk
+    """
+    if len(chunks) == 0:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0]
+    columns = {}
+    for column in chunks[0].columns:
+        if chunks[0][column].dtype == "category":
+            merged = union_categoricals([chunk[column] for chunk in chunks], sort_categories = True)
+            columns[column] = pd.Series(merged, name = column)
+        else:
+            columns[column] = pd.concat([chunk[column] for chunk in chunks], ignore_index = True)
+        for chunk in chunks: #Release each column once it has been merged
+            del chunk[column]
+    return pd.DataFrame(columns)
@@ -11,13 +11,23 @@ Powered by CoinGecko API
 @author: Dylan Munro
 """
 
-import src.graphs.graph as graph
+import src.assets.analytics as analytics
+import src.assets.cache as cache
+import src.assets.dates as dates
+import src.assets.export as export
+import src.assets.ingest as ingest
+import src.assets.parallel as parallel
+import src.assets.partitions as partitions
+import src.assets.stats as stats
+import src.graphs.resample as resample
 
 from typing import Final
-from pycoingecko import CoinGeckoAPI
-cg = CoinGeckoAPI()
+
+#src.graphs.graph is imported by the methods plotting assets, as matplotlib is slow to import
+import copy
 import datetime
 
+import numpy as np
 import pandas as pd
 
 class DataManager:
@@ -28,38 +38,170 @@ class DataManager:
     
     Attributes:
         all_entries (pandas.DataFrame) - Full Dataframe of all asset entries loaded into the program
-        visible_entries (pandas.DataFrame) - Dataframe of asset entries which are currently visible. 
-            To allow for fast viewing and computation, only part of the full dataframe is loaded into view at
-            one time
+        all_visible (bool) - True if every ticker is visible unless listed in toggled_tickers.
+            False if only the tickers listed in toggled_tickers are visible
+        toggled_tickers (set[string]) - The hidden tickers if all_visible is True, otherwise the
+            visible tickers. To allow for fast viewing and computation, the visible entries are only
+            built from the full dataframe when they are requested
+        num_visible_entries (int) - The number of rows belonging to visible tickers
         tickers_to_assets (dict[string:Asset]) - 
             Dictionary mapping the ticker of an asset to its object representation
         names_to_tickers (dict[string:string]) -
             Dictionary mapping the name of an asset to its ticker
         assets_to_graphs (dict[Asset:Graph]) -
             Dictionary mapping each Asset with its current graphical representation
+        ticker_ranges (dict[string:tuple(int, int)]) -
+            Dictionary mapping each ticker to the contiguous [start, stop) row positions
+            of its entries in the sorted full dataframe
+        appended_entries (dict[string:list(pandas.DataFrame)]) -
+            Dictionary mapping each ticker to the batches of entries appended after its
+            entries in the full dataframe. Batches are merged into the full dataframe once
+            enough rows have been appended
             
     Methods:
         
     """
     
     _REQUIRED_COLUMNS:Final = {"Ticker", "Date", "Time", "Price"}
+    _MERGE_RATIO:Final = 0.25 #Appended rows are merged once they exceed this fraction of the full dataframe
+    _MIN_MERGE_ROWS:Final = 10000 #Appended rows are never merged before this many rows are appended
+    _MAX_BATCHES_PER_TICKER:Final = 32 #Appended batches of a ticker are combined beyond this number
+    _COMPACT_CATEGORICAL_COLUMNS:Final = ("Ticker", "Time") #Stored as categories in compact mode
+    _COMPACT_FLOAT_COLUMNS:Final = ("Price",) #Stored as float32 in compact mode if no precision is lost
     
-    def __init__(self, all_entries):
+    def __init__(self, all_entries, prepared = False, recorder = None, compact = False):
         """
         Attributes:
             all_entries - Dataframe containing all asset entries to be loaded into program
+            prepared (bool) - True if all_entries was previously returned by get_all_entries,
+                in which case sorting and generating derived columns are skipped
+            recorder (stats.Recorder) - Records the time and memory used by each stage of
+                processing. If None, stages are not measured
+            compact (bool) - True if entries are stored in smaller types where no information
+                is lost. Entries are returned in their original types either way
             
         Raises:
             ValueError - If the dataframe is missing required columns
         """
+        self._recorder = recorder if recorder is not None else stats.Recorder()
+        self._compact = compact
+        self._columns = None #Columns of the returned entries, if compact mode removes any
+        self._original_dtypes = {} #Types of the columns narrowed by compact mode
         if (all_entries is not None):
             self._assets_to_graphs = None
             self._all_entries = all_entries
-            self._capitalize_columns()
-            self._check_column_validity()
-            self._all_entries = self._all_entries.sort_values(["Ticker", "Date", "Time"])
-            self._generate_percent_change()
-            self._visible_entries = self._all_entries
+            if not prepared:
+                self._capitalize_columns()
+                self._check_column_validity()
+                with self._recorder.measure_stage("timestamps", len(self._all_entries)):
+                    self._generate_timestamps()
+                with self._recorder.measure_stage("sort", len(self._all_entries)):
+                    self._all_entries = self._all_entries.sort_values(["Ticker", "Timestamp"])
+                    self._all_entries = self._all_entries.reset_index(drop = True)
+                self._generate_percent_change()
+            if compact:
+                self._compact_entries()
+            self._build_ticker_index()
+            self._init_state()
+    
+    def _init_state(self):
+        """
+        Sets up the appended entries, versions and query cache once the ticker index is built,
+            and makes every ticker visible. Called by the constructor of every manager
+        """
+        self._appended_entries = {}
+        self._num_appended_entries = 0
+        self._ticker_versions = {} #Incremented each time entries are added to a ticker
+        self._entries_version = 0 #Incremented each time entries are added
+        self._visible_version = 0 #Incremented each time the visible tickers may change
+        self._queries = cache.QueryCache()
+        self.load_all_entries()
+    
+    def _compact_entries(self):
+        """
+        Converts the full dataframe to the compact layout. The Date column is removed if it can
+            be rebuilt from the Timestamp column, and prices are stored as float32 if every price
+            converts back to the same float64 value
+        """
+        self._columns = list(self._all_entries.columns)
+        if self._is_date_derived(self._all_entries):
+            self._all_entries = self._all_entries.drop(columns = "Date")
+        compact_dtypes = {}
+        for column in self._COMPACT_CATEGORICAL_COLUMNS:
+            if self._all_entries[column].dtype != "category":
+                compact_dtypes[column] = "category"
+        for column in self._COMPACT_FLOAT_COLUMNS:
+            if self._all_entries[column].dtype == "float64" and self._fits_float32(self._all_entries[column]):
+                compact_dtypes[column] = "float32"
+        self._original_dtypes = {column: self._all_entries[column].dtype for column in compact_dtypes}
+        self._all_entries = self._all_entries.astype(compact_dtypes)
+        if "Date" in self._all_entries and len(self._original_dtypes) == 0:
+            self._columns = None
+
+    @staticmethod
+    def _is_date_derived(entries):
+        """
+        Returns True if the Date column of entries is the date of the Timestamp column
+        """
+        return (entries["Date"].dtype == "datetime64[ns]"
+                and np.array_equal(entries["Date"].to_numpy(),
+                                   entries["Timestamp"].dt.normalize().to_numpy(), equal_nan = True))
+
+    @staticmethod
+    def _fits_float32(values):
+        """
+        Returns True if every value converts to float32 and back without changing
+        """
+        values = values.to_numpy()
+        return np.array_equal(values.astype("float32").astype("float64"), values, equal_nan = True)
+
+    def _fits_compact_layout(self, entries):
+        """
+        Returns True if entries in the original layout can be converted to the layout of the
+            full dataframe without losing information
+        """
+        if "Date" not in self._all_entries and not self._is_date_derived(entries):
+            return False
+        return all(dtype == "category" or self._fits_float32(entries[column])
+                   for column, dtype in self._get_compact_dtypes().items())
+
+    def _get_compact_dtypes(self):
+        return {column: self._all_entries[column].dtype for column in self._original_dtypes}
+
+    def _to_compact_layout(self, entries):
+        """
+        Converts entries in the original layout to the layout of the full dataframe
+        """
+        if self._columns is None:
+            return entries
+        if "Date" not in self._all_entries:
+            entries = entries.drop(columns = "Date")
+        compact_dtypes = {column: "category" if dtype == "category" else dtype
+                          for column, dtype in self._get_compact_dtypes().items()}
+        return entries.astype(compact_dtypes)
+
+    def _to_original_layout(self, entries):
+        """
+        Converts entries of the full dataframe back to the columns and types they were given in,
+            so results are identical whether or not compact mode is used
+        """
+        if self._columns is None:
+            return entries
+        entries = entries.astype(self._original_dtypes)
+        if "Date" not in entries:
+            entries["Date"] = entries["Timestamp"].dt.normalize()
+        return entries[self._columns]
+
+    def _expand_entries(self):
+        """
+        Converts the full dataframe and all appended entries back to the original layout, which
+            is needed once entries which do not fit the compact layout are appended
+        """
+        self._all_entries = self._to_original_layout(self._all_entries)
+        for ticker, batches in self._appended_entries.items():
+            self._appended_entries[ticker] = [self._to_original_layout(batch) for batch in batches]
+        self._columns = None
+        self._original_dtypes = {}
     
     def _capitalize_columns(self):
         """
@@ -74,33 +216,306 @@ class DataManager:
         """
         Checks if the dataframe contains required columns
         """
-        required_columns_remaining = self._REQUIRED_COLUMNS
+        required_columns_remaining = set(self._REQUIRED_COLUMNS)
         for column in self._all_entries.columns:
             if column in self._REQUIRED_COLUMNS:
                 required_columns_remaining.remove(column)
         if len(required_columns_remaining) > 0:
             raise ValueError("The spreadsheet is missing several required columns")
             
-    def _generate_percent_change(self):
+    def _generate_timestamps(self):
+        """
+        Generates a single datetime64 Timestamp column from the Date and Time columns
+            so that entries can be sorted and plotted without parsing strings again. Dates
+            given as strings are stored as datetime64, as they are by ingest.compact_chunk
+        """
+        if self._all_entries["Date"].dtype != "datetime64[ns]":
+            self._all_entries["Date"] = pd.to_datetime(self._all_entries["Date"])
+        if "Timestamp" in self._all_entries:
+            return
+        self._all_entries["Timestamp"] = self._compute_timestamps(self._all_entries)
+
+    @staticmethod
+    def _compute_timestamps(entries):
+        """
+        Returns the date and time of each entry combined into a single datetime64 series
+
+        Attributes:
+            entries (pandas.DataFrame) - Entries containing Date and Time columns
+        """
+        dates = pd.to_datetime(entries["Date"])
+        times = entries["Time"]
+        if times.dtype == "category":
+            #Only parse each distinct time once
+            categories = pd.to_timedelta(times.cat.categories.astype(str))
+            offsets = pd.Series(categories.take(times.cat.codes.to_numpy(), fill_value = pd.NaT),
+                                index = times.index)
+        else:
+            offsets = pd.to_timedelta(times.astype(str))
+        return dates + offsets
+
+    def _generate_percent_change(self, tickers = None):
         """
         Generates percent change between entries of assets. If the asset changes
             between columns, then the percent change is set to 0
+
+        Attributes:
+            tickers (iterable) - If given, only the rows of these tickers are recomputed, found
+                from the ticker index. Otherwise the column is generated for every ticker if it
+                does not exist yet
         """
-        if "Percent Change" in self._all_entries:
+        if tickers is None:
+            if "Percent Change" in self._all_entries:
+                return
+            with self._recorder.measure_stage("percent_change", len(self._all_entries)):
+                self._all_entries["Percent Change"] = self._compute_percent_change(self._all_entries)
             return
-        self._all_entries["Percent Change"] = self._all_entries["Price"].pct_change() * 100
-        
-        #Change percentage errors when an asset changes
-        #false_percentages = self._all_entries.ne(self._all_entries.shift()).filter(like="Ticker").apply(lambda x: x.index[x].tolist())
-        false_percentages = self._all_entries["Ticker"].drop_duplicates().index.array
-        for i in false_percentages:
-            self._all_entries.loc[self._all_entries.index == i, "Percent Change"] = 0
+
+        ranges = sorted(self._ticker_ranges[ticker] for ticker in tickers)
+        if len(ranges) == 0:
+            return
+        with self._recorder.measure_stage("percent_change") as measurement:
+            if "Percent Change" not in self._all_entries:
+                self._all_entries["Percent Change"] = 0.0
+            positions = np.concatenate([np.arange(start, stop) for start, stop in ranges])
+            starts = np.cumsum([0] + [stop - start for start, stop in ranges[:-1]])
+            #Only the rows of the tickers are widened, so the cost does not grow with other tickers
+            prices = self._all_entries["Price"].to_numpy()[positions].astype("float64")
+            self._all_entries.iloc[positions, self._all_entries.columns.get_loc("Percent Change")] = \
+                parallel.compute_by_ticker(parallel.percent_change, {"prices": prices}, starts)
+            measurement.add_rows(len(positions))
+
+    @staticmethod
+    def _compute_percent_change(entries):
+        """
+        Returns the percent change of each entry relative to the previous entry of the
+            same ticker. The first entry of every ticker is set to 0
+
+        Large frames are split into groups of tickers which are computed by a process pool,
+            as described by parallel.compute_by_ticker
+
+        Attributes:
+            entries (pandas.DataFrame) - Entries sorted so that each ticker's rows are in order
+        """
+        #Prices stored as float32 in compact mode are widened so results do not depend on the mode
+        prices = entries["Price"].to_numpy(dtype = "float64")
+        starts = DataManager._find_ticker_starts(entries["Ticker"])
+        return pd.Series(parallel.compute_by_ticker(parallel.percent_change, {"prices": prices}, starts),
+                         index = entries.index)
+
+    @staticmethod
+    def _find_ticker_starts(tickers):
+        """
+        Returns the positions of the first entry of each ticker in a column of tickers whose
+            entries are contiguous
+        """
+        if tickers.dtype == "category":
+            tickers = tickers.cat.codes
+        tickers = tickers.to_numpy()
+        if len(tickers) == 0:
+            return np.empty(0, dtype = "int64")
+        return np.flatnonzero(np.concatenate(([True], tickers[1:] != tickers[:-1])))
             
+    @staticmethod
+    def merge_partitions(partitions):
+        """
+        Combines frames previously returned by get_all_entries, such as the entries of separate
+            spreadsheets, into a single frame in the same format. Duplicate entries with the same
+            ticker and timestamp are dropped, keeping the entry of the earliest partition
+        
+        As the rows of each ticker are contiguous and sorted in every partition, the combined
+            frame is built from these sorted runs instead of sorting every row again. Runs of a
+            ticker which do not overlap in time are placed one after another, and overlapping runs
+            are merged by a stable sort, which merges k sorted runs in O(n log k)
+        
+        Attributes:
+            partitions (list[pandas.DataFrame]) - The prepared frames, which must have the same columns
+        
+        Raises:
+            ValueError - If there are no entries in any partition
+        """
+        partitions = [partition for partition in partitions if len(partition) > 0]
+        if len(partitions) == 0:
+            raise ValueError("None of the spreadsheets contain any entries")
+        if len(partitions) == 1:
+            return partitions[0]
+        columns = partitions[0].columns
+        #Tickers are compared by their category codes, which are shared once categories are merged
+        categorical = {column: "category" for partition in partitions for column in columns
+                       if column == "Ticker" or partition[column].dtype == "category"}
+        offsets = np.cumsum([0] + [len(partition) for partition in partitions])
+        combined = ingest.concat_chunks([partition.reindex(columns = columns).astype(categorical)
+                                         for partition in partitions])
+        codes = combined["Ticker"].cat.codes.to_numpy()
+        timestamps = combined["Timestamp"].to_numpy()
+        
+        #Find the contiguous run of rows of each ticker within each partition
+        run_starts = []
+        for start, stop in zip(offsets[:-1], offsets[1:]):
+            partition_codes = codes[start:stop]
+            boundaries = np.flatnonzero(partition_codes[1:] != partition_codes[:-1]) + 1
+            run_starts.append(np.concatenate(([0], boundaries)) + start)
+        run_starts = np.concatenate(run_starts)
+        run_stops = np.append(run_starts[1:], len(codes))
+        
+        #Order the runs by ticker, then by their first timestamp
+        order = np.lexsort((timestamps[run_starts], codes[run_starts]))
+        run_starts, run_stops = run_starts[order], run_stops[order]
+        run_codes = codes[run_starts]
+        sizes = run_stops - run_starts
+        run_offsets = np.concatenate(([0], np.cumsum(sizes)))
+        positions = np.arange(run_offsets[-1]) + np.repeat(run_starts - run_offsets[:-1], sizes)
+        
+        #Runs sharing a timestamp at their boundary overlap, so that duplicates are ordered by partition
+        overlapping = (run_codes[1:] == run_codes[:-1]) & \
+            (timestamps[run_starts[1:]] <= timestamps[run_stops[:-1] - 1])
+        for code in np.unique(run_codes[1:][overlapping]):
+            lower = run_offsets[np.searchsorted(run_codes, code, "left")]
+            upper = run_offsets[np.searchsorted(run_codes, code, "right")]
+            segment = positions[lower:upper]
+            #Rows of earlier partitions come first in the combined frame, so ties keep the earliest partition
+            positions[lower:upper] = segment[np.lexsort((segment, timestamps[segment]))]
+        
+        #Duplicates are adjacent once merged
+        ordered_codes, ordered_timestamps = codes[positions], timestamps[positions]
+        unique = np.concatenate(([True], (ordered_codes[1:] != ordered_codes[:-1])
+                                 | (ordered_timestamps[1:] != ordered_timestamps[:-1])))
+        merged = combined.take(positions[unique]).reset_index(drop = True)
+        #Percent change is recomputed as the previous entry of a ticker may be in another partition
+        merged["Percent Change"] = DataManager._compute_percent_change(merged)
+        return merged
+
+    def _build_ticker_index(self):
+        """
+        Records the row positions occupied by each ticker in the sorted full dataframe.
+            Entries of a ticker are contiguous after sorting, so a single range is stored per ticker
+        """
+        self._timestamps = self._all_entries["Timestamp"].to_numpy()
+        self._next_label = len(self._all_entries)
+        tickers = self._all_entries["Ticker"].to_numpy()
+        starts = self._find_ticker_starts(self._all_entries["Ticker"])
+        stops = np.append(starts[1:], len(tickers))
+        self._ticker_ranges = {
+            tickers[start]: (start, stop) for start, stop in zip(starts.tolist(), stops.tolist())
+        }
+
+    def _get_ticker_range(self, ticker):
+        """
+        Returns the [start, stop) row positions of a ticker in the full dataframe
+        
+        Raises:
+            ValueError - If the ticker is not present in the full dataframe
+        """
+        try:
+            return self._ticker_ranges[ticker]
+        except KeyError:
+            raise ValueError("{} is not currently loaded. Loading entries cancelled".format(ticker))
+
+    def is_visible(self, ticker):
+        """
+        Returns True if the ticker is loaded in the visible view
+        """
+        if self._all_visible:
+            return ticker in self._ticker_ranges and ticker not in self._toggled_tickers
+        return ticker in self._toggled_tickers
+
+    def _get_ticker_entries(self, ticker, starting_date = None, ending_date = None):
+        """
+        Returns a view of the entries of a ticker in the full dataframe. As the entries of
+            a ticker are sorted by timestamp, the date range is found with a binary search
+        
+        Attributes:
+            ticker (string) - The ticker to return entries for
+            starting_date (string) - The first date that entries should be returned from in format (yyyy-mm-dd)
+            ending_date (string) - The last date that entries should be returned from in format (yyyy-mm-dd)
+        """
+        entries = self._read_stored_entries(ticker, starting_date, ending_date)
+        if ticker in self._appended_entries:
+            appended = pd.concat(self._appended_entries[ticker])
+            appended = self._slice_dates(appended, appended["Timestamp"].to_numpy(),
+                                         starting_date, ending_date)
+            entries = pd.concat([entries, appended])
+        return entries
+
+    def _read_stored_entries(self, ticker, starting_date, ending_date):
+        """
+        Returns the entries of a ticker between two dates, excluding appended entries
+        """
+        start, stop = self._ticker_ranges[ticker]
+        return self._slice_dates(self._all_entries.iloc[start:stop], self._timestamps[start:stop],
+                                 starting_date, ending_date)
+
+    @staticmethod
+    def _slice_dates(entries, timestamps, starting_date, ending_date):
+        """
+        Returns the entries between two dates
+
+        Attributes:
+            entries (pandas.DataFrame) - Entries sorted by timestamp
+            timestamps (numpy.ndarray) - The timestamps of the entries
+            starting_date (string) - The first date that entries should be returned from in format (yyyy-mm-dd)
+            ending_date (string) - The last date that entries should be returned from in format (yyyy-mm-dd)
+        """
+        start, stop = dates.get_date_range(timestamps, starting_date, ending_date)
+        return entries.iloc[start:stop]
+
+    def _get_num_of_entries(self, ticker):
+        """
+        Returns the number of entries of a ticker, including appended entries
+        """
+        start, stop = self._ticker_ranges[ticker]
+        num_appended = sum(len(batch) for batch in self._appended_entries.get(ticker, []))
+        return stop - start + num_appended
+
+    def _materialize_visible_entries(self):
+        """
+        Builds a dataframe containing the rows of all visible tickers in sorted order
+        """
+        self._merge_appended_entries()
+        if self._all_visible and len(self._toggled_tickers) == 0:
+            return self._all_entries
+        ranges = sorted(self._ticker_ranges[ticker] for ticker in self.get_all_visible_tickers())
+        if len(ranges) == 0:
+            return self._all_entries.iloc[0:0]
+        with self._recorder.measure_stage("filter") as measurement:
+            positions = np.concatenate([np.arange(start, stop) for start, stop in ranges])
+            measurement.add_rows(len(positions))
+            return self._all_entries.iloc[positions]
+
+    def check_tickers(self, tickers):
+        """
+        Checks that all tickers are present in the full dataframe
+        
+        Raises:
+            ValueError - If any tickers are not present in full dataframe
+        """
+        for ticker in tickers:
+            self._get_ticker_range(ticker)
+
+    def get_visibility(self):
+        """
+        Returns a copy of the state describing which tickers are visible, which can be
+            restored with set_visibility
+        """
+        return (self._all_visible, set(self._toggled_tickers))
+
+    def set_visibility(self, visibility):
+        """
+        Restores the visible tickers from a state returned by get_visibility
+        """
+        self._all_visible, toggled_tickers = visibility
+        self._toggled_tickers = set(toggled_tickers)
+        self._visible_version += 1
+        self._recount_visible_entries()
+
     def hide_all_entries(self):
         """
         Hides all entries from visible dataframe
         """
-        self._visible_entries = pd.DataFrame()
+        self._all_visible = False
+        self._toggled_tickers = set()
+        self._num_visible_entries = 0
+        self._visible_version += 1
         
     def hide_entries(self, tickers):
         """
@@ -109,9 +524,15 @@ class DataManager:
         Attributes:
             tickers - All tickers to hide from the visible dataframe
         """
-        #Tilde (~) is bitwise not operator
+        self._visible_version += 1
         for ticker in tickers:
-            self._visible_entries = self._visible_entries.loc[~(self._visible_entries["Ticker"] == ticker)]
+            if not self.is_visible(ticker):
+                continue
+            self._num_visible_entries -= self._get_num_of_entries(ticker)
+            if self._all_visible:
+                self._toggled_tickers.add(ticker)
+            else:
+                self._toggled_tickers.discard(ticker)
     
     def load_entries(self, tickers):
         """
@@ -123,30 +544,251 @@ class DataManager:
         Raises:
             ValueError - If any tickers are not present in full dataframe
         """
+        self.check_tickers(tickers)
+        self._visible_version += 1
         for ticker in tickers:
-            try:
-                new_entry = self._all_entries.loc[self._all_entries["Ticker"] == ticker]
-                self._visible_entries = pd.concat([new_entry, self._visible_entries])
-            except ValueError:
-                message = "".join(ticker).join(" is not currently loaded. Loading entries cancelled")
-                raise message             
-        self._visible_entries = self._visible_entries.sort_values(["Ticker", "Date", "Time"])  
+            if self.is_visible(ticker):
+                continue
+            self._num_visible_entries += self._get_num_of_entries(ticker)
+            if self._all_visible:
+                self._toggled_tickers.discard(ticker)
+            else:
+                self._toggled_tickers.add(ticker)
             
     def load_all_entries(self):
         """
         Loads all entries from full dataframe into visible dataframe
         """
-        self._visible_entries = self._all_entries
+        self._all_visible = True
+        self._toggled_tickers = set()
+        self._num_visible_entries = len(self._all_entries) + self._num_appended_entries
+        self._visible_version += 1
+
+    def append_entries(self, entries):
+        """
+        Adds new entries to the full dataframe. Entries of each ticker which are not older than
+            the ticker's latest entry are kept aside and merged into the full dataframe once enough
+            rows are appended, so the cost of each call is proportional to the number of new entries.
+            Percent change continues from the latest price of each ticker
+        
+        New tickers, or entries older than the latest entry of their ticker, require the full
+            dataframe to be sorted again
+        
+        Attributes:
+            entries (pandas.DataFrame) - The new entries, with the same columns required by the constructor.
+                Dates, times and prices may be given as strings, such as entries read from json
+            
+        Raises:
+            ValueError - If the dataframe is missing required columns, or an entry is missing its
+                ticker or has a date, time or price which cannot be read. No entries are appended
+        """
+        batch_manager = DataManager(self._parse_entries(entries), recorder = self._recorder)
+        batch = batch_manager._all_entries
+        if self._columns is not None:
+            if not self._fits_compact_layout(batch):
+                self._expand_entries()
+            batch = self._to_compact_layout(batch)
+        batch = self._match_stored_types(batch.reindex(columns = self._all_entries.columns))
+        new_ranges = batch_manager._ticker_ranges
+        if len(batch) == 0:
+            return
+        self._entries_version += 1
+        for ticker in new_ranges:
+            self._ticker_versions[ticker] = self._ticker_versions.get(ticker, 0) + 1
+        
+        in_order = True
+        for ticker, (start, stop) in new_ranges.items():
+            if ticker not in self._ticker_ranges:
+                in_order = False
+                continue
+            last_timestamp, last_price = self._get_last_entry(ticker)
+            if batch["Timestamp"].iat[start] < last_timestamp:
+                in_order = False
+                continue
+            #Computed as on loading, so a previous price of 0 gives inf rather than raising
+            prices = np.array([last_price, batch["Price"].iat[start]], dtype = "float64")
+            batch.iat[start, batch.columns.get_loc("Percent Change")] = \
+                parallel.percent_change(np.zeros(1, dtype = "int64"), prices)[1]
+        
+        if not in_order:
+            self._merge_appended_entries(batch)
+            self._generate_percent_change(new_ranges)
+            self._recount_visible_entries()
+            return
+        
+        batch.index = pd.RangeIndex(self._next_label, self._next_label + len(batch))
+        self._next_label += len(batch)
+        for ticker, (start, stop) in new_ranges.items():
+            ticker_batches = self._appended_entries.setdefault(ticker, [])
+            ticker_batches.append(batch.iloc[start:stop])
+            if len(ticker_batches) > self._MAX_BATCHES_PER_TICKER:
+                self._appended_entries[ticker] = [pd.concat(ticker_batches)]
+            if self.is_visible(ticker):
+                self._num_visible_entries += stop - start
+        self._num_appended_entries += len(batch)
+        if self._num_appended_entries > max(self._MIN_MERGE_ROWS, len(self._all_entries) * self._MERGE_RATIO):
+            self._merge_appended_entries()
+
+    def _parse_entries(self, entries):
+        """
+        Returns a copy of appended entries with the column types given to loaded spreadsheets
+            by ingest.compact_chunk. Tickers and times are strings, dates are datetime64 and
+            prices are float64
+        
+        Raises:
+            ValueError - If the dataframe is missing required columns, or an entry is missing its
+                ticker or has a date, time or price which cannot be read
+        """
+        entries = entries.copy()
+        entries.columns = [str(column).lower().capitalize() for column in entries.columns]
+        if not self._REQUIRED_COLUMNS.issubset(entries.columns):
+            raise ValueError("The appended entries are missing several required columns")
+        for column in ("Ticker", "Time"):
+            values = entries[column].astype(object)
+            entries[column] = values.where(values.isna(), values.astype(str))
+        dates = pd.to_datetime(entries["Date"], errors = "coerce")
+        times = pd.to_timedelta(entries["Time"], errors = "coerce")
+        prices = pd.to_numeric(entries["Price"], errors = "coerce")
+        invalid = (entries["Ticker"].isna() | (dates.isna() & entries["Date"].notna())
+                   | (times.isna() & entries["Time"].notna()) | (prices.isna() & entries["Price"].notna()))
+        if invalid.any():
+            raise ValueError("Appended entry {} is missing its ticker or has a date, time or price which "
+                             "cannot be read. No entries were appended".format(np.flatnonzero(invalid.to_numpy())[0] + 1))
+        entries["Date"] = dates
+        entries["Price"] = prices.astype("float64")
+        return entries
+    
+    def _match_stored_types(self, batch):
+        """
+        Converts appended entries to the types of the stored columns. Categories of stored
+            columns are extended with the new values of appended entries, so combining stored
+            and appended entries never changes the type of a column
+        """
+        extended = None #Copy of the full dataframe given extended categories, shared with no snapshot
+        for column in batch.columns:
+            dtype = self._all_entries[column].dtype
+            if dtype == "category":
+                values = pd.Index(batch[column].dropna().astype(object).unique())
+                new_values = values.difference(dtype.categories)
+                if len(new_values) > 0:
+                    if extended is None:
+                        extended = self._all_entries.copy(deep = False)
+                    dtype = pd.CategoricalDtype(dtype.categories.union(new_values))
+                    extended[column] = extended[column].cat.set_categories(dtype.categories)
+            if batch[column].dtype != dtype:
+                batch[column] = batch[column].astype(dtype)
+        if extended is not None:
+            self._all_entries = extended
+            dtypes = {column: extended[column].dtype for column in extended.columns
+                      if extended[column].dtype == "category"}
+            for ticker, batches in self._appended_entries.items():
+                self._appended_entries[ticker] = [ticker_batch.astype(dtypes) for ticker_batch in batches]
+        return batch
+    
+    def _get_last_entry(self, ticker):
+        """
+        Returns the timestamp and price of the latest entry of a ticker
+        """
+        if ticker in self._appended_entries:
+            entries = self._appended_entries[ticker][-1]
+            return (entries["Timestamp"].iat[-1], entries["Price"].iat[-1])
+        position = self._ticker_ranges[ticker][1] - 1
+        return (self._timestamps[position], self._all_entries["Price"].iat[position])
 
+    def _merge_appended_entries(self, unsorted_entries = None):
+        """
+        Merges all appended entries into the full dataframe
+        
+        Attributes:
+            unsorted_entries (pandas.DataFrame) - Entries which are not known to be newer than the
+                entries of their tickers. If given, the full dataframe is sorted again
+        """
+        if self._num_appended_entries == 0 and unsorted_entries is None:
+            return
+        if unsorted_entries is None:
+            #Each ticker's appended entries follow its existing entries, so rows only need
+            #to be gathered ticker by ticker instead of sorted
+            appended = [self._all_entries]
+            positions = []
+            offset = len(self._all_entries)
+            for ticker, (start, stop) in self._ticker_ranges.items():
+                positions.append(np.arange(start, stop))
+                for batch in self._appended_entries.get(ticker, []):
+                    appended.append(batch)
+                    positions.append(np.arange(offset, offset + len(batch)))
+                    offset += len(batch)
+            combined = self._concat_entries(appended)
+            self._all_entries = combined.iloc[np.concatenate(positions)].reset_index(drop = True)
+        else:
+            frames = [self._all_entries, unsorted_entries]
+            for batches in self._appended_entries.values():
+                frames.extend(batches)
+            combined = self._concat_entries(frames)
+            with self._recorder.measure_stage("sort", len(combined)):
+                self._all_entries = combined.sort_values(["Ticker", "Timestamp"], kind = "stable")
+                self._all_entries = self._all_entries.reset_index(drop = True)
+        self._appended_entries = {}
+        self._num_appended_entries = 0
+        self._build_ticker_index()
+
+    def _concat_entries(self, frames):
+        """
+        Concatenates entries, keeping categorical columns of the full dataframe as categories
+        """
+        with self._recorder.measure_stage("concat") as measurement:
+            combined = pd.concat(frames, ignore_index = True)
+            for column in self._all_entries.columns:
+                if self._all_entries[column].dtype == "category" and combined[column].dtype != "category":
+                    combined[column] = combined[column].astype("category")
+            measurement.add_rows(len(combined))
+        return combined
+
+    def _recount_visible_entries(self):
+        """
+        Recalculates the number of visible entries from the visible tickers
+        """
+        self._num_visible_entries = sum(self._get_num_of_entries(ticker)
+                                        for ticker in self.get_all_visible_tickers())
+
+    def get_all_entries(self):
+        """
+        Returns the sorted full dataframe, including all derived columns
+        """
+        self._merge_appended_entries()
+        return self._to_original_layout(self._all_entries)
+
+    def snapshot(self):
+        """
+        Returns a copy of the manager which shares its entries but is unaffected by later loads,
+            hides and appends to this manager. Appended entries are merged first, so reading
+            from the copy never modifies it and several threads can read from it at once
+        """
+        self._merge_appended_entries()
+        snapshot = copy.copy(self)
+        snapshot._toggled_tickers = set(self._toggled_tickers)
+        snapshot._ticker_versions = dict(self._ticker_versions)
+        snapshot._appended_entries = {}
+        snapshot._queries = cache.QueryCache()
+        return snapshot
+    
+    def get_version(self):
+        """
+        Returns the versions of the full dataframe and of the visible tickers. Each version
+            increases whenever entries are added or tickers are loaded or hidden respectively
+        """
+        return (self._entries_version, self._visible_version)
+    
+    def get_query_cache(self):
+        """
+        Returns the cache storing the results of queries, which counts its hits and misses
+        """
+        return self._queries
+    
     def get_all_tickers(self):
         """
         Returns a list of all tickers currently loaded in the visible dataframe
         """
-        tickers_list = []
-        tickers_df = self._all_entries["Ticker"].drop_duplicates()
-        for _, ticker in tickers_df.iteritems():
-            tickers_list.append(ticker)
-        return tickers_list
+        return self._queries.get("all_tickers", (), self.get_version(), lambda: list(self._ticker_ranges))
     
     def get_visible_entries(self, tickers, starting_date = None, ending_date = None):
         """
@@ -161,25 +803,32 @@ class DataManager:
         Raises:
             UserWarning - If the ticker is not loaded in the visible dataframe
         """
-        entries_df = pd.DataFrame()
-        for i in range(len(tickers)):
-            ticker = tickers[i]
-            new_entries = self._visible_entries.loc[self._visible_entries["Ticker"] == ticker]
-            entries_df = pd.concat([entries_df, new_entries])
+        return self._queries.get("visible_entries", (tuple(tickers), starting_date, ending_date),
+                                 self.get_version(),
+                                 lambda: self._find_visible_entries(tickers, starting_date, ending_date))
+    
+    def _find_visible_entries(self, tickers, starting_date, ending_date):
+        with self._recorder.measure_stage("filter") as measurement:
+            entries = [self._get_ticker_entries(ticker, starting_date, ending_date)
+                       for ticker in tickers if self.is_visible(ticker)]
+            measurement.add_rows(sum(len(ticker_entries) for ticker_entries in entries))
+        with self._recorder.measure_stage("concat") as measurement:
+            entries_df = pd.concat(entries) if entries else pd.DataFrame()
+            measurement.add_rows(len(entries_df))
         if len(entries_df) == 0:
             raise UserWarning("Warning: No entries for the entered assets could be found")
-        return entries_df
+        return self._to_original_layout(entries_df)
         
     def get_all_visible_tickers(self):
         """
         Returns a list of all tickers currently loaded in visible dataframe
         """
-        assets_list = []
-        assets_df = self._visible_entries["Ticker"].drop_duplicates()
-        #Note: Above returns series, as a single column is returned
-        for _, asset in assets_df.iteritems():
-            assets_list.append(asset)
-        return assets_list
+        return self._queries.get("all_visible_tickers", (), self.get_version(), self._find_all_visible_tickers)
+    
+    def _find_all_visible_tickers(self):
+        if self._all_visible:
+            return [ticker for ticker in self._ticker_ranges if ticker not in self._toggled_tickers]
+        return sorted(self._toggled_tickers, key = lambda ticker: self._ticker_ranges[ticker][0])
             
     def get_all_visible_entries(self):
         """
@@ -188,38 +837,349 @@ class DataManager:
         raises:
             UserWarning - if no rows are currently loaded
         """
-        if len(self._visible_entries) == 0:
+        if self._num_visible_entries == 0:
+            raise UserWarning("No assets are currently loaded")
+        #Not stored in the query cache, as the result can be as large as every entry
+        return self._to_original_layout(self._materialize_visible_entries())
+    
+    def iter_visible_entries(self, page_size):
+        """
+        Returns a generator yielding the entries returned by get_all_visible_entries in pages of
+            page_size rows. Pages are built ticker by ticker, so the visible entries are never
+            combined into one dataframe
+        
+        Attributes:
+            page_size (int) - The number of entries in each page. The last page may be smaller
+        
+        raises:
+            ValueError - if the page size is not positive
+            UserWarning - if no rows are currently loaded
+        """
+        if page_size < 1:
+            raise ValueError("The page size must be a positive number of entries")
+        if self._num_visible_entries == 0:
             raise UserWarning("No assets are currently loaded")
-        return self._visible_entries
+        return self._generate_pages(self.get_all_visible_tickers(), page_size)
     
+    def _generate_pages(self, tickers, page_size):
+        pending = [] #Parts of the next page, which may span several tickers
+        num_pending = 0
+        for ticker in tickers:
+            for entries in self._iter_ticker_entries(ticker, page_size):
+                start = 0
+                while start < len(entries):
+                    part = entries.iloc[start:start + page_size - num_pending]
+                    pending.append(part)
+                    num_pending += len(part)
+                    start += len(part)
+                    if num_pending == page_size:
+                        yield self._to_original_layout(pd.concat(pending) if len(pending) > 1 else pending[0])
+                        pending = []
+                        num_pending = 0
+        if num_pending > 0:
+            yield self._to_original_layout(pd.concat(pending) if len(pending) > 1 else pending[0])
+    
+    def _iter_ticker_entries(self, ticker, chunk_size):
+        """
+        Yields the entries of a ticker, including appended entries, in parts of at most
+            chunk_size rows
+        """
+        entries = self._get_ticker_entries(ticker)
+        for start in range(0, len(entries), chunk_size):
+            yield entries.iloc[start:start + chunk_size]
+    
+    def get_memory_usage(self):
+        """
+        Returns the number of bytes used by each column of the full dataframe and of the visible
+            entries, including appended entries. If every entry is visible, the visible entries
+            share the memory of the full dataframe
+        """
+        self._merge_appended_entries()
+        visible_entries = self._materialize_visible_entries()
+        usage = pd.DataFrame({
+            "All entries (bytes)": self._all_entries.memory_usage(index = True, deep = True),
+            "Visible entries (bytes)": visible_entries.memory_usage(index = True, deep = True)
+        })
+        usage.loc["Total"] = usage.sum()
+        usage.index.name = "Column"
+        return usage
+
     def get_num_of_visible_entries(self):
         """
         Returns the number of rows in the visible dataframe
         """
-        return len(self._visible_entries)
+        return self._num_visible_entries
+
+    def get_columns(self):
+        """
+        Returns the columns of the entries returned by queries
+        """
+        return list(self._to_original_layout(self._all_entries.iloc[0:0]).columns)
+
+    def get_ticker_version(self, ticker):
+        """
+        Returns a number which changes whenever entries of the ticker are added, so results
+            computed from its entries can be reused until it changes
+        """
+        return self._ticker_versions.get(ticker, 0)
+    
+class PartitionedDataManager(DataManager):
+    """
+    DataManager whose entries are stored on disk as per-ticker partitions. Only the directory
+        of tickers is kept in memory, and the entries of a ticker are read from its memory
+        mapped columns when they are requested, so memory use is bounded by the entries being
+        displayed or plotted rather than by the size of the archive
+    
+    Entries can be appended to tickers after their latest entry, and are kept in memory.
+        Entries of new tickers, or older than the latest entry of their ticker, cannot be appended
+    
+    The visible entries are only combined into one dataframe if there are at most
+        MAX_MATERIALIZED_ROWS of them. Larger views are read in pages with iter_visible_entries
+    """
     
+    MAX_MATERIALIZED_ROWS:Final = 1000000 #Most visible entries read into memory at once
+    
+    def __init__(self, store, recorder = None):
+        """
+        Attributes:
+            store (partitions.PartitionStore) - The partitions the entries are read from
+            recorder (stats.Recorder) - Records the time and memory used by each stage of
+                processing. If None, stages are not measured
+        """
+        super().__init__(None, recorder = recorder)
+        self._store = store
+        self._all_entries = store.get_empty_frame()
+        self._ticker_ranges = store.get_ranges()
+        self._timestamps = None
+        self._next_label = store.get_num_rows()
+        self._init_state()
+    
+    def _read_stored_entries(self, ticker, starting_date, ending_date):
+        with self._recorder.measure_stage("partition_read") as measurement:
+            entries = self._store.read(ticker, starting_date, ending_date)
+            measurement.add_rows(len(entries))
+        return self._match_categories(entries)
+    
+    def _match_categories(self, entries):
+        """
+        Gives entries read from the store the categories of the full dataframe, which are
+            extended when appended entries contain new values
+        """
+        dtypes = {column: self._all_entries[column].dtype for column in entries.columns
+                  if entries[column].dtype == "category" and entries[column].dtype != self._all_entries[column].dtype}
+        return entries.astype(dtypes) if len(dtypes) > 0 else entries
+    
+    def _iter_ticker_entries(self, ticker, chunk_size):
+        #Partitions are read in parts, so a page never holds more than chunk_size rows of a ticker
+        start, stop = self._ticker_ranges[ticker]
+        for position in range(0, stop - start, chunk_size):
+            yield self._match_categories(self._store.read_rows(ticker, position, position + chunk_size))
+        for batch in self._appended_entries.get(ticker, []):
+            yield batch
+    
+    def _get_last_entry(self, ticker):
+        if ticker in self._appended_entries:
+            return super()._get_last_entry(ticker)
+        return self._store.get_last_entry(ticker)
+    
+    def _merge_appended_entries(self, unsorted_entries = None):
+        #Appended entries stay in memory, as the partitions on disk are never rewritten
+        if unsorted_entries is not None:
+            raise ValueError("Only entries newer than the latest entry of an existing ticker can be "
+                             "appended to entries stored on disk")
+    
+    def _materialize_visible_entries(self):
+        if self._num_visible_entries > self.MAX_MATERIALIZED_ROWS:
+            raise UserWarning("{} entries are visible, more than the {} which are read from disk at once. "
+                              "Hide some tickers, or page through or export the visible entries instead"
+                              .format(self._num_visible_entries, self.MAX_MATERIALIZED_ROWS))
+        entries = [self._get_ticker_entries(ticker) for ticker in self.get_all_visible_tickers()]
+        return pd.concat(entries) if len(entries) > 0 else self._all_entries
+    
+    def load_all_entries(self):
+        super().load_all_entries()
+        self._num_visible_entries += self._store.get_num_rows()
+    
+    def get_all_entries(self):
+        """
+        Returns every entry sorted by ticker and timestamp. Every partition is read into memory
+        """
+        entries = [self._get_ticker_entries(ticker) for ticker in self._ticker_ranges]
+        return pd.concat(entries) if len(entries) > 0 else self._all_entries
+    
+    def snapshot(self):
+        snapshot = super().snapshot()
+        snapshot._appended_entries = {ticker: list(batches) for ticker, batches in self._appended_entries.items()}
+        return snapshot
+    
+    def get_memory_usage(self):
+        """
+        Returns the number of bytes used by each column of the appended entries held in memory
+            and of the partitions on disk
+        """
+        in_memory = pd.Series(0, index = self._store.get_columns(), dtype = "int64")
+        for batches in self._appended_entries.values():
+            for batch in batches:
+                in_memory = in_memory.add(batch.memory_usage(index = False, deep = True), fill_value = 0)
+        usage = pd.DataFrame({"In memory (bytes)": in_memory,
+                              "On disk (bytes)": pd.Series(self._store.get_disk_usage())})
+        usage = usage.reindex(self._store.get_columns()).fillna(0).astype("int64")
+        usage.loc["Total"] = usage.sum()
+        usage.index.name = "Column"
+        return usage
+
 class Driver:
     """
     Responsible for communication between the front and back ends of the program
     """
     
-    def __init__(self, df):
-        self._manager = DataManager(df)
+    def __init__(self, df, prepared = False, recorder = None, compact = False):
+        """
+        Attributes:
+            df - Dataframe containing all asset entries to be loaded into program, or a
+                partitions.PartitionStore of entries stored on disk, which are read as needed
+            prepared (bool) - True if df was previously returned by get_all_entries
+            recorder (stats.Recorder) - Records the time and memory used by requests and
+                their stages. If None, a disabled recorder is used
+            compact (bool) - True if entries are stored in smaller types where no information is lost
+        """
+        self._recorder = recorder if recorder is not None else stats.Recorder()
+        if isinstance(df, partitions.PartitionStore):
+            self._manager = PartitionedDataManager(df, self._recorder)
+        else:
+            self._manager = DataManager(df, prepared, self._recorder, compact)
+        self._pyramids = resample.PyramidCache()
+        self._analytics = analytics.Analytics(self._manager)
+        self._handlers = self._get_handlers()
+    
+    def _get_handlers(self):
+        """
+        Returns a dictionary mapping each request code to the method executing it
+        """
+        return {
+            Request.DISPLAY_ALL_TICKERS: self._display_all_tickers,
+            Request.DISPLAY_ALL_VISIBLE_TICKERS: self._display_all_visible_tickers,
+            Request.DISPLAY_VISIBLE_ENTRIES: self._display_visible_entries,
+            Request.DISPLAY_ALL_VISIBLE_ENTRIES: self._display_all_visible_entries,
+            Request.HIDE_ENTRIES: self._hide_entries,
+            Request.HIDE_ALL_ENTRIES: self._hide_all_entries,
+            Request.LOAD_ENTRIES: self._load_entries,
+            Request.LOAD_ALL_ENTRIES: self._load_all_entries,
+            Request.PLOT_ASSETS: self._plot_assets,
+            Request.DISPLAY_ANALYTICS: self._display_analytics,
+            Request.DISPLAY_CORRELATION: self._display_correlation,
+            Request.DISPLAY_COVARIANCE: self._display_covariance,
+            Request.SHOW_STATS: self._show_stats,
+            Request.REPORT_MEMORY: self._report_memory,
+            Request.QUIT: self._quit
+        }
+    
+    def snapshot(self):
+        """
+        Returns a driver over a snapshot of the entries and visible tickers, which later requests
+            to this driver do not change. Display requests can be executed on the snapshot from
+            several threads at once. Memoized analytics are shared until their tickers change
+        """
+        snapshot = copy.copy(self)
+        snapshot._manager = self._manager.snapshot()
+        snapshot._analytics = self._analytics.snapshot(snapshot._manager)
+        snapshot._handlers = snapshot._get_handlers()
+        return snapshot
+    
+    def get_all_entries(self):
+        """
+        Returns the sorted full dataframe, including all derived columns
+        """
+        return self._manager.get_all_entries()
+    
+    def append_entries(self, df):
+        """
+        Adds new entries, such as the latest prices of assets, to the program
+        
+        Attributes:
+            df - Dataframe containing the new entries
+        """
+        self._manager.append_entries(df)
+
+    def get_columns(self):
+        """
+        Returns the columns of the entries returned by display requests
+        """
+        return self._manager.get_columns()
+    
+    def iter_all_visible_entries(self, page_size):
+        """
+        Returns a generator yielding the visible entries in pages of page_size rows, in the
+            order they are displayed. The pages are taken from a snapshot, so loads, hides and
+            appends made while paging do not change the pages which follow
+        
+        raises:
+            ValueError - if the page size is not positive
+            UserWarning - if there are no visible entries
+        """
+        if self._manager.get_num_of_visible_entries() == 0:
+            raise UserWarning("There are no visible entries")
+        return self._manager.snapshot().iter_visible_entries(page_size)
+    
+    def export_visible_entries(self, path, file_format = None, chunk_size = export.CHUNK_SIZE):
+        """
+        Writes the visible entries to a csv, jsonl or parquet file, chunk_size entries at a
+            time, so memory use does not grow with the number of visible entries
+        
+        Attributes:
+            path (string) - The path of the written file
+            file_format (string) - Either csv, jsonl or parquet. Found from the extension of
+                the path if not given
+            chunk_size (int) - The number of entries written at one time
+        
+        Returns:
+            The number of entries written
+        
+        raises:
+            ValueError - if the format is not supported
+            UserWarning - if there are no visible entries
+        """
+        file_format = export.get_format(path, file_format)
+        pages = self.iter_all_visible_entries(chunk_size)
+        with self._recorder.measure_stage("export") as measurement:
+            num_entries = export.write_pages(pages, path, file_format)
+            measurement.add_rows(num_entries)
+        return num_entries
+    
+    def get_recorder(self):
+        """
+        Returns the recorder measuring requests, which can be enabled or dumped as json
+        """
+        return self._recorder
+    
+    def get_query_cache(self):
+        """
+        Returns the cache storing the results of queries, whose hit and miss counts show
+            whether it is large enough
+        """
+        return self._manager.get_query_cache()
+    
+    def get_analytics(self):
+        """
+        Returns the analytics computing the metrics, aligned prices and correlations of visible assets
+        """
+        return self._analytics
         
     #---------------------------------- Request Execution Methods--------------
     
-    def _display_all_tickers(self):
+    def _display_all_tickers(self, request):
         return self._manager.get_all_tickers()
     
-    def _display_all_visible_tickers(self):
+    def _display_all_visible_tickers(self, request):
         if self._manager.get_num_of_visible_entries() == 0:
             raise UserWarning("There are no visible tickers")
         return self._manager.get_all_visible_tickers()
     
     def _display_visible_entries(self, request):
-        return self._manager.get_visible_entries(request.get_assets())
+        return self._manager.get_visible_entries(request.get_assets(), request.get_starting_date(),
+                                                 request.get_ending_date())
     
-    def _display_all_visible_entries(self):        
+    def _display_all_visible_entries(self, request):
         if self._manager.get_num_of_visible_entries() == 0:
             raise UserWarning("There are no visible entries")
         return self._manager.get_all_visible_entries()
@@ -228,7 +1188,7 @@ class Driver:
         self._manager.hide_entries(request.get_assets())
         return " ".join([", ".join(request.get_assets()), "has been removed from the view"])
 
-    def _hide_all_entries(self):
+    def _hide_all_entries(self, request):
         self._manager.hide_all_entries()
         return "All assets have been removed from view"
     
@@ -240,55 +1200,178 @@ class Driver:
         returned_str.append(" has been loaded into the view")
         return "".join(returned_str)
         
-    def _load_all_entries(self):
+    def _load_all_entries(self, request):
         self._manager.load_all_entries()
         return "All assets have been loaded into view"
     
     def _plot_assets(self, request):
-        #data = self._manager.get_visible_entries(request.get_assets)
-        data = self._display_visible_entries(request)
-        new_graph = graph.Graph(data)
-        new_graph.plot(request.get_assets())
+        import src.graphs.graph as graph
+        
+        #The full history is passed so cached downsamplings can be reused for any date range.
+        #Each ticker's entries are its own slice, so the graph never scans the other tickers
+        data = {}
+        for ticker in dict.fromkeys(request.get_assets()):
+            try:
+                data[ticker] = self._manager.get_visible_entries([ticker])
+            except UserWarning:
+                continue #Reported by the graph as not visible
+        versions = {ticker: self._manager.get_ticker_version(ticker) for ticker in data}
+        new_graph = graph.Graph(data, self._pyramids, self._analytics, versions)
+        new_graph.plot(request.get_assets(), starting_date = request.get_starting_date(),
+                       ending_date = request.get_ending_date())
         return "The assets have been plotted"
     
-    def _quit(self):
+    def render_charts(self, charts, output_directory, file_format = "png", processes = None, **options):
+        """
+        Renders charts of visible assets to files in parallel, without a display
+        
+        Attributes:
+            charts (list[list[string]]) - The tickers plotted together in each chart
+            output_directory (string) - The directory the files are written to
+            file_format (string) - Either png or svg
+            processes (int) - The number of worker processes. Defaults to the number of cores
+            options - Keyword arguments passed to Graph.render, such as type or starting_date
+            
+        Returns:
+            List of the paths of the rendered files, in the order of charts
+        """
+        import src.graphs.graph as graph
+        
+        tickers = list(dict.fromkeys(ticker for chart in charts for ticker in chart))
+        data = self._manager.get_visible_entries(tickers)
+        return graph.render_batch(data, charts, output_directory, file_format, processes, **options)
+    
+    def _display_analytics(self, request):
+        return self._analytics.get_entries(request.get_assets(), request.get_window(),
+                                           starting_date = request.get_starting_date(),
+                                           ending_date = request.get_ending_date())
+    
+    def _get_compared_tickers(self, request):
+        #Every visible ticker is compared if no assets are given
+        if request.get_assets() is not None:
+            return request.get_assets()
+        if self._manager.get_num_of_visible_entries() == 0:
+            raise UserWarning("There are no visible tickers")
+        return self._manager.get_all_visible_tickers()
+    
+    def _display_correlation(self, request):
+        return self._analytics.get_correlation(self._get_compared_tickers(request),
+                                               starting_date = request.get_starting_date(),
+                                               ending_date = request.get_ending_date())
+    
+    def _display_covariance(self, request):
+        return self._analytics.get_covariance(self._get_compared_tickers(request),
+                                              starting_date = request.get_starting_date(),
+                                              ending_date = request.get_ending_date())
+    
+    def _show_stats(self, request):
+        if not self._recorder.is_enabled():
+            raise UserWarning("Statistics are not being collected")
+        queries = self._manager.get_query_cache().to_dict()
+        return "\n".join([self._recorder.format(), "",
+                          "Query cache: {hits} hits, {misses} misses, {entries} of {max_entries} results stored "
+                          "using {bytes} of {max_bytes} bytes".format(**queries)])
+
+    def _report_memory(self, request):
+        return self._manager.get_memory_usage()
+
+    def _quit(self, request):
         return "Thank you for using the asset tracker"
         
+    def _execute_composite_request(self, composite):
+        """
+        Executes the requests of a composite request in order as a single operation
+        
+        The tickers of all load requests are checked before any request is executed. Requests
+            changing which tickers are visible only record the change, so the visible entries are
+            built at most once for each display request. A display request identical to an earlier
+            one with no visibility change in between reuses its result. If any request fails, the
+            visible tickers are restored to their state before the composite request
+        
+        Returns:
+            List containing the result of each request
+        """
+        requests = composite.get_requests()
+        for request in requests:
+            if request.get_request() == Request.LOAD_ENTRIES:
+                self._manager.check_tickers(request.get_assets())
+        
+        visibility = self._manager.get_visibility()
+        outputs = []
+        results = {} #Results of display requests since the visible tickers last changed
+        try:
+            for request in requests:
+                choice = request.get_request()
+                if choice in Request.get_VISIBILITY_REQUESTS():
+                    results = {}
+                if choice not in Request.get_DISPLAY_REQUESTS():
+                    outputs.append(self._handlers[choice](request))
+                    continue
+                key = (choice, tuple(request.get_assets() or ()), request.get_starting_date(),
+                       request.get_ending_date(), request.get_window())
+                if key not in results:
+                    results[key] = self._handlers[choice](request)
+                outputs.append(results[key])
+        except (ValueError, UserWarning):
+            self._manager.set_visibility(visibility)
+            raise
+        return outputs
+        
+    def execute_paged_request(self, request, page_size):
+        """
+        Executes a request, returning the entries of a display_all_visible_entries request as
+            an iterator of pages of page_size entries, so they are never combined into one
+            dataframe. Other requests are executed by execute_request
+        
+        The request is recorded once its first page is built, and each later page is
+            recorded as a page stage, so the time spent by the reader between pages is not
+            measured
+        
+        Raises:
+            UserWarning - If a request would not execute as expected
+        """
+        if not isinstance(request, Request) or request.get_request() != Request.DISPLAY_ALL_VISIBLE_ENTRIES:
+            return self.execute_request(request)
+        with self._recorder.measure_request(request.get_name()) as measurement:
+            pages = self.iter_all_visible_entries(page_size)
+            page = next(pages, None)
+            measurement.add_rows(0 if page is None else len(page))
+        return self._record_pages(page, pages)
+    
+    def _record_pages(self, page, pages):
+        while page is not None:
+            yield page
+            with self._recorder.measure_stage("page") as measurement:
+                page = next(pages, None)
+                measurement.add_rows(0 if page is None else len(page))
+    
     def execute_request(self, request):
         """
         Executes all user requests
         
         Attributes:
-            request (Request) - The request modifying the program state
+            request (Request or CompositeRequest) - The request modifying the program state
             
         Raises:
             UserWarning - If a request would not execute as expected
             
         Returns:
-            String or Dataframe containing the result of the request
-        """
-        output = ""
-        choice = request.get_request()
-        if choice == Request.DISPLAY_ALL_TICKERS:
-            output = self._display_all_tickers()
-        if choice == Request.DISPLAY_ALL_VISIBLE_TICKERS:
-            output = self._display_all_visible_tickers()
-        elif choice == Request.DISPLAY_VISIBLE_ENTRIES:
-            output = self._display_visible_entries(request)
-        elif choice == Request.DISPLAY_ALL_VISIBLE_ENTRIES:
-            output = self._display_all_visible_entries()
-        elif choice == Request.HIDE_ENTRIES:
-            output = self._hide_entries(request)
-        elif choice == Request.HIDE_ALL_ENTRIES:
-            output = self._hide_all_entries()
-        elif choice == Request.LOAD_ENTRIES:
-            output = self._load_entries(request)
-        elif choice == Request.LOAD_ALL_ENTRIES:
-            output = self._load_all_entries()
-        elif choice == Request.PLOT_ASSETS:
-            output = self._plot_assets(request)
-        elif choice == Request.QUIT:
-            output = self._quit()
+            String or Dataframe containing the result of the request, or a list of the
+            results of each request in a composite request
+        """
+        with self._recorder.measure_request(request.get_name()) as measurement:
+            num_visible_entries = self._manager.get_num_of_visible_entries()
+            if isinstance(request, CompositeRequest):
+                output = self._execute_composite_request(request)
+                outputs = output
+            else:
+                output = self._handlers[request.get_request()](request)
+                outputs = [output]
+            #Displayed entries are counted, otherwise the rows loaded or hidden are counted
+            for result in outputs:
+                if isinstance(result, (pd.DataFrame, list)):
+                    measurement.add_rows(len(result))
+            measurement.add_rows(abs(self._manager.get_num_of_visible_entries() - num_visible_entries))
         return output
 
 class Request:
@@ -307,9 +1390,15 @@ class Request:
     LOAD_ALL_ENTRIES:Final = 8 #Loads all assets from spreadsheet into the active view
     PLOT_ASSETS:Final = 9 #Creates plots of an asset
     QUIT:Final = 10 #Terminate the program
+    #Requests added later are numbered after the existing ones, so earlier numbers keep their meaning
+    SHOW_STATS:Final = 11 #Displays the time and memory used by each type of request
+    REPORT_MEMORY:Final = 12 #Displays the memory used by each column of the entries
+    DISPLAY_ANALYTICS:Final = 13 #Displays rolling metrics of assets alongside their entries
+    DISPLAY_CORRELATION:Final = 14 #Displays the correlation of the percent changes of assets aligned in time
+    DISPLAY_COVARIANCE:Final = 15 #Displays the covariance of the percent changes of assets aligned in time
     
     _SMALLEST_VALUE:Final = DISPLAY_ALL_TICKERS #Smallest int value of possible requests
-    _LARGEST_VALUE:Final = QUIT #Largest int value of possible requests
+    _LARGEST_VALUE:Final = DISPLAY_COVARIANCE #Largest int value of possible requests
     
     #dictionary of all valid requests mapped to their descriptions
     _VALID_REQUESTS:Final = {
@@ -322,9 +1411,71 @@ class Request:
             LOAD_ENTRIES: "load hidden assets into view",
             LOAD_ALL_ENTRIES: "load all hidden assets into view",
             PLOT_ASSETS: "create a chart from an asset in view",
-            QUIT: "terminate the program"
+            QUIT: "terminate the program",
+            SHOW_STATS: "show the time and memory used by each type of request",
+            REPORT_MEMORY: "show the memory used by each column of all entries and visible entries",
+            DISPLAY_ANALYTICS: "display the moving average, volatility and max drawdown of visible assets",
+            DISPLAY_CORRELATION: "display the correlation between visible assets over a common time grid",
+            DISPLAY_COVARIANCE: "display the covariance between visible assets over a common time grid"
+    }
+    
+    #dictionary of all valid requests mapped to the names their statistics are recorded under
+    _REQUEST_NAMES:Final = {
+            DISPLAY_ALL_TICKERS: "display_all_tickers",
+            DISPLAY_ALL_VISIBLE_TICKERS: "display_all_visible_tickers",
+            DISPLAY_VISIBLE_ENTRIES: "display_visible_entries",
+            DISPLAY_ALL_VISIBLE_ENTRIES: "display_all_visible_entries",
+            HIDE_ENTRIES: "hide_entries",
+            HIDE_ALL_ENTRIES: "hide_all_entries",
+            LOAD_ENTRIES: "load_entries",
+            LOAD_ALL_ENTRIES: "load_all_entries",
+            PLOT_ASSETS: "plot_assets",
+            QUIT: "quit",
+            SHOW_STATS: "show_stats",
+            REPORT_MEMORY: "report_memory",
+            DISPLAY_ANALYTICS: "display_analytics",
+            DISPLAY_CORRELATION: "display_correlation",
+            DISPLAY_COVARIANCE: "display_covariance"
+    }
+    
+    #set of all requests which can be limited to entries within a date range
+    _RANGED_REQUESTS:Final = {
+        DISPLAY_VISIBLE_ENTRIES,
+        PLOT_ASSETS,
+        DISPLAY_ANALYTICS,
+        DISPLAY_CORRELATION,
+        DISPLAY_COVARIANCE
+    }
+    
+    #set of all requests which compute metrics over a window of entries
+    _WINDOWED_REQUESTS:Final = {
+        DISPLAY_ANALYTICS
+    }
+    
+    _DEFAULT_WINDOW:Final = 20 #Number of entries used by windowed requests if no window is given
+    
+    #set of all requests which change the visible tickers
+    _VISIBILITY_REQUESTS:Final = {
+        HIDE_ENTRIES,
+        HIDE_ALL_ENTRIES,
+        LOAD_ENTRIES,
+        LOAD_ALL_ENTRIES
     }
     
+    #set of all requests which only return information about the current state
+    _DISPLAY_REQUESTS:Final = {
+        DISPLAY_ALL_TICKERS,
+        DISPLAY_ALL_VISIBLE_TICKERS,
+        DISPLAY_VISIBLE_ENTRIES,
+        DISPLAY_ALL_VISIBLE_ENTRIES,
+        REPORT_MEMORY,
+        DISPLAY_ANALYTICS,
+        DISPLAY_CORRELATION,
+        DISPLAY_COVARIANCE
+    }
+    
+    _DATE_FORMAT:Final = "%Y-%m-%d"
+    
     #set of all requests which can function without an asset to act upon
     _STANDALONE_REQUESTS:Final = {
         DISPLAY_ALL_TICKERS,
@@ -332,15 +1483,23 @@ class Request:
         DISPLAY_ALL_VISIBLE_ENTRIES,
         HIDE_ALL_ENTRIES,
         LOAD_ALL_ENTRIES,
+        SHOW_STATS,
+        REPORT_MEMORY,
+        DISPLAY_CORRELATION,
+        DISPLAY_COVARIANCE,
         QUIT
     }
     
     
-    def __init__(self, request, assets=None):
+    def __init__(self, request, assets=None, starting_date=None, ending_date=None, window=None):
         """
         Attributes:
             request (int) - The integer representing the user request from _VALID_REQUESTS
             assets (str or list(str)) - The assets that the request is acting upon
+            starting_date (string) - The first date of entries the request acts upon in format (yyyy-mm-dd)
+            ending_date (string) - The last date of entries the request acts upon in format (yyyy-mm-dd)
+            window (int or string) - The number of entries, or a length of time such as 7D, that
+                metrics are computed over. Defaults to _DEFAULT_WINDOW entries
         
         Raises:
             RequestError - If the request is not recognized
@@ -351,13 +1510,54 @@ class Request:
             raise ValueError("That request requires an asset")
         self._request = request
         self._assets = assets
+        self._starting_date = Request._check_date(starting_date)
+        self._ending_date = Request._check_date(ending_date)
+        if (request not in Request._RANGED_REQUESTS) and not (self._starting_date == self._ending_date == None):
+            raise ValueError("That request does not accept a date range")
+        if (self._starting_date is not None and self._ending_date is not None
+                and self._starting_date > self._ending_date):
+            raise ValueError("The starting date must not be after the ending date")
+        self._window = analytics.check_window(window)
+        if request in Request._WINDOWED_REQUESTS:
+            if self._window is None:
+                self._window = Request._DEFAULT_WINDOW
+        elif self._window is not None:
+            raise ValueError("That request does not accept a window")
+    
+    @staticmethod
+    def _check_date(date):
+        """
+        Returns the date if it is in format (yyyy-mm-dd), or None if no date was given
+        
+        Raises:
+            ValueError - If the date is not in format (yyyy-mm-dd)
+        """
+        if date is None or date == "":
+            return None
+        try:
+            datetime.datetime.strptime(date, Request._DATE_FORMAT)
+        except (TypeError, ValueError):
+            raise ValueError("{} is not a date in format yyyy-mm-dd".format(date))
+        return date
     
     def get_request(self):
         return self._request
     
+    def get_name(self):
+        return Request._REQUEST_NAMES[self._request]
+    
     def get_assets(self):
         return self._assets
     
+    def get_starting_date(self):
+        return self._starting_date
+    
+    def get_ending_date(self):
+        return self._ending_date
+    
+    def get_window(self):
+        return self._window
+    
     @staticmethod
     def get_smallest_value():
         """
@@ -376,9 +1576,29 @@ class Request:
     def get_STANDALONE_REQUESTS():
         return Request._STANDALONE_REQUESTS
     
+    @staticmethod
+    def get_RANGED_REQUESTS():
+        return Request._RANGED_REQUESTS
+    
+    @staticmethod
+    def get_WINDOWED_REQUESTS():
+        return Request._WINDOWED_REQUESTS
+    
+    @staticmethod
+    def get_VISIBILITY_REQUESTS():
+        return Request._VISIBILITY_REQUESTS
+    
+    @staticmethod
+    def get_DISPLAY_REQUESTS():
+        return Request._DISPLAY_REQUESTS
+    
     @staticmethod
     def get_VALID_REQUESTS():
         return Request._VALID_REQUESTS
+    
+    @staticmethod
+    def get_REQUEST_NAMES():
+        return Request._REQUEST_NAMES
 
     @staticmethod
     def is_valid_value(value):
@@ -391,4 +1611,34 @@ class Request:
             False - If the value is not between the smallest and largest request numbers
         """
         return (value >= Request._SMALLEST_VALUE and value <= Request._LARGEST_VALUE)
-        
\ No newline at end of file
+
+class CompositeRequest:
+    """
+    Several requests which are planned and executed together by the Driver, such as
+    hiding some assets, loading others and displaying the result
+    """
+    
+    _NAME:Final = "composite"
+    
+    def __init__(self, requests):
+        """
+        Attributes:
+            requests (list[Request]) - The requests to execute, in order
+        
+        Raises:
+            ValueError - If there are no requests or a request cannot be part of a composite request
+        """
+        if len(requests) == 0:
+            raise ValueError("A composite request requires at least one request")
+        for request in requests:
+            if not isinstance(request, Request):
+                raise ValueError("A composite request can only contain single requests")
+            if request.get_request() == Request.QUIT:
+                raise ValueError("A composite request cannot terminate the program")
+        self._requests = list(requests)
+    
+    def get_requests(self):
+        return self._requests
+    
+    def get_name(self):
+        return CompositeRequest._NAME
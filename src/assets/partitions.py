@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Jun 11 09:34:52 2022
+
+Contains all classes responsible for storing entries on disk as per-ticker partitions,
+so that archives larger than memory can be read one ticker at a time
+
+@author: Dylan Munro
+"""
+
+import src.assets.dates as dates
+import src.assets.ingest as ingest
+import src.assets.parallel as parallel
+
+from typing import Final
+
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+DIRECTORY_FILE:Final = "directory.json" #Describes the tickers and columns of a store
+_FORMAT_VERSION:Final = 1 #Increment whenever the layout of stored partitions changes
+
+def is_partition_store(path):
+    """
+    Returns True if the path is a directory written by PartitionWriter
+    """
+    return os.path.isfile(os.path.join(path, DIRECTORY_FILE))
+
+def write_partitions(file_paths, directory, overwrite = False):
+    """
+    Writes the entries of spreadsheets to a partition store, reading one spreadsheet at a
+    time so that only the largest spreadsheet and the largest ticker need to fit in memory
+
+    Attributes:
+        file_paths (list[string]) - The paths of the spreadsheets
+        directory (string) - The directory the store is written to
+        overwrite (bool) - True if a store already in the directory should be replaced
+
+    Returns:
+        The written PartitionStore
+    """
+    writer = PartitionWriter(directory, overwrite)
+    for file_path in file_paths:
+        writer.add(ingest.read_partitions([file_path], processes = 1)[0])
+    return writer.close()
+
+class PartitionWriter:
+    """
+    Writes prepared entries to a directory with a subdirectory for each ticker, holding each
+    column as a numpy file which can be memory mapped. Columns which are not numeric, such as
+    Time, are stored as codes into a list of their distinct values
+
+    Entries can be added in any number of frames, in any order. Each frame is written to disk
+    straight away, and the rows of each ticker are sorted, deduplicated and given their
+    percent change when the writer is closed
+
+    Attributes:
+        directory (string) - The directory the store is written to
+        overwrite (bool) - True if a store already in the directory should be replaced. The new
+            store is written beside it, and only replaces it once the writer is closed
+
+    Raises:
+        ValueError - If the directory contains a store and overwrite is False, or contains
+            files which are not a store
+    """
+
+    def __init__(self, directory, overwrite = False):
+        self._target = directory #The directory the store is in once the writer is closed
+        self._directory = directory #The directory chunks are written to
+        self._columns = None #Columns of the first frame, which every frame is given
+        self._dtypes = {}
+        self._categories = {} #Distinct values of each column stored as codes
+        self._codes = {} #Distinct values of each column stored as codes mapped to their code
+        self._tickers = {} #Each ticker mapped to its subdirectory and number of written chunks
+        if is_partition_store(directory):
+            if not overwrite:
+                raise ValueError("{} already contains partitioned entries, which are only replaced "
+                                 "if overwriting is requested".format(directory))
+            directory = os.path.normpath(directory)
+            self._directory = tempfile.mkdtemp(prefix = os.path.basename(directory) + ".",
+                                               dir = os.path.dirname(directory) or None)
+        elif os.path.isdir(directory) and len(os.listdir(directory)) > 0:
+            raise ValueError("{} is not empty, so partitions cannot be written to it".format(directory))
+        os.makedirs(self._directory, exist_ok = True)
+
+    def add(self, entries):
+        """
+        Writes prepared entries, such as a frame returned by DataManager.get_all_entries
+
+        Attributes:
+            entries (pandas.DataFrame) - Entries with Ticker, Timestamp and Price columns
+        """
+        if self._columns is None:
+            self._columns = [column for column in entries.columns if column != "Ticker"]
+            self._dtypes["Ticker"] = str(entries["Ticker"].dtype)
+            for column in self._columns:
+                self._dtypes[column] = str(entries[column].dtype)
+                if not self._is_numeric(entries[column]):
+                    self._categories[column] = []
+                    self._codes[column] = {}
+        entries = entries.reindex(columns = ["Ticker"] + self._columns)
+        for ticker, ticker_entries in entries.groupby("Ticker", sort = False, observed = True):
+            ticker = str(ticker)
+            if ticker not in self._tickers:
+                self._tickers[ticker] = [str(len(self._tickers)), 0]
+            subdirectory, num_chunks = self._tickers[ticker]
+            os.makedirs(os.path.join(self._directory, subdirectory), exist_ok = True)
+            for column in self._columns:
+                np.save(self._get_path(subdirectory, column, num_chunks), self._encode(column, ticker_entries[column]))
+            self._tickers[ticker][1] += 1
+
+    @staticmethod
+    def _is_numeric(values):
+        return values.dtype != "category" and values.dtype.kind in "biufmM"
+
+    def _encode(self, column, values):
+        """
+        Returns the values of a column as stored on disk
+        """
+        if column not in self._codes:
+            return values.to_numpy()
+        codes = self._codes[column]
+        values = values.astype(object).to_numpy()
+        for value in pd.unique(values):
+            if not pd.isna(value) and value not in codes:
+                codes[value] = len(self._categories[column])
+                self._categories[column].append(value)
+        #Missing values are given the code -1
+        return pd.Categorical(values, categories = self._categories[column]).codes.astype("int32")
+
+    def _get_path(self, subdirectory, column, chunk = None):
+        name = column if chunk is None else "{}.{}".format(column, chunk)
+        return os.path.join(self._directory, subdirectory, name + ".npy")
+
+    def close(self):
+        """
+        Combines the chunks written for each ticker and writes the directory of the store
+
+        Returns:
+            The written PartitionStore
+
+        Raises:
+            ValueError - If no entries were added
+        """
+        if self._columns is None:
+            raise ValueError("None of the spreadsheets contain any entries")
+        tickers = []
+        for ticker in sorted(self._tickers):
+            subdirectory, num_chunks = self._tickers[ticker]
+            chunk_paths = {column: [self._get_path(subdirectory, column, chunk) for chunk in range(num_chunks)]
+                           for column in self._columns}
+            columns = {column: np.concatenate([np.load(path) for path in paths])
+                       for column, paths in chunk_paths.items()}
+            #Entries of earlier chunks are kept when entries share a timestamp
+            order = np.argsort(columns["Timestamp"], kind = "stable")
+            timestamps = columns["Timestamp"][order]
+            order = order[np.concatenate(([True], timestamps[1:] != timestamps[:-1]))]
+            columns = {column: values[order] for column, values in columns.items()}
+            if "Percent Change" in columns:
+                columns["Percent Change"] = parallel.percent_change(np.zeros(1, dtype = "int64"),
+                                                                    columns["Price"].astype("float64"))
+            for column, values in columns.items():
+                np.save(self._get_path(subdirectory, column), values)
+                for path in chunk_paths[column]:
+                    os.remove(path)
+            timestamps = columns["Timestamp"].astype("datetime64[ns]").astype("int64")
+            tickers.append([ticker, subdirectory, len(timestamps), int(timestamps[0]), int(timestamps[-1])])
+
+        directory = {
+            "format": _FORMAT_VERSION,
+            "columns": self._columns,
+            "dtypes": self._dtypes,
+            "categories": {column: [str(value) for value in values] for column, values in self._categories.items()},
+            "tickers": tickers
+        }
+        #The directory is written last, so an interrupted write is never mistaken for a store
+        temporary_path = os.path.join(self._directory, DIRECTORY_FILE + ".tmp")
+        with open(temporary_path, "w", encoding = "utf-8") as file:
+            json.dump(directory, file)
+        os.replace(temporary_path, os.path.join(self._directory, DIRECTORY_FILE))
+        if self._directory != self._target:
+            #The replaced store is only removed once the new store is complete
+            replaced_directory = self._directory + ".replaced"
+            os.replace(self._target, replaced_directory)
+            os.replace(self._directory, self._target)
+            shutil.rmtree(replaced_directory)
+            self._directory = self._target
+        return PartitionStore(self._directory)
+
+class PartitionStore:
+    """
+    Reads the entries of a directory written by PartitionWriter. Only the directory of
+    tickers, with their row counts and time bounds, is kept in memory. The columns of a
+    ticker are memory mapped when its entries are read, so only the rows requested are
+    loaded from disk
+
+    Attributes:
+        directory (string) - The directory the store was written to
+
+    Raises:
+        ValueError - If the directory does not contain a store in the current format
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+        try:
+            with open(os.path.join(directory, DIRECTORY_FILE), "r", encoding = "utf-8") as file:
+                description = json.load(file)
+        except FileNotFoundError:
+            raise ValueError("{} does not contain partitioned entries".format(directory))
+        if description.get("format") != _FORMAT_VERSION:
+            raise ValueError("The partitions in {} were written in an unsupported format".format(directory))
+        self._columns = description["columns"]
+        self._dtypes = description["dtypes"]
+        self._categories = {column: pd.Index(values, dtype = object)
+                            for column, values in description["categories"].items()}
+        self._tickers = {} #Each ticker mapped to its subdirectory, first row, row count and time bounds
+        first_row = 0
+        for ticker, subdirectory, num_rows, first_time, last_time in description["tickers"]:
+            self._tickers[ticker] = (subdirectory, first_row, num_rows,
+                                     np.datetime64(first_time, "ns"), np.datetime64(last_time, "ns"))
+            first_row += num_rows
+        self._num_rows = first_row
+        self._ticker_categories = pd.CategoricalDtype(list(self._tickers))
+
+    def get_tickers(self):
+        """
+        Returns every ticker in sorted order
+        """
+        return list(self._tickers)
+
+    def get_num_rows(self):
+        return self._num_rows
+
+    def get_ranges(self):
+        """
+        Returns each ticker mapped to the [start, stop) positions its rows would occupy if
+        every entry was in one frame sorted by ticker and timestamp
+        """
+        return {ticker: (first_row, first_row + num_rows)
+                for ticker, (_, first_row, num_rows, _, _) in self._tickers.items()}
+
+    def get_time_bounds(self, ticker):
+        """
+        Returns the timestamps of the first and last entries of a ticker
+        """
+        return self._tickers[ticker][3:]
+
+    def get_columns(self):
+        return ["Ticker"] + self._columns
+
+    def get_empty_frame(self):
+        """
+        Returns a frame without rows containing the columns and types of the stored entries
+        """
+        return self._build_frame(None, {column: self._load_column(None, column)[:0] for column in self._columns},
+                                 pd.RangeIndex(0))
+
+    def _load_column(self, subdirectory, column):
+        """
+        Returns the memory mapped values of a column of a ticker, or an empty array if no
+        subdirectory is given
+        """
+        if subdirectory is None:
+            return np.empty(0, dtype = "int32" if column in self._categories else self._dtypes[column])
+        return np.load(os.path.join(self._directory, subdirectory, column + ".npy"), mmap_mode = "r")
+
+    def _build_frame(self, ticker, columns, index):
+        """
+        Returns a frame of the values of a ticker's columns in their original types
+        """
+        if self._dtypes["Ticker"] == "category":
+            frame = {"Ticker": pd.Categorical.from_codes(
+                np.full(len(index), -1 if ticker is None else self._ticker_categories.categories.get_loc(ticker),
+                        dtype = "int32"), dtype = self._ticker_categories)}
+        else:
+            frame = {"Ticker": np.full(len(index), ticker, dtype = object)}
+        for column in self._columns:
+            values = columns[column]
+            if column in self._categories:
+                values = pd.Categorical.from_codes(np.asarray(values), categories = self._categories[column])
+                if self._dtypes[column] != "category":
+                    values = np.asarray(values, dtype = object)
+            else:
+                values = np.array(values) #Copies only the requested rows out of the mapped file
+            frame[column] = values
+        return pd.DataFrame(frame, index = index)
+
+    def read(self, ticker, starting_date = None, ending_date = None):
+        """
+        Returns the entries of a ticker between two dates. The timestamps are searched on disk,
+        so only the rows between the dates are read
+
+        Attributes:
+            ticker (string) - The ticker to return entries for
+            starting_date (string) - The first date that entries should be returned from in format (yyyy-mm-dd)
+            ending_date (string) - The last date that entries should be returned from in format (yyyy-mm-dd)
+
+        Raises:
+            KeyError - If the ticker is not in the store
+        """
+        subdirectory, first_row, num_rows, _, _ = self._tickers[ticker]
+        timestamps = self._load_column(subdirectory, "Timestamp")
+        start, stop = dates.get_date_range(timestamps, starting_date, ending_date)
+        columns = {column: self._load_column(subdirectory, column)[start:stop] for column in self._columns}
+        return self._build_frame(ticker, columns, pd.RangeIndex(first_row + start, first_row + stop))
+
+    def read_rows(self, ticker, start, stop):
+        """
+        Returns the entries of a ticker in the [start, stop) positions of its partition
+        """
+        subdirectory, first_row, num_rows, _, _ = self._tickers[ticker]
+        start, stop = min(start, num_rows), min(stop, num_rows)
+        columns = {column: self._load_column(subdirectory, column)[start:stop] for column in self._columns}
+        return self._build_frame(ticker, columns, pd.RangeIndex(first_row + start, first_row + stop))
+
+    def get_last_entry(self, ticker):
+        """
+        Returns the timestamp and price of the latest entry of a ticker
+        """
+        subdirectory = self._tickers[ticker][0]
+        return (self._tickers[ticker][4], self._load_column(subdirectory, "Price")[-1])
+
+    def get_disk_usage(self):
+        """
+        Returns the number of bytes used on disk by each column of every ticker
+        """
+        usage = dict.fromkeys(self._columns, 0)
+        for subdirectory, _, _, _, _ in self._tickers.values():
+            for column in self._columns:
+                usage[column] += os.path.getsize(os.path.join(self._directory, subdirectory, column + ".npy"))
+        return usage
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat May 21 10:14:03 2022
+
+Contains all functions and classes responsible for reading requests from scripts
+and writing their results without user interaction
+
+@author: Dylan Munro
+"""
+
+import src.assets.export as export
+import src.assets.manager as manager
+
+from collections.abc import Iterator
+from typing import Final
+
+import csv
+import json
+
+import pandas as pd
+
+_COMMENT:Final = "#" #Lines starting with this character are ignored
+_SEPARATOR:Final = ";" #Separates the requests of a composite request
+_STARTING_DATE_PREFIX:Final = "from="
+_ENDING_DATE_PREFIX:Final = "to="
+_WINDOW_PREFIX:Final = "window="
+#Requests which need a display, so would block or do nothing in an unattended run
+_UNSUPPORTED_REQUESTS:Final = {manager.Request.PLOT_ASSETS}
+
+def parse_request(line):
+    """
+    Returns the request described by a line of a script, or None if the line is blank or a comment
+
+    A line contains the number or name of a request followed by the assets it acts upon,
+    separated by spaces. Ranged requests also accept from=yyyy-mm-dd and to=yyyy-mm-dd,
+    for example "display_visible_entries BTC ETH from=2022-01-01", and windowed requests accept
+    window=20 or window=7D. Several requests separated by semicolons form a composite request
+
+    Attributes:
+        line (string) - A line of a script
+
+    Raises:
+        ValueError - If the line does not describe a valid request
+    """
+    if line.lstrip().startswith(_COMMENT):
+        return None
+    requests = [_parse_single_request(part.split()) for part in line.split(_SEPARATOR)]
+    requests = [request for request in requests if request is not None]
+    if len(requests) == 0:
+        return None
+    if _SEPARATOR in line:
+        return manager.CompositeRequest(requests)
+    return requests[0]
+
+def _parse_single_request(tokens):
+    """
+    Returns the request described by the tokens of a line, or None if there are no tokens
+    """
+    if len(tokens) == 0:
+        return None
+    codes = {name: code for code, name in manager.Request.get_REQUEST_NAMES().items()}
+    if tokens[0].isnumeric():
+        code = int(tokens[0])
+    elif tokens[0].lower() in codes:
+        code = codes[tokens[0].lower()]
+    else:
+        raise ValueError("{} is not a valid request".format(tokens[0]))
+
+    assets = []
+    starting_date = None
+    ending_date = None
+    window = None
+    for token in tokens[1:]:
+        if token.startswith(_STARTING_DATE_PREFIX):
+            starting_date = token[len(_STARTING_DATE_PREFIX):]
+        elif token.startswith(_ENDING_DATE_PREFIX):
+            ending_date = token[len(_ENDING_DATE_PREFIX):]
+        elif token.startswith(_WINDOW_PREFIX):
+            window = token[len(_WINDOW_PREFIX):]
+        else:
+            assets.append(token)
+    return manager.Request(code, assets = assets if len(assets) > 0 else None,
+                           starting_date = starting_date, ending_date = ending_date, window = window)
+
+def to_json(output):
+    """
+    Returns the output of a request as a json string. Dataframes are written as lists of
+    records, with dates in ISO 8601 format and named indexes such as tickers kept as a column
+
+    Attributes:
+        output - The string, list or dataframe returned by the request
+    """
+    if isinstance(output, pd.DataFrame):
+        if any(name is not None for name in output.index.names):
+            output = output.reset_index()
+        #Dataframes are serialized by pandas directly, which is much faster than json.dumps
+        return output.to_json(orient = "records", date_format = "iso")
+    return json.dumps(output)
+
+class JsonlWriter:
+    """
+    Writes the result of each request as a json object on its own line
+
+    Dataframes are written as lists of records, as described by to_json. Pages of entries are
+    written one at a time as a single list
+
+    Attributes:
+        file - The open text file results are written to
+    """
+
+    def __init__(self, file):
+        self._file = file
+
+    def write_result(self, line_number, request, output):
+        """
+        Writes the output of a request which executed successfully
+
+        Attributes:
+            line_number (int) - The line of the script the request was read from
+            request (Request or CompositeRequest) - The executed request
+            output - The string, list or dataframe returned by the request, or an iterator of
+                pages of entries
+        """
+        if isinstance(request, manager.CompositeRequest):
+            #Each request of a composite request is written separately under the same line number
+            for single_request, single_output in zip(request.get_requests(), output):
+                self.write_result(line_number, single_request, single_output)
+            return
+        prefix = '{{"line": {}, "request": {}, "ok": true, "result": '.format(line_number, json.dumps(request.get_name()))
+        if not isinstance(output, Iterator):
+            self._file.write(prefix + to_json(output) + "}\n")
+            return
+        self._file.write(prefix + "[")
+        separator = ""
+        for page in output:
+            records = to_json(page)[1:-1] #The records of the page without the brackets of its list
+            if len(records) > 0:
+                self._file.write(separator + records)
+                separator = ","
+        self._file.write("]}\n")
+
+    def write_error(self, line_number, text, error):
+        """
+        Writes the reason a line of the script could not be executed
+
+        Attributes:
+            line_number (int) - The line of the script
+            text (string) - The contents of the line
+            error (Exception) - The error raised by the request
+        """
+        self._file.write(json.dumps({"line": line_number, "text": text, "ok": False,
+                                     "error": str(error)}) + "\n")
+
+class CsvWriter:
+    """
+    Writes the result of each request as rows of a single csv table
+
+    Every row starts with the line number, request and status. Entries fill the remaining
+    columns, while tickers and messages are written in the message column. Tables which are
+    not entries, such as correlation matrices, are written one json record per row in the
+    message column
+
+    Attributes:
+        file - The open text file results are written to, opened with newline=""
+        columns (list[string]) - The columns of the entries returned by requests
+    """
+
+    _LEADING_COLUMNS:Final = ["line", "request", "ok", "message"]
+
+    def __init__(self, file, columns):
+        self._file = file
+        self._columns = list(columns)
+        self._writer = csv.writer(file, lineterminator = "\n")
+        self._writer.writerow(self._LEADING_COLUMNS + self._columns)
+
+    def write_result(self, line_number, request, output):
+        """
+        Writes the output of a request which executed successfully
+
+        Attributes:
+            line_number (int) - The line of the script the request was read from
+            request (Request or CompositeRequest) - The executed request
+            output - The string, list or dataframe returned by the request, or an iterator of
+                pages of entries
+        """
+        if isinstance(request, manager.CompositeRequest):
+            #Each request of a composite request is written separately under the same line number
+            for single_request, single_output in zip(request.get_requests(), output):
+                self.write_result(line_number, single_request, single_output)
+            return
+        if isinstance(output, Iterator):
+            for page in output:
+                self.write_result(line_number, request, page)
+            return
+        if isinstance(output, pd.DataFrame) and any(name is not None for name in output.index.names):
+            output = output.reset_index()
+        if isinstance(output, pd.DataFrame) and not set(output.columns).issubset(self._columns):
+            output = output.to_json(orient = "records", lines = True, date_format = "iso").splitlines()
+        if isinstance(output, pd.DataFrame):
+            entries = output.reindex(columns = self._columns)
+            entries.insert(0, "message", "")
+            entries.insert(0, "ok", True)
+            entries.insert(0, "request", request.get_name())
+            entries.insert(0, "line", line_number)
+            entries.to_csv(self._file, header = False, index = False, lineterminator = "\n")
+            return
+        messages = output if isinstance(output, list) else [output]
+        padding = [""] * len(self._columns)
+        self._writer.writerows([line_number, request.get_name(), True, message] + padding
+                               for message in messages)
+
+    def write_error(self, line_number, text, error):
+        """
+        Writes the reason a line of the script could not be executed
+
+        Attributes:
+            line_number (int) - The line of the script
+            text (string) - The contents of the line
+            error (Exception) - The error raised by the request
+        """
+        self._writer.writerow([line_number, text, False, str(error)] + [""] * len(self._columns))
+
+def run_script(driver, lines, writer):
+    """
+    Executes the request on each line of a script back to back, writing each result
+    as soon as it is returned. Execution stops at a quit request. The visible entries are
+    written in pages, so they are never combined into one dataframe. Plot requests need a
+    display, so they are written as errors without being executed
+
+    Attributes:
+        driver (Driver) - The driver the requests are executed by
+        lines (iterable[string]) - The lines of the script, such as an open file or sys.stdin
+        writer (JsonlWriter or CsvWriter) - Writes the result of each request
+
+    Returns:
+        The number of lines which could not be executed
+    """
+    num_failed = 0
+    for line_number, line in enumerate(lines, start = 1):
+        try:
+            request = parse_request(line)
+            if request is None:
+                continue
+            _check_supported(request)
+            output = driver.execute_paged_request(request, export.CHUNK_SIZE)
+        except (ValueError, UserWarning) as e:
+            writer.write_error(line_number, line.strip(), e)
+            num_failed += 1
+            continue
+        writer.write_result(line_number, request, output)
+        if isinstance(request, manager.Request) and request.get_request() == manager.Request.QUIT:
+            break
+    return num_failed
+
+def _check_supported(request):
+    """
+    Checks that a request can be executed without a display
+
+    Raises:
+        ValueError - If the request, or any request of a composite request, needs a display
+    """
+    requests = request.get_requests() if isinstance(request, manager.CompositeRequest) else [request]
+    for single_request in requests:
+        if single_request.get_request() in _UNSUPPORTED_REQUESTS:
+            raise ValueError("The {} request needs a display, so it is not supported in scripts"
+                             .format(single_request.get_name()))
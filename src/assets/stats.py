@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat May 14 09:37:25 2022
+
+Contains all classes responsible for measuring the time and memory used by requests
+and the stages of processing within them
+
+@author: Dylan Munro
+"""
+
+from typing import Final
+
+import json
+import math
+import threading
+import time
+import tracemalloc
+
+class Histogram:
+    """
+    Counts durations in buckets whose upper bounds double, so that percentiles can be
+    estimated using a fixed amount of memory no matter how many durations are added
+
+    Attributes:
+        smallest (float) - The upper bound of the first bucket in seconds
+        num_buckets (int) - The number of buckets. The last bucket also counts all longer durations
+    """
+
+    def __init__(self, smallest = 1e-6, num_buckets = 32):
+        self._smallest = smallest
+        self._counts = [0] * num_buckets
+        self._total = 0
+
+    def add(self, seconds):
+        """
+        Counts a duration in the bucket it falls within
+        """
+        index = 0
+        if seconds > self._smallest:
+            index = min(len(self._counts) - 1, math.ceil(math.log2(seconds / self._smallest)))
+        self._counts[index] += 1
+        self._total += 1
+
+    def _get_upper_bound(self, index):
+        return self._smallest * 2 ** index
+
+    def get_percentile(self, percent):
+        """
+        Returns the upper bound of the bucket containing the given percentile of durations,
+        or 0 if no durations have been added
+
+        Attributes:
+            percent (float) - The percentile between 0 and 100
+        """
+        rank = max(1, math.ceil(percent / 100 * self._total))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return self._get_upper_bound(index)
+        return 0.0
+
+    def to_dict(self):
+        """
+        Returns the upper bound and count of each non-empty bucket
+        """
+        return [{"le": self._get_upper_bound(index), "count": count}
+                for index, count in enumerate(self._counts) if count > 0]
+
+class StageStats:
+    """
+    Running totals of every measurement of a request type or stage
+    """
+
+    def __init__(self):
+        self._count = 0
+        self._wall_time = 0.0
+        self._max_wall_time = 0.0
+        self._cpu_time = 0.0
+        self._rows = 0
+        self._memory_delta = None #Only known if memory was traced during a measurement
+        self._histogram = Histogram()
+
+    def add(self, wall_time, cpu_time, rows, memory_delta):
+        """
+        Adds a single measurement to the totals
+
+        Attributes:
+            wall_time (float) - Elapsed seconds
+            cpu_time (float) - Seconds spent by the CPU on this process
+            rows (int) - The number of rows touched
+            memory_delta (int) - The change in traced memory in bytes, or None if it was not traced
+        """
+        self._count += 1
+        self._wall_time += wall_time
+        self._max_wall_time = max(self._max_wall_time, wall_time)
+        self._cpu_time += cpu_time
+        self._rows += rows
+        if memory_delta is not None:
+            self._memory_delta = (self._memory_delta or 0) + memory_delta
+        self._histogram.add(wall_time)
+
+    def get_count(self):
+        return self._count
+
+    def _get_percentile(self, percent):
+        #Buckets only bound each duration from above, which can exceed the longest duration
+        return min(self._histogram.get_percentile(percent), self._max_wall_time)
+
+    def to_dict(self):
+        return {
+            "count": self._count,
+            "wall_time": self._wall_time,
+            "mean_wall_time": self._wall_time / self._count,
+            "max_wall_time": self._max_wall_time,
+            "p50_wall_time": self._get_percentile(50),
+            "p90_wall_time": self._get_percentile(90),
+            "p99_wall_time": self._get_percentile(99),
+            "cpu_time": self._cpu_time,
+            "rows": self._rows,
+            "memory_delta": self._memory_delta,
+            "histogram": self._histogram.to_dict()
+        }
+
+class _Measurement:
+    """
+    Context manager measuring a single request or stage for a Recorder
+    """
+
+    __slots__ = ("_recorder", "_name", "_rows", "_wall_time", "_cpu_time", "_memory")
+
+    def __init__(self, recorder, name, rows):
+        self._recorder = recorder
+        self._name = name
+        self._rows = rows
+
+    def add_rows(self, rows):
+        """
+        Adds to the number of rows touched by the measured request or stage
+        """
+        self._rows += rows
+
+    def __enter__(self):
+        self._memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        self._cpu_time = time.process_time()
+        self._wall_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_time = time.perf_counter() - self._wall_time
+        cpu_time = time.process_time() - self._cpu_time
+        memory_delta = None
+        if self._memory is not None and tracemalloc.is_tracing():
+            memory_delta = tracemalloc.get_traced_memory()[0] - self._memory
+        self._recorder._record(self._name, wall_time, cpu_time, self._rows, memory_delta)
+        return False
+
+class _NullMeasurement:
+    """
+    Context manager returned while a Recorder is disabled, which measures nothing
+    """
+
+    __slots__ = ()
+
+    def add_rows(self, rows):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_MEASUREMENT:Final = _NullMeasurement()
+
+class Recorder:
+    """
+    Records the wall time, CPU time, rows touched and change in memory of named requests
+    and stages. Stages measured within a request are recorded under their own names as well
+
+    While disabled, measure returns a shared context manager which does nothing, so
+    instrumented code costs a single method call. Measurements can be recorded from
+    several threads at once
+
+    Attributes:
+        enabled (bool) - True if measurements are recorded
+        trace_memory (bool) - True if memory is traced with tracemalloc while enabled.
+            Tracing slows down allocations, so it is only started when requested
+    """
+
+    REQUEST_PREFIX:Final = "request."
+    STAGE_PREFIX:Final = "stage."
+
+    def __init__(self, enabled = False, trace_memory = False):
+        self._enabled = False
+        self._started_tracing = False
+        self._stats = {}
+        self._lock = threading.Lock() #Guards the totals of each name
+        if enabled:
+            self.enable(trace_memory)
+
+    def enable(self, trace_memory = False):
+        """
+        Starts recording measurements
+        """
+        self._enabled = True
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def disable(self):
+        """
+        Stops recording measurements. Recorded measurements are kept
+        """
+        self._enabled = False
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def is_enabled(self):
+        return self._enabled
+
+    def measure(self, name, rows = 0):
+        """
+        Returns a context manager measuring the code it encloses
+
+        Attributes:
+            name (string) - The name the measurement is recorded under
+            rows (int) - The number of rows touched, which can be added to with add_rows
+        """
+        if not self._enabled:
+            return _NULL_MEASUREMENT
+        return _Measurement(self, name, rows)
+
+    def measure_request(self, name, rows = 0):
+        return self.measure(self.REQUEST_PREFIX + name, rows)
+
+    def measure_stage(self, name, rows = 0):
+        return self.measure(self.STAGE_PREFIX + name, rows)
+
+    def _record(self, name, wall_time, cpu_time, rows, memory_delta):
+        with self._lock:
+            if name not in self._stats:
+                self._stats[name] = StageStats()
+            self._stats[name].add(wall_time, cpu_time, rows, memory_delta)
+
+    def reset(self):
+        """
+        Discards all recorded measurements
+        """
+        self._stats = {}
+
+    def to_dict(self):
+        """
+        Returns the totals and histograms of every recorded name in a json serializable format
+        """
+        with self._lock:
+            return {name: stats.to_dict() for name, stats in sorted(self._stats.items())}
+
+    def dump(self, file_path):
+        """
+        Writes the recorded measurements to a json file
+        """
+        with open(file_path, "w", encoding = "utf-8") as file:
+            json.dump(self.to_dict(), file, indent = 2)
+
+    def format(self):
+        """
+        Returns the recorded measurements as a table
+        """
+        lines = ["{:<36} {:>7} {:>11} {:>11} {:>11} {:>11} {:>12} {:>12}".format(
+            "Name", "Count", "Mean (ms)", "p99 (ms)", "Max (ms)", "CPU (ms)", "Rows", "Memory (KB)")]
+        for name, stats in self.to_dict().items():
+            memory = "n/a" if stats["memory_delta"] is None else "{:.1f}".format(stats["memory_delta"] / 1024)
+            lines.append("{:<36} {:>7} {:>11.3f} {:>11.3f} {:>11.3f} {:>11.3f} {:>12} {:>12}".format(
+                name, stats["count"], stats["mean_wall_time"] * 1000, stats["p99_wall_time"] * 1000,
+                stats["max_wall_time"] * 1000, stats["cpu_time"] * 1000, stats["rows"], memory))
+        return "\n".join(lines)
@@ -5,11 +5,18 @@ Created on Sat Feb 19 12:45:39 2022
 @author: Dylan Munro
 """
 
+import src.assets.analytics as analytics
+import src.assets.dates as dates
+import src.graphs.resample as resample
+
+from concurrent.futures import ProcessPoolExecutor
 from typing import Final
 
-import matplotlib.pyplot as plt
+#matplotlib is imported by the methods using it, as it is slow to import
+import numpy as np
 import pandas as pd
 import datetime as dt
+import os
 
 """
 Contains all methods for plotting graphs of the specified ticker
@@ -20,55 +27,270 @@ class Graph:
     #Chart Types
     PRICE:Final = 1
     PERCENT:Final = 2
+    OHLC:Final = 3 #Open, high, low and close prices over fixed lengths of time
+    MOVING_AVERAGE:Final = 4 #Mean price over a window of entries
+    VOLATILITY:Final = 5 #Standard deviation of the percent change over a window of entries
+    MAX_DRAWDOWN:Final = 6 #Largest percent fall from an earlier peak over a window of entries
+    
+    #Chart types plotting a metric, mapped to the metric computed by the analytics module
+    _METRICS:Final = {
+        MOVING_AVERAGE: analytics.MOVING_AVERAGE,
+        VOLATILITY: analytics.VOLATILITY,
+        MAX_DRAWDOWN: analytics.MAX_DRAWDOWN
+    }
+    _DEFAULT_WINDOW:Final = 20
+    
+    #Downsampling methods used when a series has more points than can be drawn
+    MIN_MAX:Final = "minmax" #Smallest and largest value per bucket, using cached pyramids
+    LTTB:Final = "lttb" #Largest Triangle Three Buckets, computed for each plot
     
-    def __init__(self, df):
+    _POINTS_PER_PIXEL:Final = 2 #A line needs its smallest and largest value in each pixel column
+    _PIXELS_PER_BAR:Final = 4
+    _FIGURE_SIZE:Final = (12.8, 7.2) #Size in inches of rendered charts
+    _DPI:Final = 100
+    _FILE_FORMATS:Final = {"png", "svg"}
+    
+    def __init__(self, df, cache = None, analytics = None, versions = None):
         """
         Attributes:
-            df - The dataframe containing the relevant asset information
+            df - The dataframe containing the relevant asset information, or a dict mapping each
+                ticker to its entries, such as the per-ticker slices returned by a DataManager
+            cache (PyramidCache) - Stores the downsampled series of previous plots. Pass the same
+                cache to later graphs so repeated plots and zooms are not downsampled again.
+                If None, series are downsampled for this graph only
+            analytics (Analytics) - Memoizes the metrics of tickers whose full history is in df.
+                If None, metrics are computed from df for this graph only
+            versions (dict) - The version of each ticker's entries, from DataManager.get_ticker_version.
+                Downsampled series are only cached for tickers with a version
         """
         self._df = df
+        self._entries = df if isinstance(df, dict) else None #Entries of each ticker, split once
+        self._cache = cache
+        self._analytics = analytics
+        self._versions = versions or {}
 
-    def plot(self, tickers, type = PERCENT):
+    def plot(self, tickers, type = PERCENT, starting_date = None, ending_date = None,
+             downsampling = MIN_MAX, resolution = None, window = _DEFAULT_WINDOW):
         """
-        Creates a plot of the specified asset data
+        Creates a plot of the specified asset data. Series with more points than the width of
+        the figure in pixels are downsampled
         
         Attributes:
             tickers - The assets within the data set to be plotted
             type - Constant specifying the type of chart to be plotted
+            starting_date (string) - The first date to plot in format (yyyy-mm-dd)
+            ending_date (string) - The last date to plot in format (yyyy-mm-dd)
+            downsampling (string) - The method used to reduce the number of points of a line
+            resolution (string) - The length of each bar of an OHLC chart, one of 1m, 1h or 1d.
+                If None, the finest resolution which fits the width of the figure is used
+            window (int or string) - The number of entries, or a length of time such as 7D,
+                that metric charts are computed over
+            
+        Raises:
+            UserWarning - If the entered tickers are not viewable
+        """
+        import matplotlib.pyplot as plt
+        
+        figure = plt.gcf()
+        width = int(figure.get_figwidth() * figure.dpi)
+        self._draw(plt.gca(), width, tickers, type, starting_date, ending_date, downsampling,
+                   resolution, window)
+        plt.show()
+        #self.plot_percentage(tickers)
+    
+    def render(self, tickers, file_path, type = PERCENT, starting_date = None, ending_date = None,
+               downsampling = MIN_MAX, resolution = None, window = _DEFAULT_WINDOW):
+        """
+        Draws a plot of the specified asset data to a png or svg file without a display.
+        The figure is created directly on the Agg backend, so the state of pyplot is not
+        used or modified
+        
+        Attributes:
+            tickers - The assets within the data set to be plotted
+            file_path - The path of the created file. The extension sets the file format
+            Remaining attributes are the same as plot
             
         Raises:
             UserWarning - If the entered tickers are not viewable
+            ValueError - If the file format is not supported
+        """
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        
+        file_format = os.path.splitext(file_path)[1].lstrip(".").lower()
+        if file_format not in self._FILE_FORMATS:
+            raise ValueError("{} files are not supported".format(file_format))
+        figure = Figure(figsize = self._FIGURE_SIZE, dpi = self._DPI)
+        FigureCanvasAgg(figure)
+        width = int(self._FIGURE_SIZE[0] * self._DPI)
+        self._draw(figure.add_subplot(), width, tickers, type, starting_date, ending_date,
+                   downsampling, resolution, window)
+        #Must add bbox_inches so graph isn't cut off
+        figure.savefig(file_path, format = file_format, bbox_inches = "tight")
+    
+    def _draw(self, axes, width, tickers, type, starting_date, ending_date, downsampling,
+              resolution, window = _DEFAULT_WINDOW):
+        """
+        Draws the specified asset data onto axes
+        
+        Attributes:
+            axes (matplotlib.axes.Axes) - The axes to draw on
+            width (int) - The width of the figure in pixels
+            Remaining attributes are the same as plot
         """
+        from matplotlib.artist import setp
+        
         title = " ".join(["Price history of", " vs. ".join(tickers)])
         for ticker in tickers:
-            points = self._df.loc[self._df["Ticker"] == ticker]
-            if len(points) == 0:
+            points = self._get_points(ticker)
+            if points is None or len(points) == 0:
                 raise UserWarning("Warning: {} was not found in the visible dataframe.\nGraphing terminated".format(ticker))
-            times = pd.to_datetime(points.Date.astype(str) + ' ' + points.Time.astype(str))
+            times = points["Timestamp"].to_numpy()
+            start, stop = dates.get_date_range(times, starting_date, ending_date)
+            if start == stop:
+                raise UserWarning("Warning: {} has no entries between the entered dates.\nGraphing terminated".format(ticker))
             
             #Determine what type of graph to plot
-            if type == self.PRICE:
-                plt.plot(times, points["Price"], label = ticker, marker = ".")
-            elif type == self.PERCENT:
-                plt.plot(times, points["Percent Change"], label = ticker, marker = ".")
+            if type == self.OHLC:
+                self._draw_bars(axes, ticker, times[start:stop], points["Price"].to_numpy()[start:stop],
+                                resolution or resample.choose_resolution(times[start:stop], width // self._PIXELS_PER_BAR))
+                continue
+            if type in self._METRICS:
+                column = analytics.METRICS[self._METRICS[type]]
+                values = self._get_metric(ticker, self._METRICS[type], window, points)
+                key = (ticker, column, window)
+            else:
+                column = "Price" if type == self.PRICE else "Percent Change"
+                values = points[column].to_numpy()
+                key = (ticker, column)
+            indices = self._downsample(key, self._versions.get(ticker), times, values, start, stop,
+                                       width * self._POINTS_PER_PIXEL, downsampling)
+            marker = "." if len(indices) == stop - start else None
+            axes.plot(times[indices], values[indices], label = ticker, marker = marker)
         
-        plt.title(title)
-        plt.xlabel("Date and Time")
-        plt.xticks(rotation=30, ha='right')
+        axes.set_title(title)
+        axes.set_xlabel("Date and Time")
+        setp(axes.get_xticklabels(), rotation = 30, ha = "right")
         
-        if type == self.PRICE:
-            plt.ylabel("Price")
+        if type == self.PRICE or type == self.OHLC:
+            axes.set_ylabel("Price")
         elif type == self.PERCENT:
-            plt.ylabel("Percent Change")
+            axes.set_ylabel("Percent Change")
+        elif type in self._METRICS:
+            axes.set_ylabel(analytics.METRICS[self._METRICS[type]])
         
-        plt.legend(bbox_to_anchor = (1.05, 1), loc = "upper left", borderaxespad = 0)
+        axes.legend(bbox_to_anchor = (1.05, 1), loc = "upper left", borderaxespad = 0)
         #Above parameters will always make legend appear in the top right corner
         #loc specifies the corner where the legend is placed
         #bbox_to_anchor specifies the location for the corner
+    
+    def _get_points(self, ticker):
+        """
+        Returns the entries of a ticker, or None if it has none. A dataframe of several tickers
+        is split into its tickers in one pass the first time, rather than scanned for each ticker
+        """
+        if self._entries is None:
+            self._entries = {ticker: entries for ticker, entries
+                             in self._df.groupby("Ticker", sort = False, observed = True)}
+        return self._entries.get(ticker)
+    
+    def _get_metric(self, ticker, metric, window, points):
+        """
+        Returns the value of a metric at each of the points of a ticker, reusing the
+        memoized values of the analytics if they were computed from the same entries
+        """
+        if self._analytics is not None:
+            try:
+                values = self._analytics.get_metric(ticker, metric, window)
+            except UserWarning:
+                values = None
+            if values is not None and len(values) == len(points):
+                return values
+        return analytics.compute_metric(metric, points["Timestamp"].to_numpy(),
+                                        points["Price"].to_numpy(), window)
+    
+    def _downsample(self, key, version, times, values, start, stop, max_points, downsampling):
+        """
+        Returns the indices of the points of a series which should be drawn
         
-        file_name = "".join([title, ".png"])
-        #plt.savefig(file_name, dpi = 750, bbox_inches = "tight")
-        #Must add bbox_inches so graph isn't cut off
+        Attributes:
+            key (tuple) - Identifies the series in the cache, such as its ticker and column
+            version - The version of the ticker's entries, or None if the series is not cached
+        """
+        if stop - start <= max_points:
+            return np.arange(start, stop)
+        if downsampling == self.LTTB:
+            x = times[start:stop].astype("datetime64[ns]").astype("int64")
+            return start + resample.lttb(x, values[start:stop], max_points)
+        if self._cache is None or version is None:
+            return start + resample.min_max(values[start:stop], max_points // 2)
+        pyramid = self._cache.get(key, version, values)
+        return pyramid.get_indices(start, stop, max_points)
+    
+    @staticmethod
+    def _draw_bars(axes, ticker, times, prices, resolution):
+        """
+        Draws OHLC bars, with a vertical line from the low to the high price, a tick to the
+        left at the opening price and a tick to the right at the closing price
+        """
+        bars = resample.ohlc(times, prices, resolution)
+        lines = axes.vlines(bars.index, bars["Low"], bars["High"], label = ticker)
+        color = lines.get_color()
+        axes.plot(bars.index, bars["Open"], linestyle = "", marker = 0, color = color)
+        axes.plot(bars.index, bars["Close"], linestyle = "", marker = 1, color = color)
+
+_RENDERED_COLUMNS:Final = ["Ticker", "Timestamp", "Price", "Percent Change"]
+
+def _render_job(job):
+    """
+    Renders a single chart in a worker process
+    
+    Attributes:
+        job (tuple) - The entries of the chart's tickers, the tickers, the file path and
+            the keyword arguments passed to Graph.render
+    """
+    entries, tickers, file_path, options = job
+    Graph(entries).render(tickers, file_path, **options)
+    return file_path
+
+def render_batch(df, charts, output_directory, file_format = "png", processes = None, **options):
+    """
+    Renders many charts to files in parallel. Each worker process is only sent the
+    entries of the tickers in its chart
+    
+    Attributes:
+        df - The dataframe containing the entries of every ticker in charts
+        charts (list[list[string]]) - The tickers plotted together in each chart
+        output_directory (string) - The directory the files are written to
+        file_format (string) - Either png or svg
+        processes (int) - The number of worker processes. Defaults to the number of cores
+        options - Keyword arguments passed to Graph.render, such as type or starting_date
         
-        plt.show()
-        #self.plot_percentage(tickers)   
+    Returns:
+        List of the paths of the rendered files, in the order of charts
+    
+    Raises:
+        UserWarning - If a ticker is not in df
+    """
+    os.makedirs(output_directory, exist_ok = True)
+    #Split the dataframe once, keeping only the columns needed for drawing
+    columns = [column for column in _RENDERED_COLUMNS if column in df and column != "Ticker"]
+    entries_by_ticker = {ticker: entries[columns] for ticker, entries
+                         in df.groupby("Ticker", sort = False, observed = True)}
+    jobs = []
+    for tickers in charts:
+        tickers = list(dict.fromkeys(tickers))
+        missing = [ticker for ticker in tickers if ticker not in entries_by_ticker]
+        if len(missing) > 0:
+            raise UserWarning("Warning: {} was not found in the visible dataframe.\nGraphing terminated".format(missing[0]))
+        entries = pd.concat([entries_by_ticker[ticker] for ticker in tickers], ignore_index = True)
+        #Tickers are sent as codes so workers do not receive every category of df
+        codes = np.repeat(np.arange(len(tickers), dtype = "int16"),
+                          [len(entries_by_ticker[ticker]) for ticker in tickers])
+        entries["Ticker"] = pd.Categorical.from_codes(codes, tickers)
+        file_path = os.path.join(output_directory, "_".join(tickers) + "." + file_format)
+        jobs.append((entries, tickers, file_path, options))
+    if processes == 1 or len(jobs) <= 1:
+        return [_render_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers = processes) as executor:
+        return list(executor.map(_render_job, jobs, chunksize = max(1, len(jobs) // (4 * (processes or os.cpu_count() or 1)))))
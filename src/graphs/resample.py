@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat May  7 13:18:44 2022
+
+Contains all functions and classes used to reduce the number of points drawn in a graph
+
+@author: Dylan Munro
+"""
+
+from collections import OrderedDict
+from typing import Final
+
+import numpy as np
+import pandas as pd
+
+#Lengths of OHLC bars in nanoseconds
+RESOLUTIONS:Final = {
+    "1m": 60 * 10 ** 9,
+    "1h": 3600 * 10 ** 9,
+    "1d": 86400 * 10 ** 9
+}
+
+def ohlc(timestamps, values, resolution):
+    """
+    Groups values into bars of a fixed length of time and returns the first, highest, lowest
+    and last value of each bar. Bars without any values are omitted
+
+    Attributes:
+        timestamps (numpy.ndarray) - Sorted datetime64 timestamps of the values
+        values (numpy.ndarray) - The values to group
+        resolution (string) - The length of each bar, one of RESOLUTIONS
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError("{} is not a supported resolution".format(resolution))
+    values = np.asarray(values, dtype = "float64")
+    if len(values) == 0:
+        return pd.DataFrame(columns = ["Open", "High", "Low", "Close"])
+    nanoseconds = np.asarray(timestamps, dtype = "datetime64[ns]").astype("int64")
+    buckets = nanoseconds // RESOLUTIONS[resolution]
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    stops = np.append(starts[1:], len(values))
+    return pd.DataFrame({
+        "Open": values[starts],
+        "High": np.maximum.reduceat(values, starts),
+        "Low": np.minimum.reduceat(values, starts),
+        "Close": values[stops - 1]
+    }, index = pd.to_datetime(buckets[starts] * RESOLUTIONS[resolution]))
+
+def choose_resolution(timestamps, max_bars):
+    """
+    Returns the finest resolution which produces at most max_bars bars, or the
+    coarsest resolution if none do
+
+    Attributes:
+        timestamps (numpy.ndarray) - Sorted datetime64 timestamps of the values
+        max_bars (int) - The largest number of bars which should be drawn
+    """
+    if len(timestamps) == 0:
+        return "1d"
+    span = int(np.asarray(timestamps[-1] - timestamps[0], dtype = "timedelta64[ns]").astype("int64"))
+    for resolution, length in RESOLUTIONS.items():
+        if span // length + 1 <= max_bars:
+            return resolution
+    return "1d"
+
+def min_max(values, num_buckets):
+    """
+    Returns the sorted indices of the smallest and largest value in each of num_buckets
+    equally sized buckets, which preserves the peaks of the series when drawn
+
+    Attributes:
+        values (numpy.ndarray) - The values to downsample
+        num_buckets (int) - The number of buckets to split the values into
+    """
+    values = np.asarray(values, dtype = "float64")
+    if num_buckets <= 0 or len(values) <= 2 * num_buckets:
+        return np.arange(len(values))
+    starts = np.linspace(0, len(values), num_buckets + 1).astype("int64")[:-1]
+    return _bucket_extrema(values, starts)
+
+def _bucket_extrema(values, starts):
+    """
+    Returns the sorted indices of the smallest and largest value of each bucket
+
+    Attributes:
+        values (numpy.ndarray) - The values to search
+        starts (numpy.ndarray) - The index of the first value of each bucket, beginning at 0
+    """
+    sizes = np.diff(np.append(starts, len(values)))
+    bucket_of = np.repeat(np.arange(len(starts)), sizes)
+    #Position of each value within its bucket, used to find the index of each extreme
+    offsets = np.arange(len(values)) - np.repeat(starts, sizes)
+    filled = np.where(np.isnan(values), -np.inf, values)
+    largest = np.maximum.reduceat(filled, starts)
+    maximums = starts + _first_match(filled == largest[bucket_of], bucket_of, offsets)
+    filled = np.where(np.isnan(values), np.inf, values)
+    smallest = np.minimum.reduceat(filled, starts)
+    minimums = starts + _first_match(filled == smallest[bucket_of], bucket_of, offsets)
+    return np.unique(np.concatenate((minimums, maximums)))
+
+def _first_match(matches, bucket_of, offsets):
+    """
+    Returns the offset of the first matching value in each bucket. Every bucket
+    must contain at least one match
+    """
+    matched_buckets = bucket_of[matches]
+    firsts = np.flatnonzero(np.concatenate(([True], matched_buckets[1:] != matched_buckets[:-1])))
+    return offsets[matches][firsts]
+
+def lttb(x, y, threshold):
+    """
+    Returns the sorted indices of the points chosen by the Largest Triangle Three Buckets
+    algorithm, which keeps the points contributing most to the visual shape of the series
+
+    Attributes:
+        x (numpy.ndarray) - The numeric x coordinates of the points, in ascending order
+        y (numpy.ndarray) - The y coordinates of the points
+        threshold (int) - The number of points to keep
+    """
+    x = np.asarray(x, dtype = "float64")
+    y = np.asarray(y, dtype = "float64")
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+    edges = np.linspace(1, length - 1, threshold - 1).astype("int64")
+    selected = np.empty(threshold, dtype = "int64")
+    selected[0], selected[-1] = 0, length - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        #The third vertex of each triangle is the average point of the next bucket
+        next_start, next_stop = stop, edges[i + 2] if i + 2 < len(edges) else length
+        average_x = x[next_start:next_stop].mean()
+        average_y = y[next_start:next_stop].mean()
+        areas = np.abs((x[previous] - average_x) * (y[start:stop] - y[previous])
+                       - (x[previous] - x[start:stop]) * (average_y - y[previous]))
+        previous = start + int(np.nanargmax(areas)) if not np.all(np.isnan(areas)) else start
+        selected[i + 1] = previous
+    return selected
+
+class ResolutionPyramid:
+    """
+    Precomputed min/max downsamplings of a series at every power of two, so that any
+    range of the series can be drawn with a bounded number of points without scanning it
+
+    Attributes:
+        values (numpy.ndarray) - The series to downsample
+    """
+
+    _MIN_LEVEL_SIZE:Final = 64 #Levels stop once they contain fewer buckets than this
+
+    def __init__(self, values):
+        self._values = np.asarray(values, dtype = "float64")
+        self._levels = [] #Indices of the extremes of each bucket at every level
+        bucket_size = 2
+        while len(self._values) // bucket_size >= self._MIN_LEVEL_SIZE:
+            starts = np.arange(0, len(self._values), bucket_size)
+            self._levels.append((bucket_size, _bucket_extrema(self._values, starts)))
+            bucket_size *= 2
+
+    def get_indices(self, start, stop, max_points):
+        """
+        Returns sorted indices of at most roughly max_points points describing the
+        values between start and stop
+
+        Attributes:
+            start (int) - The index of the first value in the range
+            stop (int) - The index after the last value in the range
+            max_points (int) - The largest number of points which should be drawn
+        """
+        if stop - start <= max_points or len(self._levels) == 0:
+            return np.arange(start, stop)
+        for bucket_size, indices in self._levels:
+            if 2 * (stop - start) / bucket_size <= max_points:
+                break
+        lower = indices.searchsorted(start, "left")
+        upper = indices.searchsorted(stop, "left")
+        return indices[lower:upper]
+
+class PyramidCache:
+    """
+    Stores the resolution pyramids of recently plotted series
+
+    A pyramid is rebuilt once the version of the series it was built from changes
+
+    Attributes:
+        max_entries (int) - The largest number of pyramids kept
+    """
+
+    def __init__(self, max_entries = 256):
+        self._max_entries = max_entries
+        self._pyramids = OrderedDict()
+
+    def get(self, key, version, values):
+        """
+        Returns the pyramid of a series, building it if it is not cached or was built from
+        another version of the series
+
+        Attributes:
+            key - Identifies the series, such as its ticker and column
+            version - Changes whenever the series changes, such as DataManager.get_ticker_version
+                of its ticker
+            values (numpy.ndarray) - The values of the series
+        """
+        if key in self._pyramids:
+            cached_version, pyramid = self._pyramids[key]
+            if cached_version == version:
+                self._pyramids.move_to_end(key)
+                return pyramid
+        pyramid = ResolutionPyramid(values)
+        self._pyramids[key] = (version, pyramid)
+        self._pyramids.move_to_end(key)
+        while len(self._pyramids) > self._max_entries:
+            self._pyramids.popitem(last = False)
+        return pyramid
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Mar 20 14:12:40 2022
+
+Contains timing benchmarks for the asset tracker
+
+@author: Dylan Munro
+"""
+
+import src.assets.manager as manager
+import src.graphs.graph as graph
+
+from typing import Final
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+#Seconds between consecutive entries of a ticker
+RESOLUTIONS:Final = {"1s": 1, "1m": 60, "1h": 3600, "1d": 86400}
+
+#Number of tickers, entries per ticker and resolution of each benchmarked scale
+SCALES:Final = {
+    "10k": (100, 100, "1d"),
+    "100k": (1000, 100, "1h"),
+    "1M": (1000, 1000, "1m"),
+    "10M": (10000, 1000, "1m")
+}
+
+def generate_entries(num_tickers, rows_per_ticker, resolution = "1d", seed = 0):
+    """
+    Generates a dataframe of asset entries in the spreadsheet format. The same arguments
+    always generate the same entries
+
+    Attributes:
+        num_tickers (int) - The number of distinct tickers to generate
+        rows_per_ticker (int) - The number of entries generated for each ticker
+        resolution (string) - The time between consecutive entries of a ticker, one of RESOLUTIONS
+        seed (int) - Seed of the random prices
+    """
+    rng = np.random.default_rng(seed)
+    times = pd.date_range("2022-01-01", periods = rows_per_ticker,
+                          freq = pd.Timedelta(seconds = RESOLUTIONS[resolution]))
+    #Times of day repeat, so each distinct time is only formatted once
+    seconds = (times - times.normalize()).total_seconds().astype("int64")
+    distinct_seconds, codes = np.unique(seconds, return_inverse = True)
+    labels = pd.to_datetime(distinct_seconds, unit = "s").strftime("%H:%M:%S")
+    #Prices follow a random walk starting from a different price for each ticker
+    steps = rng.normal(0, 0.01, (num_tickers, rows_per_ticker))
+    steps[:, 0] = 0
+    prices = rng.uniform(1, 1000, (num_tickers, 1)) * np.exp(np.cumsum(steps, axis = 1))
+    return pd.DataFrame({
+        "Ticker": np.repeat(["T{:05d}".format(i) for i in range(num_tickers)], rows_per_ticker),
+        "Date": np.tile(times.normalize(), num_tickers),
+        "Time": pd.Categorical.from_codes(np.tile(codes, num_tickers), labels),
+        "Price": prices.ravel().round(4)
+    })
+
+def time_function(function, *args):
+    """
+    Returns the number of seconds taken to call function with the given arguments
+    """
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+def ticker_index_benchmark(num_tickers = 10000, rows_per_ticker = 20, num_requested = 100):
+    """
+    Compares the ticker index used by DataManager against scanning the full dataframe
+    once per requested ticker
+
+    Attributes:
+        num_tickers (int) - The number of distinct tickers to generate
+        rows_per_ticker (int) - The number of entries generated for each ticker
+        num_requested (int) - The number of tickers acted upon by each request
+    """
+    df = generate_entries(num_tickers, rows_per_ticker)
+    dm = manager.DataManager(df)
+    all_entries = dm._all_entries
+    tickers = dm.get_all_tickers()[::num_tickers // num_requested][:num_requested]
+
+    def scan_get(tickers):
+        return pd.concat([all_entries.loc[all_entries["Ticker"] == ticker] for ticker in tickers])
+
+    def scan_hide(tickers):
+        visible = all_entries
+        for ticker in tickers:
+            visible = visible.loc[~(visible["Ticker"] == ticker)]
+        return visible
+
+    def scan_load(tickers):
+        visible = all_entries.iloc[0:0]
+        for ticker in tickers:
+            visible = pd.concat([all_entries.loc[all_entries["Ticker"] == ticker], visible])
+        return visible.sort_values(["Ticker", "Date", "Time"])
+
+    def indexed_load(tickers):
+        dm.hide_all_entries()
+        dm.load_entries(tickers)
+
+    print("{} tickers, {} rows, {} tickers per request".format(num_tickers, len(df), len(tickers)))
+    print("Operation  Full scan (s)  Ticker index (s)")
+    dm.load_all_entries()
+    print("get        {:<14.4f} {:.4f}".format(time_function(scan_get, tickers),
+                                               time_function(dm.get_visible_entries, tickers)))
+    print("hide       {:<14.4f} {:.4f}".format(time_function(scan_hide, tickers),
+                                               time_function(dm.hide_entries, tickers)))
+    print("load       {:<14.4f} {:.4f}".format(time_function(scan_load, tickers),
+                                               time_function(indexed_load, tickers)))
+
+def write_csv(file_path, num_tickers, rows_per_ticker):
+    """
+    Writes generated entries one second apart to a csv file
+    """
+    generate_entries(num_tickers, rows_per_ticker, "1s").to_csv(file_path, index = False)
+
+def peak_memory(code):
+    """
+    Runs code in a new interpreter and returns the peak resident set size of the
+    interpreter in megabytes. Only supported on Linux, as getrusage would also report
+    the memory of this process, which the interpreter is forked from
+    """
+    code = "\n".join([code, "for line in open('/proc/self/status'):",
+                      "    if line.startswith('VmHWM'): print(line.split()[1])"])
+    result = subprocess.run([sys.executable, "-c", code], capture_output = True, text = True,
+                            check = True, cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return int(result.stdout.split()[-1]) / 1024
+
+def ingestion_memory_benchmark(num_tickers = 1000, rows_per_ticker = 5000):
+    """
+    Compares the peak memory of reading a csv file with a single pd.read_csv call
+    against the chunked ingestion used by IO.load_file, both on its own and when
+    building a DataManager from the result
+
+    Attributes:
+        num_tickers (int) - The number of distinct tickers to generate
+        rows_per_ticker (int) - The number of entries generated for each ticker
+    """
+    readers = {
+        "pd.read_csv": "pd.read_csv({!r})",
+        "chunked ingestion": "ingest.read_file({!r}, '.csv')"
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "entries.csv")
+        write_csv(file_path, num_tickers, rows_per_ticker)
+        print("{} rows, {:.1f} MB csv".format(num_tickers * rows_per_ticker,
+                                              os.path.getsize(file_path) / 1024 ** 2))
+        print("Reader             Read peak (MB)  DataManager peak (MB)")
+        for name, reader in readers.items():
+            imports = "import src.assets.manager as manager, src.assets.ingest as ingest, pandas as pd\n"
+            read = "df = " + reader.format(file_path)
+            print("{:<18} {:<15.1f} {:.1f}".format(
+                name, peak_memory(imports + read), peak_memory(imports + read + "\nmanager.DataManager(df)")))
+
+def summarize(times):
+    """
+    Returns the smallest and median of a list of timings in seconds
+    """
+    return {"min": min(times), "median": statistics.median(times), "runs": len(times)}
+
+def benchmark_scale(num_tickers, rows_per_ticker, resolution, repeats = 3, num_requested = 10):
+    """
+    Times the construction of a DataManager, generation of percent change, load, hide and
+    display requests and rendering a chart for one scale of generated entries
+
+    Requests are timed with an empty query cache, so the cost of computing each result is
+    measured. Display requests are also timed with their result cached, under their name
+    followed by _cached
+
+    Attributes:
+        num_tickers (int) - The number of distinct tickers to generate
+        rows_per_ticker (int) - The number of entries generated for each ticker
+        resolution (string) - The time between consecutive entries of a ticker
+        repeats (int) - The number of times each operation is timed
+        num_requested (int) - The number of tickers acted upon by each request
+
+    Returns:
+        Dictionary mapping the name of each operation to a summary of its timings
+    """
+    df = generate_entries(num_tickers, rows_per_ticker, resolution)
+    timings = {}
+
+    def record(name, function, *args, setup = None):
+        times = []
+        for i in range(repeats):
+            if setup is not None:
+                setup()
+            times.append(time_function(function, *args))
+        timings[name] = summarize(times)
+
+    record("construction", lambda: manager.DataManager(df.copy()))
+    driver = manager.Driver(df.copy())
+    all_entries = driver.get_all_entries()
+    record("percent_change", manager.DataManager._compute_percent_change, all_entries)
+
+    tickers = driver.execute_request(manager.Request(manager.Request.DISPLAY_ALL_TICKERS))
+    requested = tickers[::max(1, len(tickers) // num_requested)][:num_requested]
+    requests = {
+        "hide_all_entries": manager.Request(manager.Request.HIDE_ALL_ENTRIES),
+        "load_entries": manager.Request(manager.Request.LOAD_ENTRIES, requested),
+        "display_visible_entries": manager.Request(manager.Request.DISPLAY_VISIBLE_ENTRIES, requested),
+        "hide_entries": manager.Request(manager.Request.HIDE_ENTRIES, requested),
+        "load_all_entries": manager.Request(manager.Request.LOAD_ALL_ENTRIES),
+        "display_all_visible_tickers": manager.Request(manager.Request.DISPLAY_ALL_VISIBLE_TICKERS),
+        "display_all_visible_entries": manager.Request(manager.Request.DISPLAY_ALL_VISIBLE_ENTRIES)
+    }
+    for name, request in requests.items():
+        record(name, driver.execute_request, request, setup = driver.get_query_cache().clear)
+        if request.get_request() in manager.Request.get_DISPLAY_REQUESTS():
+            record(name + "_cached", driver.execute_request, request)
+
+    with tempfile.TemporaryDirectory() as directory:
+        entries = driver.execute_request(requests["display_visible_entries"])
+        chart = graph.Graph(entries)
+        file_path = os.path.join(directory, "chart.png")
+        record("render", chart.render, requested[:1], file_path)
+    return timings
+
+def run_suite(scales, repeats = 3):
+    """
+    Runs benchmark_scale for each scale and returns the results in a json serializable format
+
+    Attributes:
+        scales (list[string]) - The names of the scales to run from SCALES
+        repeats (int) - The number of times each operation is timed
+    """
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec = "seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count()
+        },
+        "scales": {}
+    }
+    for name in scales:
+        num_tickers, rows_per_ticker, resolution = SCALES[name]
+        print("Running {} ({} tickers x {} rows, {})".format(name, num_tickers, rows_per_ticker, resolution))
+        results["scales"][name] = {
+            "num_tickers": num_tickers,
+            "rows_per_ticker": rows_per_ticker,
+            "resolution": resolution,
+            "timings": benchmark_scale(num_tickers, rows_per_ticker, resolution, repeats)
+        }
+    return results
+
+def find_regressions(baseline, results, tolerance = 1.25, noise_floor = 0.001):
+    """
+    Returns a list of the operations whose fastest time is more than tolerance times slower
+    than in the baseline
+
+    Attributes:
+        baseline (dict) - Results of an earlier run_suite call
+        results (dict) - Results of the current run_suite call
+        tolerance (float) - The largest acceptable ratio of the current and baseline times
+        noise_floor (float) - Operations faster than this many seconds are never reported
+    """
+    regressions = []
+    for scale, result in results["scales"].items():
+        baseline_timings = baseline["scales"].get(scale, {}).get("timings", {})
+        for operation, timing in result["timings"].items():
+            if operation not in baseline_timings or timing["min"] < noise_floor:
+                continue
+            ratio = timing["min"] / max(baseline_timings[operation]["min"], 1e-9)
+            if ratio > tolerance:
+                regressions.append((scale, operation, ratio))
+    return regressions
+
+def print_results(results):
+    print("Scale  Operation                     Min (s)    Median (s)")
+    for scale, result in results["scales"].items():
+        for operation, timing in result["timings"].items():
+            print("{:<6} {:<29} {:<10.4f} {:.4f}".format(scale, operation, timing["min"], timing["median"]))
+
+def main(arguments = None):
+    parser = argparse.ArgumentParser(description = "Benchmarks the asset tracker on generated entries")
+    parser.add_argument("--scales", nargs = "+", choices = list(SCALES), default = ["10k", "100k", "1M"])
+    parser.add_argument("--repeats", type = int, default = 3)
+    parser.add_argument("--output", help = "Path of the json file the results are written to")
+    parser.add_argument("--baseline", help = "Path of earlier results to check for regressions")
+    parser.add_argument("--tolerance", type = float, default = 1.25)
+    parser.add_argument("--ticker-index", action = "store_true",
+                        help = "Compare the ticker index against scanning the full dataframe instead of running the suite")
+    parser.add_argument("--ingestion-memory", action = "store_true",
+                        help = "Compare the peak memory of chunked ingestion against pd.read_csv instead of running the suite")
+    options = parser.parse_args(arguments)
+
+    if options.ticker_index or options.ingestion_memory:
+        if options.ticker_index:
+            ticker_index_benchmark()
+        if options.ingestion_memory:
+            ingestion_memory_benchmark()
+        return 0
+    results = run_suite(options.scales, options.repeats)
+    print_results(results)
+    if options.output is not None:
+        with open(options.output, "w", encoding = "utf-8") as file:
+            json.dump(results, file, indent = 2)
+    if options.baseline is not None:
+        with open(options.baseline, "r", encoding = "utf-8") as file:
+            regressions = find_regressions(json.load(file), results, options.tolerance)
+        for scale, operation, ratio in regressions:
+            print("Regression: {} {} is {:.2f} times slower".format(scale, operation, ratio))
+        return 1 if len(regressions) > 0 else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Jun  4 15:02:11 2022
+
+Contains a load test measuring the throughput and latency of the request server
+
+@author: Dylan Munro
+"""
+
+import server
+import src.assets.manager as manager
+import tests.benchmarks as benchmarks
+
+from typing import Final
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+#Requests sent by each client in turn unless others are given
+DEFAULT_REQUESTS:Final = [
+    {"request": "display_all_visible_tickers"},
+    {"request": "display_visible_entries", "assets": ["T00000", "T00001"], "from": "2022-01-01"},
+    {"request": "display_analytics", "assets": ["T00002"], "window": 20},
+    {"request": "display_correlation", "assets": ["T00000", "T00001", "T00002", "T00003"]}
+]
+
+async def _send(reader, writer, host, body):
+    """
+    Sends a single request over an open connection and returns the status of the response
+    """
+    content = json.dumps(body).encode("utf-8")
+    writer.write("POST /request HTTP/1.1\r\nHost: {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n"
+                 .format(host, len(content)).encode("latin-1") + content)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+async def _client(host, port, bodies, num_requests, latencies, statuses):
+    """
+    Sends requests back to back over one connection, recording the latency of each
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for i in range(num_requests):
+            start = time.perf_counter()
+            status = await _send(reader, writer, host, bodies[i % len(bodies)])
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+async def run_load(host, port, bodies, num_requests, concurrency):
+    """
+    Sends num_requests requests from concurrency clients at once
+
+    Returns:
+        Dictionary containing the requests per second and latency percentiles in milliseconds
+    """
+    latencies = []
+    statuses = {}
+    per_client = [num_requests // concurrency + (i < num_requests % concurrency) for i in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*[_client(host, port, bodies, count, latencies, statuses)
+                           for count in per_client if count > 0])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    percentile = lambda percent: latencies[min(len(latencies) - 1, int(percent / 100 * len(latencies)))] * 1000
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p99_ms": percentile(99),
+        "max_ms": latencies[-1] * 1000,
+        "statuses": statuses
+    }
+
+def start_local_server(num_tickers, rows_per_ticker, threads = None):
+    """
+    Starts a server over generated entries in a background thread
+
+    Returns:
+        The port the server is listening on
+    """
+    driver = manager.Driver(benchmarks.generate_entries(num_tickers, rows_per_ticker, "1h"))
+    ready = threading.Event()
+    ports = []
+
+    async def serve():
+        asset_server = server.AssetServer(driver, threads)
+        ports.append(await asset_server.start("127.0.0.1", 0))
+        ready.set()
+        await asset_server.serve_forever()
+
+    threading.Thread(target = lambda: asyncio.run(serve()), daemon = True).start()
+    ready.wait()
+    return ports[0]
+
+def main(arguments = None):
+    parser = argparse.ArgumentParser(description = "Measures the throughput and latency of the request server")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int,
+                        help = "Port of a running server. If not given, a server is started over generated entries")
+    parser.add_argument("--tickers", type = int, default = 100, help = "Tickers generated for a started server")
+    parser.add_argument("--rows", type = int, default = 1000, help = "Entries per ticker generated for a started server")
+    parser.add_argument("--threads", type = int, help = "Threads executing display requests in a started server")
+    parser.add_argument("--requests", type = int, default = 2000, help = "Total number of requests sent")
+    parser.add_argument("--concurrency", type = int, default = 16, help = "Number of clients sending requests at once")
+    parser.add_argument("--body", action = "append",
+                        help = "Json body of a request to send. Repeat to send several in turn")
+    options = parser.parse_args(arguments)
+
+    port = options.port
+    if port is None:
+        port = start_local_server(options.tickers, options.rows, options.threads)
+    bodies = [json.loads(body) for body in options.body] if options.body else DEFAULT_REQUESTS
+    results = asyncio.run(run_load(options.host, port, bodies, options.requests, options.concurrency))
+    print("{requests} requests from {concurrency} clients in {seconds:.2f}s: {requests_per_second:.1f} requests/s, "
+          "p50 {p50_ms:.2f}ms, p90 {p90_ms:.2f}ms, p99 {p99_ms:.2f}ms, max {max_ms:.2f}ms".format(**results))
+    print("Responses by status: {}".format(results["statuses"]))
+    return 0 if set(results["statuses"]) == {200} else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,9 +5,34 @@ Created on Sat Feb 19 10:02:19 2022
 @author: dylmu
 """
 
+import src.assets.analytics as analytics
+import src.assets.cache as cache
+import src.assets.dates as dates
+import src.assets.fetcher as fetcher
+import src.assets.ingest as ingest
 import src.assets.manager as manager
+import src.assets.parallel as parallel
+import src.assets.partitions as partitions
+import src.assets.script as script
+import src.assets.stats as stats
 import src.graphs.graph as graph
+import src.graphs.resample as resample
 
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
 import pandas as pd
 
 def data_manager_tests():
@@ -23,23 +48,23 @@ def data_manager_tests():
         #print("Ethereum Entries: \n{}".format(dm.load_asset("ETH")))
         #dm.load_entries("ETH")
         #dm.load_entries("BTC")
-        dm.load_all()
-        print(dm.get_visible_data())
+        dm.load_all_entries()
+        print(dm.get_all_visible_entries())
         #dm.hide_all()
         #print(dm.get_visible_data())
-        dm.hide_entry("BTC", "ETH")
+        dm.hide_entries(["BTC", "ETH"])
         #dm.delete_asset("BTC")
         print("Entries:\n")
         #print(dm.get_visible_data())
-        dm.load_entries("BTC", "ETH")
+        dm.load_entries(["BTC", "ETH"])
         print("Entries:\n")
-        print(dm.get_visible_data())
+        print(dm.get_all_visible_entries())
         print("Loaded assets: \n")
-        print_list(dm.get_visible_assets())
+        print_list(dm.get_all_visible_tickers())
         print("\n")
-        entries = dm.get_all_entries("BTC")
+        entries = dm.get_visible_entries(["BTC"])
         print("Entries main: {}".format(entries))
-        print_tuples_list(entries)
+        print_tuples_list(entries[["Ticker", "Date", "Time", "Price"]].itertuples())
         #print("Visible entries for BTC:\n{}".format(self.print_list(dm.get_all_entries("BTC"))))
     except ValueError as e:
         print(e)
@@ -51,13 +76,840 @@ def graph_tests():
     df = pd.read_excel("resources/spreadsheets/functional.xlsx")
     try:
         dm = manager.DataManager(df)
-        dm.load_all()
-        my_graph = graph.Graph(dm.get_visible_data())
-        my_graph.plot("BTC")
-        my_graph.plot("ETH")
+        dm.load_all_entries()
+        my_graph = graph.Graph(dm.get_all_visible_entries())
+        my_graph.plot(["BTC"])
+        my_graph.plot(["ETH"])
     except ValueError as e:
         print(e)
+
+def render_tests():
+    """
+    Function used to test rendering several graphs to files in worker processes
+    """
+    df = pd.DataFrame({"Ticker": ["BTC"] * 3 + ["ETH"] * 3 + ["XRP"] * 3,
+                       "Date": ["2022-01-01", "2022-01-02", "2022-01-03"] * 3, "Time": ["00:00:00"] * 9,
+                       "Price": [1.0, 2.0, 1.5, 3.0, 2.0, 4.0, 0.5, 0.6, 0.4]})
+    entries = manager.DataManager(df).get_all_entries()
+    with tempfile.TemporaryDirectory() as directory:
+        charts = [["BTC"], ["ETH", "XRP"], ["XRP"]]
+        paths = graph.render_batch(entries, charts, directory, processes = 2)
+        assert paths == [os.path.join(directory, name) for name in ["BTC.png", "ETH_XRP.png", "XRP.png"]]
+        assert all(os.path.getsize(path) > 0 for path in paths)
+        try:
+            graph.render_batch(entries, [["DOGE"]], directory, processes = 2)
+            assert False
+        except UserWarning:
+            pass
+    print("Render tests passed")
+
+def resample_tests():
+    """
+    Function used to test reducing the number of points drawn in a graph
+    """
+    y = [0.0, 1.0, 0.0, 5.0, 0.0, 1.0, 0.0, -4.0, 0.0, 1.0]
+    assert list(resample.lttb(np.arange(10), y, 4)) == [0, 3, 7, 9]
+    assert list(resample.lttb(np.arange(10), y, 10)) == list(range(10))
+    
+    values = [1.0, 5.0, 2.0, 8.0, 3.0, 0.0, 4.0, 4.0]
+    assert list(resample.min_max(values, 2)) == [0, 3, 5, 6] #Ties keep the first index
+    assert list(resample.min_max(values, 4)) == list(range(8))
+    assert list(resample._bucket_extrema(np.array([np.nan, 2.0, 1.0, 7.0]), np.array([0, 3]))) == [1, 2, 3]
+    
+    rng = np.random.default_rng(0)
+    timestamps = np.sort(pd.Timestamp("2022-01-01").to_datetime64() +
+                         rng.integers(0, 3 * 86400, 500).astype("timedelta64[s]"))
+    prices = rng.normal(100, 5, 500)
+    expected = pd.Series(prices, index = timestamps).resample("1h").ohlc().dropna()
+    bars = resample.ohlc(timestamps, prices, "1h")
+    assert np.allclose(bars.to_numpy(), expected.to_numpy())
+    assert (bars.index == expected.index).all()
+    try:
+        resample.ohlc(timestamps, prices, "2h")
+        assert False
+    except ValueError:
+        pass
+    
+    start = pd.Timestamp("2022-01-01").to_datetime64()
+    assert resample.choose_resolution(np.array([start, start + np.timedelta64(30, "m")]), 100) == "1m"
+    assert resample.choose_resolution(np.array([start, start + np.timedelta64(5, "h")]), 10) == "1h"
+    assert resample.choose_resolution(np.array([start, start + np.timedelta64(2, "D")]), 10) == "1d"
+    assert resample.choose_resolution(np.array([], dtype = "datetime64[ns]"), 10) == "1d"
+    
+    values = rng.normal(size = 1000)
+    pyramid = resample.ResolutionPyramid(values)
+    assert list(pyramid.get_indices(100, 150, 100)) == list(range(100, 150))
+    indices = pyramid.get_indices(0, 1000, 300)
+    assert len(indices) <= 300 and (np.diff(indices) > 0).all()
+    assert values.argmax() in indices and values.argmin() in indices
+    indices = pyramid.get_indices(200, 800, 300)
+    assert indices.min() >= 200 and indices.max() < 800
+    
+    pyramids = resample.PyramidCache(max_entries = 2)
+    first = pyramids.get("BTC", 0, values)
+    assert pyramids.get("BTC", 0, values) is first
+    changed = values.copy()
+    changed[500] += 1 #Same length and end points, but a new version of the ticker
+    second = pyramids.get("BTC", 1, changed)
+    assert second is not first and pyramids.get("BTC", 1, changed) is second
+    pyramids.get("ETH", 0, values)
+    pyramids.get("XRP", 0, values)
+    assert pyramids.get("BTC", 1, changed) is not second #Evicted
+    
+    #Graphs reuse the cached pyramids of a ticker until its version changes
+    df = pd.DataFrame({"Ticker": ["BTC"] * 5000, "Date": pd.date_range("2022-01-01", periods = 5000, freq = "h"),
+                       "Time": ["00:00:00"] * 5000, "Price": rng.normal(100, 5, 5000)})
+    entries = manager.DataManager(df).get_all_entries()
+    key = ("BTC", "Percent Change")
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "BTC.png")
+        graph.Graph(entries, pyramids, versions = {"BTC": 0}).render(["BTC"], file_path)
+        pyramid = pyramids.get(key, 0, None)
+        #Entries may also be given already split into tickers, as the driver does
+        graph.Graph({"BTC": entries}, pyramids, versions = {"BTC": 0}).render(["BTC"], file_path)
+        assert pyramids.get(key, 0, None) is pyramid
+        graph.Graph(entries, pyramids, versions = {"BTC": 1}).render(["BTC"], file_path)
+        assert pyramids.get(key, 1, None) is not pyramid
+    driver = manager.Driver(df)
+    Request = manager.Request
+    driver.execute_request(Request(Request.PLOT_ASSETS, ["BTC"]))
+    try:
+        driver.execute_request(Request(Request.PLOT_ASSETS, ["BTC", "DOGE"]))
+        assert False
+    except UserWarning:
+        pass
+    print("Resample tests passed")
+    
+class StubCoinGeckoHandler(BaseHTTPRequestHandler):
+    """
+    Serves fixed responses for the CoinGecko endpoints used by PriceFetcher
+    """
+    
+    calls = [] #Paths and parameters of every request received
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        StubCoinGeckoHandler.calls.append((url.path, params))
+        if url.path == "/simple/price":
+            content = {coin_id: {params["vs_currencies"]: 100.0 + i, "last_updated_at": 1645109280}
+                       for i, coin_id in enumerate(params["ids"].split(","))}
+        elif url.path.startswith("/coins/") and url.path.endswith("/market_chart/range"):
+            start = int(params["from"]) * 1000
+            content = {"prices": [[start, 10.0], [start + 3600000, 11.0], [start + 7200000, 9.9]]}
+        else:
+            self.send_error(404)
+            return
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def fetcher_tests():
+    """
+    Function used to test PriceFetcher against a local stub of the CoinGecko API
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCoinGeckoHandler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    url = "http://127.0.0.1:{}/".format(server.server_address[1])
+    try:
+        with tempfile.TemporaryDirectory() as cache_directory:
+            price_fetcher = fetcher.PriceFetcher({"BTC": "bitcoin", "ETH": "ethereum"}, api_base_url = url,
+                                                 cache_directory = cache_directory, calls_per_minute = 6000)
+            StubCoinGeckoHandler.calls.clear()
+            tickers = ["BTC", "ETH"] + ["T{}".format(i) for i in range(300)]
+            prices = price_fetcher.fetch_current_prices(tickers)
+            assert len(prices) == len(tickers)
+            assert len(StubCoinGeckoHandler.calls) == 2 #302 ids are requested in batches of 250
+            assert list(prices.columns[:4]) == ["Ticker", "Date", "Time", "Price"]
+            
+            history = price_fetcher.fetch_price_history(["BTC", "ETH"], "2022-02-17", "2022-02-18")
+            assert len(StubCoinGeckoHandler.calls) == 4
+            price_fetcher.fetch_price_history(["BTC", "ETH"], "2022-02-17", "2022-02-18")
+            assert len(StubCoinGeckoHandler.calls) == 4 #Served from the disk cache
+            
+            dm = manager.DataManager(history)
+            assert dm.get_all_tickers() == ["BTC", "ETH"]
+            assert dm.get_visible_entries(["ETH"])["Time"].tolist() == ["00:00:00", "01:00:00", "02:00:00"]
+            
+            bucket = fetcher.TokenBucket(rate = 20, capacity = 1)
+            start = time.perf_counter()
+            for i in range(5):
+                bucket.acquire()
+            assert time.perf_counter() - start >= 0.15
+        print("Fetcher tests passed")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def stats_tests():
+    """
+    Function used to test the instrumentation of requests
+    """
+    histogram = stats.Histogram(smallest = 1)
+    for seconds in [0.5, 1.5, 3, 3, 100]:
+        histogram.add(seconds)
+    assert histogram.get_percentile(50) == 4
+    assert histogram.get_percentile(100) == 128
+    
+    df = pd.DataFrame({"Ticker": ["BTC", "ETH", "BTC"], "Date": ["2022-01-01"] * 3,
+                       "Time": ["00:00:00", "00:00:00", "01:00:00"], "Price": [1.0, 2.0, 3.0]})
+    disabled = manager.Driver(df)
+    assert disabled.get_recorder().measure("unused") is disabled.get_recorder().measure("unused")
+    try:
+        disabled.execute_request(manager.Request(manager.Request.SHOW_STATS))
+        assert False
+    except UserWarning:
+        pass
+    
+    recorder = stats.Recorder(enabled = True, trace_memory = True)
+    try:
+        driver = manager.Driver(df, recorder = recorder)
+        driver.execute_request(manager.Request(manager.Request.HIDE_ENTRIES, ["BTC"]))
+        driver.execute_request(manager.Request(manager.Request.DISPLAY_ALL_VISIBLE_ENTRIES))
+        recorded = recorder.to_dict()
+        assert recorded["request.hide_entries"]["rows"] == 2
+        assert recorded["request.display_all_visible_entries"]["rows"] == 1
+        assert recorded["stage.sort"]["count"] == 1
+        assert recorded["stage.sort"]["memory_delta"] is not None
+        assert "hide_entries" in driver.execute_request(manager.Request(manager.Request.SHOW_STATS))
+        with tempfile.TemporaryDirectory() as directory:
+            recorder.dump(directory + "/stats.json")
+            with open(directory + "/stats.json", "r", encoding = "utf-8") as file:
+                assert json.load(file)["stage.sort"]["rows"] == 3
+    finally:
+        recorder.disable()
+    print("Stats tests passed")
+
+def merge_tests():
+    """
+    Function used to test loading several spreadsheets into one DataManager
+    """
+    df = pd.DataFrame({"Ticker": ["BTC", "ETH", "BTC", "ETH", "BTC", "LRC"],
+                       "Date": ["2022-01-01", "2022-01-01", "2022-01-02", "2022-01-02", "2022-01-03", "2022-01-03"],
+                       "Time": ["00:00:00"] * 6, "Price": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]})
+    with tempfile.TemporaryDirectory() as directory:
+        #The second file overlaps the first in time and repeats one of its entries
+        df.iloc[[0, 1, 4]].to_csv(os.path.join(directory, "a.csv"), index = False)
+        df.iloc[[2, 3, 4, 5]].to_csv(os.path.join(directory, "b.csv"), index = False)
+        with open(os.path.join(directory, "notes.txt"), "w") as file:
+            file.write("not a spreadsheet")
+        file_paths = ingest.find_files(directory)
+        assert [os.path.basename(file_path) for file_path in file_paths] == ["a.csv", "b.csv"]
+        assert ingest.find_files(os.path.join(directory, "b*")) == file_paths[1:]
+        partitions = ingest.read_partitions(file_paths, processes = 2)
+    
+    merged = manager.DataManager.merge_partitions(partitions)
+    expected = manager.DataManager(df.copy()).get_all_entries()
+    assert list(merged["Ticker"]) == list(expected["Ticker"])
+    assert list(merged["Price"]) == list(expected["Price"])
+    assert list(merged["Percent Change"]) == list(expected["Percent Change"])
+    
+    #Duplicates keep the entry of the earliest partition, even if a later partition starts earlier
+    first = manager.DataManager(pd.DataFrame({"Ticker": ["BTC", "BTC"], "Date": ["2022-01-02", "2022-01-03"],
+                                              "Time": ["00:00:00"] * 2, "Price": [100.0, 101.0]})).get_all_entries()
+    second = manager.DataManager(pd.DataFrame({"Ticker": ["BTC", "BTC"], "Date": ["2022-01-01", "2022-01-02"],
+                                               "Time": ["00:00:00"] * 2, "Price": [200.0, 201.0]})).get_all_entries()
+    assert list(manager.DataManager.merge_partitions([first, second])["Price"]) == [200.0, 100.0, 101.0]
+    assert list(manager.DataManager.merge_partitions([second, first])["Price"]) == [200.0, 201.0, 101.0]
+    print("Merge tests passed")
+
+def append_tests():
+    """
+    Function used to test appending entries to loaded entries
+    """
+    df = pd.DataFrame({"Ticker": ["BTC", "ETH", "BTC", "ETH"],
+                       "Date": ["2022-01-01", "2022-01-01", "2022-01-02", "2022-01-02"],
+                       "Time": ["00:00:00"] * 4, "Price": [1.0, 2.0, 3.0, 4.0]})
+    df = ingest.compact_chunk(df) #Typed as a loaded spreadsheet is
+    dm = manager.DataManager(df.copy())
+    dtypes = [str(dtype) for dtype in dm.get_all_entries().dtypes]
+    #Entries appended as json are all strings
+    dm.append_entries(pd.DataFrame.from_records([{"ticker": "BTC", "date": "2022-01-03", "time": "06:00:00",
+                                                  "price": "6"}]))
+    entries = dm.get_visible_entries(["BTC", "ETH"], "2022-01-02", "2022-01-03")
+    assert [str(dtype) for dtype in entries.dtypes] == dtypes
+    assert list(entries["Time"].cat.categories) == ["00:00:00", "06:00:00"]
+    assert list(entries["Price"]) == [3.0, 6.0, 4.0]
+    assert list(entries["Date"]) == list(pd.to_datetime(["2022-01-02", "2022-01-03", "2022-01-02"]))
+    for invalid in [{"Ticker": None}, {"Date": "not a date"}, {"Time": "noon"}, {"Price": "a lot"}]:
+        entry = {"Ticker": "ETH", "Date": "2022-01-04", "Time": "00:00:00", "Price": "5", **invalid}
+        try:
+            dm.append_entries(pd.DataFrame.from_records([entry]))
+            assert False
+        except ValueError:
+            pass
+    assert dm.get_num_of_visible_entries() == 5
+    assert [str(dtype) for dtype in dm.get_all_entries().dtypes] == dtypes
     
+    #A previous price of 0 gives the same percent change as loading the entries at once
+    dm.append_entries(pd.DataFrame({"Ticker": ["ETH", "ETH"], "Date": ["2022-01-03", "2022-01-04"],
+                                    "Time": ["00:00:00"] * 2, "Price": [0.0, 2.0]}))
+    dm.append_entries(pd.DataFrame({"Ticker": ["ETH"], "Date": ["2022-01-05"], "Time": ["00:00:00"], "Price": [3.0]}))
+    dm.append_entries(pd.DataFrame({"Ticker": ["BTC"], "Date": ["2022-01-04"], "Time": ["00:00:00"], "Price": [0.0]}))
+    dm.append_entries(pd.DataFrame({"Ticker": ["BTC"], "Date": ["2022-01-05"], "Time": ["00:00:00"], "Price": [1.0]}))
+    assert list(dm.get_visible_entries(["ETH"])["Percent Change"]) == [0.0, 100.0, -100.0, np.inf, 50.0]
+    assert dm.get_visible_entries(["BTC"])["Percent Change"].iat[-1] == np.inf
+    
+    #Newer entries are kept aside until they are merged, and give the same entries as loading them at once
+    dm = manager.DataManager(df.copy())
+    newer = pd.DataFrame({"Ticker": ["BTC", "ETH", "BTC"], "Date": ["2022-01-03", "2022-01-03", "2022-01-04"],
+                          "Time": ["00:00:00"] * 3, "Price": [6.0, 2.0, 3.0]})
+    dm.hide_entries(["ETH"])
+    dm.append_entries(newer)
+    assert len(dm._all_entries) == 4 and sum(len(batch) for batch in dm._appended_entries["BTC"]) == 2
+    assert dm.get_num_of_visible_entries() == 4 #The appended ETH entry is hidden
+    assert list(dm.get_visible_entries(["BTC"])["Percent Change"]) == [0.0, 200.0, 100.0, -50.0]
+    dm.load_entries(["ETH"])
+    assert dm.get_num_of_visible_entries() == 7
+    loaded = manager.DataManager(ingest.compact_chunk(pd.concat([df.astype({"Date": "object"}), newer])))
+    pd.testing.assert_frame_equal(dm.get_all_entries(), loaded.get_all_entries(), check_categorical = False)
+    assert len(dm._appended_entries) == 0 and len(dm._all_entries) == 7
+    
+    #Older entries and new tickers sort the full dataframe again, and percent change is recomputed
+    dm.hide_all_entries()
+    dm.load_entries(["BTC"])
+    dm.append_entries(pd.DataFrame({"Ticker": ["BTC", "XRP"], "Date": ["2022-01-01", "2022-01-01"],
+                                    "Time": ["12:00:00"] * 2, "Price": [2.0, 1.0]}))
+    assert len(dm._appended_entries) == 0
+    btc = dm.get_visible_entries(["BTC"])
+    assert list(btc["Price"]) == [1.0, 2.0, 3.0, 6.0, 3.0]
+    assert list(btc["Percent Change"]) == [0.0, 100.0, 50.0, 100.0, -50.0]
+    assert dm.get_num_of_visible_entries() == 5 #XRP is not visible while other tickers are hidden
+    dm.load_all_entries()
+    assert dm.get_num_of_visible_entries() == 9
+    print("Append tests passed")
+
+def compact_tests():
+    """
+    Function used to test that compact mode returns the same results as the default mode
+    """
+    df = pd.DataFrame({"Ticker": ["BTC", "ETH", "BTC", "ETH", "BTC"],
+                       "Date": pd.to_datetime(["2022-01-01", "2022-01-01", "2022-01-02", "2022-01-02", "2022-01-03"]),
+                       "Time": ["00:00:00", "00:00:00", "12:00:00", "00:00:00", "06:00:00"],
+                       "Price": [1.5, 2.0, 3.25, 4.0, 5.0]})
+    batches = [
+        pd.DataFrame({"Ticker": ["BTC"], "Date": pd.to_datetime(["2022-01-04"]), "Time": ["00:00:00"], "Price": [6.5]}),
+        pd.DataFrame({"Ticker": ["LRC"], "Date": pd.to_datetime(["2022-01-01"]), "Time": ["00:00:00"], "Price": [7.0]}),
+        #Entries appended as json keep the compact layout
+        pd.DataFrame({"Ticker": ["ETH"], "Date": ["2022-01-04"], "Time": ["12:00:00"], "Price": ["4.5"]}),
+        #0.1 cannot be stored as float32 exactly, so compact mode stores prices as float64 again
+        pd.DataFrame({"Ticker": ["ETH"], "Date": pd.to_datetime(["2022-01-05"]), "Time": ["00:00:00"], "Price": [0.1]})
+    ]
+    Request = manager.Request
+    requests = [Request(Request.DISPLAY_ALL_VISIBLE_ENTRIES), Request(Request.DISPLAY_VISIBLE_ENTRIES, ["BTC"]),
+                Request(Request.DISPLAY_VISIBLE_ENTRIES, ["ETH", "LRC"], "2022-01-02", "2022-01-05"),
+                Request(Request.DISPLAY_ALL_TICKERS)]
+    default = manager.Driver(df.copy())
+    compact = manager.Driver(df.copy(), compact = True)
+    usage = compact.execute_request(Request(Request.REPORT_MEMORY))
+    assert "Date" not in usage.index
+    assert usage.loc["Total", "All entries (bytes)"] < \
+        default.execute_request(Request(Request.REPORT_MEMORY)).loc["Total", "All entries (bytes)"]
+    for batch in [None] + batches:
+        if batch is not None:
+            default.append_entries(batch.copy())
+            compact.append_entries(batch.copy())
+            if batch["Price"].iat[0] != 0.1:
+                assert "Date" not in compact.execute_request(Request(Request.REPORT_MEMORY)).index
+        for request in requests:
+            expected = default.execute_request(request)
+            if isinstance(expected, pd.DataFrame):
+                pd.testing.assert_frame_equal(expected, compact.execute_request(request))
+            else:
+                assert expected == compact.execute_request(request)
+    pd.testing.assert_frame_equal(default.get_all_entries(), compact.get_all_entries())
+    print("Compact tests passed")
+
+def query_cache_tests():
+    """
+    Function used to test that query results are reused until entries or visible tickers change
+    """
+    df = pd.DataFrame({"Ticker": ["BTC", "ETH", "BTC"], "Date": ["2022-01-01"] * 3,
+                       "Time": ["00:00:00", "00:00:00", "01:00:00"], "Price": [1.0, 2.0, 3.0]})
+    dm = manager.DataManager(df)
+    queries = dm.get_query_cache()
+    entries = dm.get_visible_entries(["BTC"])
+    assert dm.get_visible_entries(["BTC"]) is entries
+    assert dm.get_visible_entries(["BTC"], "2022-01-01") is not entries
+    assert (queries.get_hits(), queries.get_misses()) == (1, 2)
+    
+    version = dm.get_version()
+    dm.hide_entries(["ETH"])
+    assert dm.get_version()[1] > version[1]
+    assert dm.get_all_visible_tickers() == ["BTC"]
+    dm.load_all_entries()
+    assert dm.get_all_visible_tickers() == ["BTC", "ETH"]
+    dm.append_entries(pd.DataFrame({"Ticker": ["BTC"], "Date": ["2022-01-02"], "Time": ["00:00:00"], "Price": [4.0]}))
+    assert dm.get_version()[0] > version[0]
+    assert list(dm.get_visible_entries(["BTC"])["Price"]) == [1.0, 3.0, 4.0]
+    assert queries.to_dict()["entries"] == 1
+    
+    small = cache.QueryCache(max_entries = 2)
+    for arguments in [(1,), (2,), (1,), (3,), (2,)]:
+        small.get("query", arguments, 0, lambda: object())
+    assert (small.get_hits(), small.get_misses()) == (1, 4)
+    
+    #Results are also bounded by their size, and results larger than the cache are never stored
+    frame = pd.DataFrame({"Price": np.zeros(1000)})
+    size = int(frame.memory_usage(index = True, deep = True).sum())
+    small = cache.QueryCache(max_bytes = size * 2)
+    for arguments in [(1,), (2,), (3,)]:
+        small.get("query", arguments, 0, lambda: frame.copy())
+    assert small.to_dict()["entries"] == 2 and small.to_dict()["bytes"] == size * 2
+    small.get("query", (4,), 0, lambda: pd.concat([frame] * 3))
+    assert small.to_dict()["entries"] == 2 and small.get("query", (4,), 0, lambda: None) is None
+    dm.get_all_visible_entries()
+    assert all(key[0] != "all_visible_entries" for key in queries._results)
+    print("Query cache tests passed")
+
+def analytics_tests():
+    """
+    Function used to test the rolling metrics of assets and when they are recomputed
+    """
+    prices = np.array([4.0, 5.0, 3.0, 6.0, 2.0, 4.0])
+    days = pd.date_range("2022-01-01", periods = len(prices), freq = "D")
+    timestamps = days.to_numpy()
+    average = analytics.compute_metric(analytics.MOVING_AVERAGE, timestamps, prices, 3)
+    assert np.isnan(average[1]) and np.allclose(average[2:], [4.0, 14 / 3, 11 / 3, 4.0])
+    assert np.allclose(analytics.compute_metric(analytics.MOVING_AVERAGE, timestamps, prices, "2D")[1:],
+                       [4.5, 4.0, 4.5, 4.0, 3.0])
+    returns = pd.Series(prices).pct_change() * 100
+    assert np.allclose(analytics.compute_metric(analytics.VOLATILITY, timestamps, prices, 3)[3:],
+                       [returns[i - 2:i + 1].std() for i in range(3, len(prices))])
+    drawdown = analytics.compute_metric(analytics.MAX_DRAWDOWN, timestamps, prices, None)
+    assert np.allclose(drawdown, [0.0, 0.0, -40.0, -40.0, -200 / 3, -200 / 3])
+    for window in [0, "a week"]:
+        try:
+            analytics.check_window(window)
+            assert False
+        except ValueError:
+            pass
+    #The ending date is inclusive, so every time on it is within the range
+    times = (days + pd.Timedelta(hours = 23)).to_numpy()
+    assert dates.get_date_range(times, "2022-01-02", "2022-01-04") == (1, 4)
+    assert dates.get_date_range(times, None, "2022-01-01") == (0, 1)
+    assert dates.get_date_range(times, "2022-01-05", "2022-01-03") == (4, 4)
+    
+    df = pd.DataFrame({"Ticker": ["BTC"] * 6 + ["ETH"] * 3, "Date": list(days.strftime("%Y-%m-%d")) +
+                       ["2022-01-01", "2022-01-02", "2022-01-03"], "Time": ["00:00:00"] * 9,
+                       "Price": list(prices) + [1.0, 2.0, 3.0]})
+    dm = manager.DataManager(df)
+    metrics = analytics.Analytics(dm)
+    btc = metrics.get_metric("BTC", analytics.MOVING_AVERAGE, 3)
+    eth = metrics.get_metric("ETH", analytics.MOVING_AVERAGE, 3)
+    assert metrics.get_metric("BTC", analytics.MOVING_AVERAGE, "3") is btc
+    dm.append_entries(pd.DataFrame({"Ticker": ["BTC"], "Date": ["2022-01-07"], "Time": ["00:00:00"], "Price": [7.0]}))
+    assert np.isclose(metrics.get_metric("BTC", analytics.MOVING_AVERAGE, 3)[-1], 13 / 3)
+    assert metrics.get_metric("ETH", analytics.MOVING_AVERAGE, 3) is eth
+    
+    Request = manager.Request
+    driver = manager.Driver(df)
+    entries = driver.execute_request(Request(Request.DISPLAY_ANALYTICS, ["BTC", "ETH"], "2022-01-03", window = 3))
+    assert list(entries["Ticker"]) == ["BTC"] * 4 + ["ETH"]
+    assert np.allclose(entries["Moving Average"], [4.0, 14 / 3, 11 / 3, 4.0, 2.0])
+    assert Request(Request.DISPLAY_ANALYTICS, ["BTC"]).get_window() == 20
+    request = script.parse_request("display_analytics ETH window=7D")
+    assert request.get_window() == "7D"
+    assert list(driver.execute_request(request)["Moving Average"]) == [1.0, 1.5, 2.0]
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "BTC.png")
+        graph.Graph(df).render(["BTC"], file_path, type = graph.Graph.MAX_DRAWDOWN, window = 3)
+        assert os.path.getsize(file_path) > 0
+    print("Analytics tests passed")
+
+def correlation_tests():
+    """
+    Function used to test aligning tickers on a common time grid and comparing them
+    """
+    values = np.random.default_rng(0).normal(size = (50, 4))
+    values[:10, 1] = np.nan
+    values[20:25, 3] = np.nan
+    correlation, covariance = analytics.pairwise_moments(values)
+    assert np.allclose(correlation, pd.DataFrame(values).corr().to_numpy())
+    assert np.allclose(covariance, pd.DataFrame(values).cov().to_numpy())
+    
+    #LRC has no entry on the 2nd, so its price on the 1st is used
+    df = pd.DataFrame({"Ticker": ["MATIC"] * 4 + ["LRC"] * 3,
+                       "Date": ["2022-01-01", "2022-01-02", "2022-01-03", "2022-01-04", "2022-01-01", "2022-01-03", "2022-01-04"],
+                       "Time": ["00:00:00"] * 7, "Price": [1.0, 2.0, 1.0, 2.0, 10.0, 5.0, 10.0]})
+    driver = manager.Driver(df)
+    aligned = driver.get_analytics().get_aligned_prices(["MATIC", "LRC", "XRP"])
+    assert list(aligned.columns) == ["MATIC", "LRC"]
+    assert list(aligned["LRC"]) == [10.0, 10.0, 5.0, 10.0]
+    Request = manager.Request
+    correlation = driver.execute_request(Request(Request.DISPLAY_CORRELATION))
+    assert np.isclose(correlation.loc["MATIC", "LRC"], np.corrcoef([100, -50, 100], [0, -50, 100])[0, 1])
+    assert driver.execute_request(Request(Request.DISPLAY_CORRELATION, ["LRC", "MATIC"])) is correlation
+    driver.append_entries(pd.DataFrame({"Ticker": ["LRC"], "Date": ["2022-01-05"], "Time": ["00:00:00"], "Price": [5.0]}))
+    assert driver.execute_request(Request(Request.DISPLAY_CORRELATION)) is not correlation
+    covariance = driver.execute_request(Request(Request.DISPLAY_COVARIANCE, ["LRC"], "2022-01-02"))
+    assert np.isclose(covariance.loc["LRC", "LRC"], np.var([-50, 100, -50], ddof = 1))
+    driver.execute_request(Request(Request.HIDE_ENTRIES, ["MATIC"]))
+    correlation = driver.execute_request(Request(Request.DISPLAY_CORRELATION, ["LRC", "MATIC"]))
+    assert list(correlation.columns) == ["LRC"]
+    driver.execute_request(Request(Request.LOAD_ENTRIES, ["MATIC"]))
+    assert list(driver.execute_request(Request(Request.DISPLAY_CORRELATION, ["LRC", "MATIC"])).columns) == ["LRC", "MATIC"]
+    
+    #Fewer than 10^6 times each, but too many prices once 25 tickers share the grid
+    tickers = ["T{}".format(i) for i in range(25)]
+    df = pd.DataFrame({"Ticker": np.repeat(tickers, 2), "Date": ["2022-01-01", "2022-01-11"] * 25,
+                       "Time": ["00:00:00"] * 50, "Price": [1.0, 2.0] * 25})
+    wide = manager.Driver(df).get_analytics()
+    assert wide.get_aligned_prices(tickers[:2], "1s").shape == (864001, 2)
+    try:
+        wide.get_aligned_prices(tickers, "1s")
+        assert False
+    except ValueError:
+        pass
+    print("Correlation tests passed")
+
+def composite_request_tests():
+    """
+    Function used to test executing several requests as one
+    """
+    df = pd.DataFrame({"Ticker": ["BTC", "ETH", "BTC", "LRC"], "Date": ["2022-01-01"] * 4,
+                       "Time": ["00:00:00", "00:00:00", "01:00:00", "00:00:00"],
+                       "Price": [1.0, 2.0, 3.0, 4.0]})
+    driver = manager.Driver(df)
+    Request = manager.Request
+    composite = manager.CompositeRequest([
+        Request(Request.HIDE_ALL_ENTRIES),
+        Request(Request.LOAD_ENTRIES, ["BTC", "LRC"]),
+        Request(Request.DISPLAY_ALL_VISIBLE_ENTRIES),
+        Request(Request.DISPLAY_ALL_VISIBLE_ENTRIES),
+        Request(Request.HIDE_ENTRIES, ["LRC"]),
+        Request(Request.DISPLAY_ALL_VISIBLE_ENTRIES)])
+    outputs = driver.execute_request(composite)
+    assert len(outputs) == 6
+    assert outputs[2] is outputs[3]
+    assert list(outputs[2]["Price"]) == [1.0, 3.0, 4.0]
+    assert list(outputs[5]["Price"]) == [1.0, 3.0]
+    assert driver.execute_request(Request(Request.DISPLAY_ALL_VISIBLE_TICKERS)) == ["BTC"]
+    
+    #A failing composite request leaves the visible tickers unchanged
+    for requests in [[Request(Request.HIDE_ENTRIES, ["BTC"]), Request(Request.LOAD_ENTRIES, ["XRP"])],
+                     [Request(Request.HIDE_ALL_ENTRIES), Request(Request.DISPLAY_ALL_VISIBLE_ENTRIES)]]:
+        try:
+            driver.execute_request(manager.CompositeRequest(requests))
+            assert False
+        except (ValueError, UserWarning):
+            pass
+        assert driver.execute_request(Request(Request.DISPLAY_ALL_VISIBLE_TICKERS)) == ["BTC"]
+    
+    request = script.parse_request("load_all_entries; display_visible_entries ETH from=2022-01-01")
+    assert isinstance(request, manager.CompositeRequest)
+    assert len(driver.execute_request(request)[1]) == 1
+    print("Composite request tests passed")
+
+def script_tests():
+    """
+    Function used to test executing requests from a script
+    """
+    df = pd.DataFrame({"Ticker": ["BTC", "ETH", "BTC"], "Date": ["2022-01-01"] * 3,
+                       "Time": ["00:00:00", "00:00:00", "01:00:00"], "Price": [1.0, 2.0, 3.0]})
+    assert script.parse_request("  # comment") is None
+    request = script.parse_request("3 BTC ETH from=2022-01-01 to=2022-01-02")
+    assert request.get_request() == manager.Request.DISPLAY_VISIBLE_ENTRIES
+    assert request.get_assets() == ["BTC", "ETH"]
+    assert request.get_starting_date() == "2022-01-01"
+    assert script.parse_request("HIDE_ALL_ENTRIES").get_request() == manager.Request.HIDE_ALL_ENTRIES
+    #Numbers of the original requests are kept, so older scripts run the same requests
+    assert script.parse_request("9 BTC").get_name() == "plot_assets" and script.parse_request("10").get_name() == "quit"
+    
+    lines = ["hide_entries ETH", "display_all_visible_entries", "unknown", "quit", "display_all_tickers"]
+    output = io.StringIO()
+    num_failed = script.run_script(manager.Driver(df), lines, script.JsonlWriter(output))
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert num_failed == 1
+    assert [result["line"] for result in results] == [1, 2, 3, 4]
+    assert [entry["Price"] for entry in results[1]["result"]] == [1.0, 3.0]
+    assert not results[2]["ok"]
+    
+    #Plots need a display, so they are reported as errors rather than shown
+    output = io.StringIO()
+    lines = ["plot_assets BTC", "hide_entries ETH; plot_assets BTC", "display_all_visible_tickers"]
+    assert script.run_script(manager.Driver(df), lines, script.JsonlWriter(output)) == 2
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [result["ok"] for result in results] == [False, False, True]
+    assert results[2]["result"] == ["BTC", "ETH"] #No request of a rejected composite request runs
+    
+    driver = manager.Driver(df)
+    output = io.StringIO()
+    script.run_script(driver, ["display_visible_entries BTC", "display_all_tickers"],
+                      script.CsvWriter(output, driver.get_all_entries().columns))
+    rows = output.getvalue().splitlines()
+    assert rows[0].startswith("line,request,ok,message,Ticker")
+    assert len(rows) == 5
+    
+    #Tables which are not entries are written as json records
+    output = io.StringIO()
+    script.run_script(driver, ["display_correlation", "report_memory"],
+                      script.CsvWriter(output, driver.get_all_entries().columns))
+    rows = pd.read_csv(io.StringIO(output.getvalue()))
+    records = [json.loads(message) for message in rows["message"]]
+    assert [record["Ticker"] for record in records[:2]] == ["BTC", "ETH"]
+    assert set(records[0]) == {"Ticker", "BTC", "ETH"} and records[-1]["Column"] == "Total"
+    print("Script tests passed")
+
+def parallel_tests():
+    """
+    Function used to test that derived columns computed by a process pool match pandas
+    """
+    rng = np.random.default_rng(0)
+    sizes = rng.integers(1, 50, 200)
+    tickers = np.repeat(np.arange(len(sizes)), sizes)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    prices = rng.random(len(tickers)) + 0.5
+    prices[rng.random(len(prices)) < 0.05] = np.nan
+    prices[starts[3]] = np.nan #Missing prices are never filled from the previous ticker
+    expected = pd.Series(prices).groupby(tickers, sort = False).pct_change() * 100
+    expected[starts] = 0
+    
+    groups = parallel._split_groups(starts, len(prices), 4)
+    assert groups[0][0] == 0 and groups[-1][1] == len(prices) and all(a[1] == b[0] for a, b in zip(groups, groups[1:]))
+    serial = parallel.compute_by_ticker(parallel.percent_change, {"prices": prices}, starts, processes = 1)
+    pooled = parallel.compute_by_ticker(parallel.percent_change, {"prices": prices}, starts,
+                                        processes = 2, min_rows = 0)
+    np.testing.assert_array_equal(serial, expected.to_numpy())
+    np.testing.assert_array_equal(pooled, expected.to_numpy())
+    
+    df = pd.DataFrame({"Ticker": ["ETH", "BTC", "BTC", "ETH", "BTC"], "Date": ["2022-01-01"] * 5,
+                       "Time": ["00:00:00", "00:00:00", "01:00:00", "01:00:00", "02:00:00"],
+                       "Price": [2.0, 1.0, 3.0, 1.0, 6.0]})
+    assert list(manager.DataManager(df).get_all_entries()["Percent Change"]) == [0.0, 200.0, 100.0, 0.0, -50.0]
+    print("Parallel tests passed")
+
+def partition_tests():
+    """
+    Function used to test that entries read from partitions on disk match entries held in memory
+    """
+    df = pd.DataFrame({"Ticker": ["ETH", "BTC", "BTC", "ETH", "BTC", "LTC"],
+                       "Date": ["2022-01-02", "2022-01-01", "2022-01-03", "2022-01-01", "2022-01-02", "2022-01-01"],
+                       "Time": ["00:00:00"] * 6, "Price": [2.0, 1.0, 4.0, 3.0, 2.0, 5.0]})
+    expected = manager.Driver(df.copy())
+    with tempfile.TemporaryDirectory() as directory:
+        writer = partitions.PartitionWriter(directory)
+        entries = manager.DataManager(df.copy()).get_all_entries()
+        writer.add(entries.iloc[3:])
+        writer.add(entries.iloc[:3])
+        store = writer.close()
+        assert partitions.is_partition_store(directory) and store.get_tickers() == ["BTC", "ETH", "LTC"]
+        driver = manager.Driver(partitions.PartitionStore(directory))
+        pd.testing.assert_frame_equal(driver.get_all_entries(), expected.get_all_entries())
+        
+        requests = [manager.Request(manager.Request.DISPLAY_VISIBLE_ENTRIES, ["BTC"], "2022-01-02"),
+                    manager.Request(manager.Request.HIDE_ENTRIES, ["ETH"]),
+                    manager.Request(manager.Request.DISPLAY_ALL_VISIBLE_TICKERS),
+                    manager.Request(manager.Request.DISPLAY_ALL_VISIBLE_ENTRIES),
+                    manager.Request(manager.Request.HIDE_ALL_ENTRIES),
+                    manager.Request(manager.Request.LOAD_ENTRIES, ["LTC"]),
+                    manager.Request(manager.Request.DISPLAY_ALL_VISIBLE_ENTRIES)]
+        for request in requests:
+            output = driver.execute_request(request)
+            if isinstance(output, pd.DataFrame):
+                pd.testing.assert_frame_equal(output, expected.execute_request(request))
+            else:
+                assert output == expected.execute_request(request)
+        
+        #Only the partitions of visible tickers are read
+        read = []
+        read_entries = store.read
+        store.read = lambda ticker, *dates: read.append(ticker) or read_entries(ticker, *dates)
+        driver._manager._store = store
+        driver.get_query_cache().clear()
+        driver.execute_request(manager.Request(manager.Request.DISPLAY_ALL_VISIBLE_ENTRIES))
+        assert read == ["LTC"]
+        
+        appended = pd.DataFrame({"Ticker": ["LTC"], "Date": ["2022-01-02"], "Time": ["00:00:00"], "Price": [10.0]})
+        driver.append_entries(appended.copy())
+        expected.append_entries(appended.copy())
+        output = driver.execute_request(manager.Request(manager.Request.DISPLAY_VISIBLE_ENTRIES, ["LTC"]))
+        assert list(output["Price"]) == [5.0, 10.0] and list(output["Percent Change"]) == [0.0, 100.0]
+        try:
+            driver.append_entries(pd.DataFrame({"Ticker": ["XRP"], "Date": ["2022-01-02"],
+                                                "Time": ["00:00:00"], "Price": [1.0]}))
+            assert False
+        except ValueError:
+            pass
+        usage = driver.execute_request(manager.Request(manager.Request.REPORT_MEMORY))
+        assert usage.loc["Total", "On disk (bytes)"] > 0
+        
+        #Large views are refused, but scripts still write them in pages
+        driver.execute_request(manager.Request(manager.Request.LOAD_ALL_ENTRIES))
+        driver._manager.MAX_MATERIALIZED_ROWS = 2
+        try:
+            driver.execute_request(manager.Request(manager.Request.DISPLAY_ALL_VISIBLE_ENTRIES))
+            assert False
+        except UserWarning:
+            pass
+        output = io.StringIO()
+        assert script.run_script(driver, ["display_all_visible_entries"], script.JsonlWriter(output)) == 0
+        assert [entry["Price"] for entry in json.loads(output.getvalue())["result"]] == [1.0, 2.0, 4.0, 3.0, 2.0, 5.0, 10.0]
+        
+        try:
+            partitions.PartitionWriter(os.path.dirname(os.path.abspath(__file__)))
+            assert False
+        except ValueError:
+            pass
+        
+        #An existing store is only replaced when asked, and only once the new store is complete
+        try:
+            partitions.PartitionWriter(directory)
+            assert False
+        except ValueError:
+            pass
+        replaced = os.path.join(directory, "replaced")
+        writer = partitions.PartitionWriter(replaced)
+        writer.add(entries)
+        writer.close()
+        writer = partitions.PartitionWriter(replaced, overwrite = True)
+        writer.add(entries.iloc[:3])
+        assert partitions.PartitionStore(replaced).get_tickers() == ["BTC", "ETH", "LTC"]
+        assert writer.close().get_tickers() == ["BTC"]
+        assert partitions.PartitionStore(replaced).get_tickers() == ["BTC"]
+        assert [name for name in os.listdir(directory) if name.startswith("replaced.")] == []
+    print("Partition tests passed")
+
+def export_tests():
+    """
+    Function used to test paging through and exporting the visible entries
+    """
+    df = pd.DataFrame({"Ticker": ["BTC", "ETH", "BTC", "LTC", "BTC", "ETH"],
+                       "Date": ["2022-01-01", "2022-01-01", "2022-01-02", "2022-01-01", "2022-01-03", "2022-01-02"],
+                       "Time": ["00:00:00"] * 6, "Price": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]})
+    driver = manager.Driver(df.copy())
+    driver.execute_request(manager.Request(manager.Request.HIDE_ENTRIES, ["ETH"]))
+    expected = driver.execute_request(manager.Request(manager.Request.DISPLAY_ALL_VISIBLE_ENTRIES))
+    pages = driver.iter_all_visible_entries(3)
+    driver.execute_request(manager.Request(manager.Request.HIDE_ALL_ENTRIES)) #Pages come from a snapshot
+    pages = list(pages)
+    assert [len(page) for page in pages] == [3, 1]
+    pd.testing.assert_frame_equal(pd.concat(pages), expected)
+    for page_size in [0, -1]:
+        try:
+            driver.iter_all_visible_entries(page_size)
+            assert False
+        except (ValueError, UserWarning):
+            pass
+    
+    driver.execute_request(manager.Request(manager.Request.LOAD_ALL_ENTRIES))
+    expected = driver.execute_request(manager.Request(manager.Request.DISPLAY_ALL_VISIBLE_ENTRIES))
+    with tempfile.TemporaryDirectory() as directory:
+        store = partitions.PartitionWriter(os.path.join(directory, "partitions"))
+        store.add(driver.get_all_entries())
+        store = store.close()
+        rows_read = []
+        read_rows = store.read_rows
+        store.read_rows = lambda ticker, start, stop: rows_read.append(stop - start) or read_rows(ticker, start, stop)
+        partitioned = manager.Driver(store)
+        pd.testing.assert_frame_equal(pd.concat(partitioned.iter_all_visible_entries(2)), expected)
+        assert max(rows_read) == 2
+        
+        for extension in [".csv", ".jsonl", ".parquet"]:
+            path = os.path.join(directory, "entries" + extension)
+            assert driver.export_visible_entries(path, chunk_size = 4) == len(expected)
+            if extension == ".csv":
+                exported = pd.read_csv(path)
+            elif extension == ".jsonl":
+                exported = pd.read_json(path, lines = True)
+            else:
+                exported = pd.read_parquet(path)
+            assert list(exported["Price"]) == list(expected["Price"])
+            assert list(exported["Ticker"].astype(str)) == list(expected["Ticker"].astype(str))
+        try:
+            driver.export_visible_entries(os.path.join(directory, "entries.txt"))
+            assert False
+        except ValueError:
+            pass
+        assert sorted(os.listdir(directory)) == ["entries.csv", "entries.jsonl", "entries.parquet", "partitions"]
+    print("Export tests passed")
+
+def server_tests():
+    """
+    Function used to test serving requests over HTTP and the snapshots read by the server
+    """
+    import server
+    
+    df = pd.DataFrame({"Ticker": ["BTC", "ETH", "BTC"], "Date": ["2022-01-01"] * 3,
+                       "Time": ["00:00:00", "00:00:00", "01:00:00"], "Price": [1.0, 2.0, 3.0]})
+    driver = manager.Driver(df)
+    snapshot = driver.snapshot()
+    driver.execute_request(manager.Request(manager.Request.HIDE_ENTRIES, ["BTC"]))
+    driver.append_entries(pd.DataFrame({"Ticker": ["ETH"], "Date": ["2022-01-02"], "Time": ["00:00:00"], "Price": [4.0]}))
+    assert snapshot.execute_request(manager.Request(manager.Request.DISPLAY_ALL_VISIBLE_TICKERS)) == ["BTC", "ETH"]
+    assert len(snapshot.execute_request(manager.Request(manager.Request.DISPLAY_ALL_VISIBLE_ENTRIES))) == 3
+    
+    ready = threading.Event()
+    ports = []
+    asset_server = server.AssetServer(manager.Driver(df), threads = 4)
+    async def serve():
+        ports.append(await asset_server.start("127.0.0.1", 0))
+        ready.set()
+        await asset_server.serve_forever()
+    threading.Thread(target = lambda: asyncio.run(serve()), daemon = True).start()
+    ready.wait()
+    connection = HTTPConnection("127.0.0.1", ports[0])
+    def send(path, body):
+        connection.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return (response.status, json.loads(response.read()))
+    
+    assert send("/request", {"line": "display_all_visible_tickers"}) == (200, {"ok": True, "result": ["BTC", "ETH"]})
+    status, body = send("/request", {"request": "display_visible_entries", "assets": ["BTC"], "from": "2022-01-01"})
+    assert [entry["Price"] for entry in body["result"]] == [1.0, 3.0]
+    assert send("/request", {"requests": [{"request": "hide_entries", "assets": "BTC"},
+                                          {"request": "display_all_visible_tickers"}]})[1]["result"][1] == ["ETH"]
+    assert send("/append", {"entries": [{"Ticker": "ETH", "Date": "2022-01-02", "Time": "00:00:00", "Price": 4.0}]})[0] == 200
+    status, body = send("/request", {"request": 4})
+    assert [entry["Price"] for entry in body["result"]] == [2.0, 4.0]
+    assert send("/request", {"request": "plot_assets", "assets": ["ETH"]})[0] == 400
+    assert send("/request", {"assets": ["ETH"]})[0] == 400
+    assert send("/unknown", {})[0] == 404
+    connection.close()
+    asset_server.close()
+    print("Server tests passed")
+
+#Largest number of seconds main.py may spend importing modules before its first prompt
+STARTUP_BUDGET = 1.0
+
+#Modules which must not be imported until they are first used
+LAZY_MODULES = ("matplotlib", "pycoingecko", "pyarrow.feather", "tests.tests")
+
+def startup_tests(budget = STARTUP_BUDGET):
+    """
+    Function used to test that main.py reaches its first prompt quickly, measured with
+    python -X importtime in a new interpreter
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main; main.IO()"],
+                            capture_output = True, text = True, check = True, cwd = root)
+    total = 0
+    modules = {}
+    for line in result.stderr.splitlines():
+        fields = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        modules[name.strip()] = int(fields[1])
+        if len(name) - len(name.lstrip()) == 1: #Only modules imported directly are counted
+            total += int(fields[1])
+    
+    slowest = sorted(modules.items(), key = lambda module: -module[1])[:5]
+    print("Imports before the first prompt took {:.3f}s, slowest: {}".format(
+        total / 10 ** 6, ", ".join("{} {:.3f}s".format(name, time / 10 ** 6) for name, time in slowest)))
+    for name in modules:
+        for lazy_module in LAZY_MODULES:
+            assert not (name == lazy_module or name.startswith(lazy_module + ".")), \
+                "{} was imported at startup".format(name)
+    assert total / 10 ** 6 <= budget, "Startup took longer than {}s".format(budget)
+    print("Startup tests passed")
+
 def print_list(ls):
     """
     Prints all contents in a list not containing tuples